@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Broker Load Test
+
+Starts BPMBroker in-process, drives it with virtual devices over UDP and
+attaches WebSocket consumers, then reports throughput, latency percentiles
+(UDP send to WebSocket delivery), loss, CPU and RSS of the broker process.
+Devices and consumers run in their own processes so their CPU time is not
+charged to the broker.
+
+Every combination of the --devices / --consumers / --output-mode values is
+run in a fresh broker process, and the results are written as JSON.
+
+Usage:
+    python bench_broker.py --devices 100 1000 --rate 1 --consumers 1 10 --duration 10
+    python bench_broker.py --devices 500 --rate 20 --output-mode per_packet tick
+    python bench_broker.py --baseline bench_results_old.json   # exit 1 on regression
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import socket
+import time
+from datetime import datetime
+
+DEFAULT_UDP_PORT = 18888
+DEFAULT_WS_PORT = 16789
+DRAIN_SECONDS = 2.0
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 1e6 if platform.system() == "Darwin" else maxrss / 1e3
+
+# --- Virtual devices --------------------------------------------------------
+
+def run_devices(config: dict, sender_index: int, sender_count: int, results):
+    """Send packets for a share of the virtual devices at the configured rate"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = ("127.0.0.1", config["udp_port"])
+    devices = list(range(1 + sender_index, config["devices"] + 1, sender_count))
+    total_rate = len(devices) * config["rate"]
+
+    sent = 0
+    start = time.time()
+    while True:
+        elapsed = time.time() - start
+        if elapsed >= config["duration"]:
+            break
+
+        due = int(elapsed * total_rate)
+        while sent < due:
+            user_id = devices[sent % len(devices)]
+            packet = {
+                "user": user_id,
+                "bpm": 60 + (sent * 7 + user_id) % 40,
+                "timestamp": int(elapsed * 1000),
+                "signal_strength": -50,
+                "finger_detected": True,
+                "bench_seq": sent * sender_count + sender_index,
+                "bench_sent": time.time()
+            }
+            try:
+                sock.sendto(json.dumps(packet).encode("utf-8"), target)
+            except OSError:
+                pass  # Kernel buffer full - counts as loss
+            sent += 1
+
+        time.sleep(0.001)
+
+    sock.close()
+    results.put(("sender", sender_index, sent))
+
+# --- WebSocket consumers ----------------------------------------------------
+
+def run_consumers(config: dict, ready, stop, results):
+    """Connect the WebSocket consumers and record delivery latency"""
+    asyncio.run(_consume(config, ready, stop, results))
+
+async def _consume(config: dict, ready, stop, results):
+    import websockets
+    from bpm_codecs import get_codec
+
+    codec = get_codec(config["codec"])
+    url = f"ws://127.0.0.1:{config['ws_port']}/?codec={config['codec']}"
+    connected = 0
+
+    async def client(index: int):
+        nonlocal connected
+        latencies = []
+        seen = set()
+        messages = 0
+
+        async with websockets.connect(url, max_size=None) as ws:
+            connected += 1
+            if connected == config["consumers"]:
+                ready.set()
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), 0.25)
+                except asyncio.TimeoutError:
+                    if stop.is_set():
+                        break
+                    continue
+
+                now = time.time()
+                messages += 1
+                data = codec.decode(message)
+                items = data.get("users", {}).values() if data.get("type") == "frame" else (data,)
+                for item in items:
+                    seq = item.get("bench_seq")
+                    if seq is not None and seq not in seen:
+                        seen.add(seq)
+                        latencies.append(now - item["bench_sent"])
+
+        return latencies, len(seen), messages
+
+    outcomes = await asyncio.gather(*(client(i) for i in range(config["consumers"])))
+
+    latencies = sorted(itertools.chain.from_iterable(outcome[0] for outcome in outcomes))
+    results.put(("consumers", {
+        "unique_delivered": [outcome[1] for outcome in outcomes],
+        "messages": sum(outcome[2] for outcome in outcomes),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "p999": percentile(latencies, 0.999) * 1000,
+            "max": (latencies[-1] * 1000) if latencies else 0.0
+        }
+    }))
+
+# --- Broker under test ------------------------------------------------------
+
+def run_config(config: dict, output):
+    """Run one configuration in this (fresh) process and report the result"""
+    import bpm_broker
+
+    bpm_broker.UDP_HOST = "127.0.0.1"
+    bpm_broker.UDP_PORT = config["udp_port"]
+    bpm_broker.WEBSOCKET_HOST = "127.0.0.1"
+    bpm_broker.WEBSOCKET_PORT = config["ws_port"]
+    bpm_broker.OUTPUT_MODE = config["output_mode"]
+    bpm_broker.CLIENT_QUEUE_POLICY = config["queue_policy"]
+    bpm_broker.METRICS_ENABLED = False  # Stage timings are read directly below
+    if not config["verbose"]:
+        logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+        logging.getLogger("websockets").setLevel(logging.WARNING)
+
+    output.put(asyncio.run(_run_broker(bpm_broker, config)))
+
+async def _run_broker(bpm_broker, config: dict) -> dict:
+    loop = asyncio.get_running_loop()
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    ready = context.Event()
+    stop = context.Event()
+
+    broker = bpm_broker.BPMBroker()
+    broker_task = asyncio.create_task(broker.run())
+    await asyncio.sleep(0.5)
+
+    consumers = context.Process(target=run_consumers, args=(config, ready, stop, results))
+    consumers.start()
+    if not await loop.run_in_executor(None, ready.wait, 30):
+        raise RuntimeError("WebSocket consumers failed to connect")
+
+    senders = [context.Process(target=run_devices, args=(config, i, config["senders"], results))
+               for i in range(config["senders"])]
+
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    peak_rss = current_rss_mb()
+    max_lag = 0.0
+
+    for sender in senders:
+        sender.start()
+
+    # Sample loop lag and RSS while the load runs
+    deadline = wall_start + config["duration"] + DRAIN_SECONDS
+    while time.perf_counter() < deadline:
+        before = loop.time()
+        await asyncio.sleep(0.05)
+        max_lag = max(max_lag, loop.time() - before - 0.05)
+        peak_rss = max(peak_rss, current_rss_mb())
+
+    wall = time.perf_counter() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    stop.set()
+
+    sent = 0
+    consumer_result = None
+    pending = len(senders) + 1
+    while pending:
+        kind, *payload = await loop.run_in_executor(None, results.get, 30)
+        if kind == "sender":
+            sent += payload[1]
+        else:
+            consumer_result = payload[0]
+        pending -= 1
+
+    for process in senders + [consumers]:
+        process.join(timeout=5)
+
+    ingest_stats = broker.ingest_queue.get_stats()
+    client_stats = [session.get_stats() for session in broker.websocket_clients.values()]
+    broker_task.cancel()
+    try:
+        await broker_task
+    except asyncio.CancelledError:
+        pass
+
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+    delivered = consumer_result["unique_delivered"]
+    mean_delivered = sum(delivered) / len(delivered) if delivered else 0
+
+    return {
+        "config": {key: config[key] for key in
+                   ("devices", "rate", "consumers", "duration", "output_mode", "queue_policy", "codec")},
+        "sent": sent,
+        "received": ingest_stats["received"],
+        "ingest_dropped": ingest_stats["dropped"],
+        "client_dropped": sum(stats["dropped"] for stats in client_stats),
+        "delivered_per_consumer": mean_delivered,
+        "loss": 1 - mean_delivered / sent if sent else 0.0,
+        "throughput_in_pps": ingest_stats["received"] / config["duration"],
+        "throughput_out_mps": consumer_result["messages"] / config["duration"],
+        "latency_ms": consumer_result["latency_ms"],
+        "cpu_percent": cpu / wall * 100,
+        "peak_rss_mb": peak_rss,
+        "max_loop_lag_ms": max_lag * 1000,
+        "stages": broker.metrics.snapshot()["stages"]
+    }
+
+# --- Orchestration ----------------------------------------------------------
+
+def config_key(config: dict) -> tuple:
+    return tuple(sorted((k, v) for k, v in config.items() if k != "duration"))
+
+def compare(results: list, baseline_path: str, tolerance: float) -> list:
+    """Regressions against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {config_key(r["config"]): r for r in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        old = baseline.get(config_key(result["config"]))
+        if old is None:
+            continue
+        if result["latency_ms"]["p99"] > old["latency_ms"]["p99"] * (1 + tolerance):
+            regressions.append(f"{result['config']}: p99 {old['latency_ms']['p99']:.2f} → "
+                               f"{result['latency_ms']['p99']:.2f} ms")
+        if result["loss"] > old["loss"] + tolerance * max(old["loss"], 0.01):
+            regressions.append(f"{result['config']}: loss {old['loss']:.3%} → {result['loss']:.3%}")
+        if result["cpu_percent"] > old["cpu_percent"] * (1 + tolerance):
+            regressions.append(f"{result['config']}: CPU {old['cpu_percent']:.1f}% → "
+                               f"{result['cpu_percent']:.1f}%")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the BPM broker")
+    parser.add_argument("--devices", type=int, nargs="+", default=[100, 1000],
+                        help="Virtual device counts to test (default: 100 1000)")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="Packets per second per device (default: 1.0)")
+    parser.add_argument("--consumers", type=int, nargs="+", default=[1, 10],
+                        help="WebSocket consumer counts to test (default: 1 10)")
+    parser.add_argument("--output-mode", nargs="+", default=["per_packet"],
+                        choices=["per_packet", "tick"], help="Broker output modes to test")
+    parser.add_argument("--queue-policy", default="drop_oldest",
+                        choices=["drop_oldest", "conflate", "disconnect"])
+    parser.add_argument("--codec", default="json", help="Codec the consumers request")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="Seconds of load per configuration (default: 10)")
+    parser.add_argument("--senders", type=int, default=1,
+                        help="Device sender processes (default: 1)")
+    parser.add_argument("--udp-port", type=int, default=DEFAULT_UDP_PORT)
+    parser.add_argument("--ws-port", type=int, default=DEFAULT_WS_PORT)
+    parser.add_argument("--output", default="bench_results.json",
+                        help="Where to write the JSON results (default: bench_results.json)")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression vs the baseline (default: 0.2)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the broker's INFO logging")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+
+    for devices, consumers, output_mode in itertools.product(args.devices, args.consumers, args.output_mode):
+        config = {
+            "devices": devices,
+            "rate": args.rate,
+            "consumers": consumers,
+            "duration": args.duration,
+            "output_mode": output_mode,
+            "queue_policy": args.queue_policy,
+            "codec": args.codec,
+            "senders": args.senders,
+            "udp_port": args.udp_port,
+            "ws_port": args.ws_port,
+            "verbose": args.verbose
+        }
+        print(f"▶ {devices} devices × {args.rate}/s, {consumers} consumers, {output_mode} ...", flush=True)
+
+        output = context.Queue()
+        process = context.Process(target=run_config, args=(config, output))
+        process.start()
+        try:
+            result = output.get(timeout=args.duration + 120)
+        except queue.Empty:
+            print("  ✗ configuration timed out")
+            process.terminate()
+            continue
+        process.join()
+        results.append(result)
+
+        latency = result["latency_ms"]
+        print(f"  in {result['throughput_in_pps']:.0f} pkt/s, out {result['throughput_out_mps']:.0f} msg/s, "
+              f"p50 {latency['p50']:.2f} ms, p99 {latency['p99']:.2f} ms, p999 {latency['p999']:.2f} ms, "
+              f"loss {result['loss']:.2%}, CPU {result['cpu_percent']:.0f}%, RSS {result['peak_rss_mb']:.0f} MB")
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count()
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"  ⚠️  Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
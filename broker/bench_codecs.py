@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Codec Benchmark
+
+Compares the available WebSocket codecs (json, orjson, msgpack) on realistic
+broker payloads: a single per-packet message with signal_stats, a tick frame
+and a get_status response covering many users.
+
+Usage:
+    python bench_codecs.py
+    python bench_codecs.py --users 200 --iterations 2000
+"""
+
+import argparse
+import random
+import time
+import timeit
+from datetime import datetime
+
+from bpm_codecs import CODECS
+
+def make_user_message(user_id: int) -> dict:
+    """A message shaped like the broker's per-packet output"""
+    bpm = random.uniform(60, 100)
+    return {
+        "user": user_id,
+        "bpm": bpm,
+        "timestamp": random.randint(0, 2**31),
+        "signal_strength": random.randint(-70, -30),
+        "ir_value": random.randint(50000, 120000),
+        "red_value": random.randint(40000, 100000),
+        "finger_detected": True,
+        "sensor_type": "MAX30102",
+        "bpm_raw": bpm + random.gauss(0, 2),
+        "bpm_smoothed": True,
+        "signal_stats": {
+            "mean": bpm + random.gauss(0, 1),
+            "std": abs(random.gauss(2, 1)),
+            "min": bpm - 8,
+            "max": bpm + 8,
+            "last": bpm
+        },
+        "no_heart_rate": False,
+        "server_timestamp": time.time(),
+        "source_ip": f"192.168.1.{100 + user_id % 150}",
+        "received_at": datetime.now().isoformat()
+    }
+
+def make_payloads(users: int) -> dict:
+    """Build the benchmark payloads"""
+    latest = {user_id: make_user_message(user_id) for user_id in range(1, users + 1)}
+    return {
+        "packet": latest[1],
+        "frame": {
+            "type": "frame",
+            "frame": 1234,
+            "users": latest,
+            "timestamp": time.time()
+        },
+        "status": {
+            "type": "status_response",
+            "active_devices": list(latest.keys()),
+            "connected_clients": 12,
+            "latest_data": latest,
+            "smoothing_enabled": True,
+            "smoothing_config": {"alpha": 0.3, "history_length": 100},
+            "timestamp": time.time()
+        }
+    }
+
+def bench(func, iterations: int) -> float:
+    """Best-of-5 time per call in microseconds"""
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=5, number=iterations)) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WebSocket codecs")
+    parser.add_argument("--users", type=int, default=50,
+                        help="Users in frame/status payloads (default: 50)")
+    parser.add_argument("--iterations", type=int, default=1000,
+                        help="Calls per timing run (default: 1000)")
+    parser.add_argument("--clients", type=int, default=50,
+                        help="Clients for the encode-once vs per-client comparison (default: 50)")
+    args = parser.parse_args()
+
+    random.seed(1)
+    payloads = make_payloads(args.users)
+
+    print(f"Codec benchmark ({args.users} users, {args.iterations} iterations)")
+    print(f"Codecs available: {', '.join(CODECS)}")
+    print("-" * 72)
+    print(f"{'payload':<8} {'codec':<8} {'bytes':>8} {'encode µs':>11} {'decode µs':>11} {'vs json':>9}")
+
+    for payload_name, payload in payloads.items():
+        iterations = args.iterations if payload_name == "packet" else max(1, args.iterations // 10)
+        baseline = None
+
+        for name, codec in CODECS.items():
+            encoded = codec.encode(payload)
+            size = len(encoded.encode("utf-8") if isinstance(encoded, str) else encoded)
+            encode_us = bench(lambda: codec.encode(payload), iterations)
+            decode_us = bench(lambda: codec.decode(encoded), iterations)
+            if baseline is None:
+                baseline = encode_us
+
+            print(f"{payload_name:<8} {name:<8} {size:>8} {encode_us:>11.2f} {decode_us:>11.2f} "
+                  f"{baseline / encode_us:>8.1f}x")
+
+    # Fan-out: serializing once and sharing the payload vs once per client
+    packet = payloads["packet"]
+    codec = CODECS["json"]
+    per_client_us = bench(lambda: [codec.encode(packet) for _ in range(args.clients)], max(1, args.iterations // 10))
+    once_us = bench(lambda: [codec.encode(packet)] * args.clients, max(1, args.iterations // 10))
+
+    print("-" * 72)
+    print(f"Fan-out to {args.clients} clients (json): "
+          f"per-client {per_client_us:.1f} µs, encode-once {once_us:.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Broker Startup Benchmark
+
+Launches the broker in a fresh interpreter and measures the time from
+process launch until its UDP and WebSocket servers are both listening,
+split into phases:
+
+    interpreter  launch until this script's first line runs
+    imports      importing bpm_broker and its dependencies
+    construct    BPMBroker()
+    listen       run() until UDP and WebSocket are both bound
+
+It also records which heavy optional dependencies (NumPy, SciPy) had been
+imported by then; with the default configuration there should be none.
+Each run is a new process, so nothing is cached between runs except what
+the OS keeps (use --runs to see the spread, the first run is often slower).
+
+Usage:
+    python bench_startup.py --runs 10
+    python bench_startup.py --set SMOOTHING_ENGINE='"vector"' --set PRELOAD_ANALYTICS=True
+    python bench_startup.py --baseline startup_results_old.json   # exit 1 on regression
+"""
+
+import time
+
+STARTED = time.time()  # Before anything else is imported
+
+import argparse
+import ast
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+DEFAULT_UDP_PORT = 18888
+DEFAULT_WS_PORT = 16789
+PHASES = ("interpreter", "imports", "construct", "listen", "total")
+HEAVY_MODULES = ("numpy", "scipy", "scipy.signal")
+
+# --- Broker under test ------------------------------------------------------
+
+def run_child(config: dict):
+    """Start the broker in this process and print the phase timings as one JSON line"""
+    import bpm_broker
+    imported = time.time()
+
+    bpm_broker.UDP_HOST = "127.0.0.1"
+    bpm_broker.UDP_PORT = config["udp_port"]
+    bpm_broker.WEBSOCKET_HOST = "127.0.0.1"
+    bpm_broker.WEBSOCKET_PORT = config["ws_port"]
+    bpm_broker.METRICS_ENABLED = False
+    for name, value in config["overrides"].items():
+        if not hasattr(bpm_broker, name):
+            raise SystemExit(f"Unknown setting: {name}")
+        setattr(bpm_broker, name, value)
+    if not config["verbose"]:
+        logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+        logging.getLogger("websockets").setLevel(logging.WARNING)
+
+    print(json.dumps(asyncio.run(_run_broker(bpm_broker, config, imported))), flush=True)
+
+async def _run_broker(bpm_broker, config: dict, imported: float) -> dict:
+    broker = bpm_broker.BPMBroker()
+    constructed = time.time()
+
+    broker_task = asyncio.create_task(broker.run())
+    await asyncio.wait_for(broker.listening.wait(), 60)
+    listening = time.time()
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    broker_task.cancel()
+    try:
+        await broker_task
+    except asyncio.CancelledError:
+        pass
+
+    launched = config["launched"]
+    return {
+        "interpreter": STARTED - launched,
+        "imports": imported - STARTED,
+        "construct": constructed - imported,
+        "listen": listening - constructed,
+        "total": listening - launched,
+        "heavy_modules": loaded
+    }
+
+# --- Orchestration ----------------------------------------------------------
+
+def parse_override(text: str) -> tuple:
+    """NAME=VALUE, with VALUE as a Python literal (or a plain string)"""
+    name, _, value = text.partition("=")
+    if not name or not _:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    try:
+        return name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name, value
+
+def run_once(config: dict, timeout: float) -> dict:
+    """One broker start in a fresh interpreter"""
+    config = dict(config, launched=time.time())
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(config)],
+                               capture_output=True, text=True, timeout=timeout,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip() or f"exit code {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def summarize(runs: list) -> dict:
+    """Median, min and max per phase in milliseconds"""
+    summary = {}
+    for phase in PHASES:
+        values = sorted(run[phase] * 1000.0 for run in runs)
+        middle = len(values) // 2
+        median = values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+        summary[phase] = {"median": round(median, 1), "min": round(values[0], 1), "max": round(values[-1], 1)}
+    return summary
+
+def compare(result: dict, baseline_path: str, tolerance: float) -> list:
+    """Regressions against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["result"]
+    regressions = []
+    old, new = baseline["startup_ms"]["total"]["median"], result["startup_ms"]["total"]["median"]
+    if new > old * (1 + tolerance):
+        regressions.append(f"time to listening {new:.0f} ms vs {old:.0f} ms")
+    added = sorted(set(result["heavy_modules"]) - set(baseline["heavy_modules"]))
+    if added:
+        regressions.append(f"now imported at startup: {', '.join(added)}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure BPM broker startup time")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh broker processes to start (default: 5)")
+    parser.add_argument("--set", dest="overrides", type=parse_override, action="append", default=[],
+                        metavar="NAME=VALUE", help="Override a bpm_broker setting (repeatable)")
+    parser.add_argument("--udp-port", type=int, default=DEFAULT_UDP_PORT)
+    parser.add_argument("--ws-port", type=int, default=DEFAULT_WS_PORT)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds allowed per run (default: 60)")
+    parser.add_argument("--output", default="startup_results.json",
+                        help="Where to write the JSON results (default: startup_results.json)")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression vs the baseline (default: 0.2)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the broker's INFO logging")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    config = {
+        "udp_port": args.udp_port,
+        "ws_port": args.ws_port,
+        "overrides": dict(args.overrides),
+        "verbose": args.verbose
+    }
+    runs = []
+    for index in range(args.runs):
+        run = run_once(config, args.timeout)
+        runs.append(run)
+        print(f"▶ run {index + 1}: listening after {run['total'] * 1000:.0f} ms "
+              f"(interpreter {run['interpreter'] * 1000:.0f}, imports {run['imports'] * 1000:.0f}, "
+              f"construct {run['construct'] * 1000:.0f}, listen {run['listen'] * 1000:.0f})", flush=True)
+
+    heavy = sorted({name for run in runs for name in run["heavy_modules"]})
+    result = {
+        "config": {"overrides": config["overrides"], "runs": args.runs},
+        "startup_ms": summarize(runs),
+        "heavy_modules": heavy
+    }
+    total = result["startup_ms"]["total"]
+    print(f"Listening after {total['median']:.0f} ms median (min {total['min']:.0f}, max {total['max']:.0f}); "
+          f"heavy modules at startup: {', '.join(heavy) or 'none'}")
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count()
+        },
+        "result": result
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(result, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"  ⚠️  Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Broker-side beat detection on raw PPG waveforms for the BPM Broker
+
+Devices in PPG streaming mode send batches of raw IR samples (e.g. 25
+samples at 100 Hz, see WAVEFORM_MAGIC in bpm_packet.py) instead of a BPM
+computed on the ESP32. Each batch is handled as one chunk of a continuous
+signal:
+
+    band-pass  Butterworth second-order sections (PPG_BANDPASS_HZ) removing
+               the DC level and baseline wander, with the filter state (zi)
+               carried from one chunk to the next
+    peaks      scipy.signal.find_peaks over the chunk plus the last couple of
+               seconds of filtered signal, keeping peaks whose prominence is
+               at least PROMINENCE_FRACTION of the signal's peak-to-peak
+               amplitude around them (adapts to contact pressure and skin)
+    beats      peaks at least PPG_MIN_BEAT_INTERVAL apart; BPM comes from the
+               median of the last few inter-beat intervals
+
+A peak only becomes final once a full neighbourhood on both sides of it
+has arrived, so the same waveform gives the same beats however it is split
+into packets, at the cost of about half a context window of latency.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+BANDPASS_ORDER = 2
+PROMINENCE_FRACTION = 0.5  # Minimum peak prominence as a share of the local peak-to-peak amplitude
+IBI_AVERAGE = 4  # Inter-beat intervals in the BPM median
+GAP_TOLERANCE = 2.5  # Sample periods a chunk may start late before the detector restarts
+ABSENT_REPORT_MS = 1000  # Finger-off readings are reported at most this often (device time)
+MIN_DETECTED_BPM = 30
+MAX_DETECTED_BPM = 220
+
+class BeatDetector:
+    """Incremental beat detector for one device's waveform"""
+
+    def __init__(self, sample_rate: int, bandpass_hz: tuple = (0.5, 4.0),
+                 min_interval: float = 0.3, finger_threshold: float = 20000,
+                 context_seconds: float = 2.0):
+        self.sample_rate = sample_rate
+        self.sos = signal.butter(BANDPASS_ORDER, bandpass_hz, btype="bandpass", fs=sample_rate, output="sos")
+        self.steady_state = signal.sosfilt_zi(self.sos)
+        self.distance = max(1, int(round(min_interval * sample_rate)))
+        self.half_window = max(self.distance, int(round(context_seconds * sample_rate / 2)))
+        self.finger_threshold = finger_threshold
+
+        # Counters
+        self.chunks = 0
+        self.beats_detected = 0
+        self.resets = 0
+        self.absent_reported_ms: Optional[float] = None
+
+        self.reset()
+
+    def reset(self):
+        """Forget the signal (finger lifted, gap in the stream)"""
+        self.zi: Optional[np.ndarray] = None
+        self.tail = np.empty(0)  # Filtered samples kept for the next chunk
+        self.tail_start = 0  # Sample index of tail[0]
+        self.next_index = 0  # Sample index of the next sample to arrive
+        self.start_ms = 0.0  # Device time of sample 0
+        self.final_upto = 0  # Peaks before this index are already decided
+        self.last_beat: Optional[int] = None
+        self.intervals: deque = deque(maxlen=IBI_AVERAGE)
+
+    def expected_ms(self) -> float:
+        return self.start_ms + self.next_index * 1000.0 / self.sample_rate
+
+    def process(self, timestamp_ms: int, samples) -> Optional[Dict[str, Any]]:
+        """Feed one chunk (a sequence of raw IR samples); returns a reading when there is something new to publish"""
+        self.chunks += 1
+        if len(samples) == 0:
+            return None
+
+        samples = np.asarray(samples, dtype=np.float64)
+        ir_value = float(samples[-1])
+        if samples.mean() < self.finger_threshold:
+            if self.zi is not None:
+                self.resets += 1
+                self.reset()
+            if (self.absent_reported_ms is not None
+                    and 0 <= timestamp_ms - self.absent_reported_ms < ABSENT_REPORT_MS):
+                return None
+            self.absent_reported_ms = timestamp_ms
+            return {"bpm": 0, "ir_value": ir_value, "finger_detected": False, "source": "ppg"}
+
+        self.absent_reported_ms = None
+        if self.zi is not None and abs(timestamp_ms - self.expected_ms()) > GAP_TOLERANCE * 1000.0 / self.sample_rate:
+            self.resets += 1
+            self.reset()
+        if self.zi is None:
+            self.start_ms = float(timestamp_ms)
+            self.zi = self.steady_state * samples[0]
+
+        filtered, self.zi = signal.sosfilt(self.sos, samples, zi=self.zi)
+        self.next_index += len(samples)
+        buffer = np.concatenate((self.tail, filtered))
+        beats, intervals = self._find_beats(buffer)
+
+        keep = min(len(buffer), 2 * self.half_window)
+        self.tail = buffer[len(buffer) - keep:]
+        self.tail_start = self.next_index - keep
+
+        if not beats:
+            return None
+        reading = {
+            "bpm": 0,
+            "ir_value": ir_value,
+            "finger_detected": True,
+            "source": "ppg",
+            "beats": [round(self.start_ms + index * 1000.0 / self.sample_rate) for index in beats],
+            "ibi_ms": [round(interval) for interval in intervals]
+        }
+        if self.intervals:
+            bpm = 60000.0 / float(np.median(self.intervals))
+            if MIN_DETECTED_BPM <= bpm <= MAX_DETECTED_BPM:
+                reading["bpm"] = round(bpm, 1)
+        return reading
+
+    def _find_beats(self, buffer: np.ndarray) -> Tuple[List[int], List[float]]:
+        """Newly final peak indices (absolute) and the intervals leading up to them"""
+        half = self.half_window
+        # Peaks need `half` samples on both sides before they are decided
+        decide_upto = self.next_index - half
+        if decide_upto <= self.final_upto:
+            return [], []
+
+        peaks, properties = signal.find_peaks(buffer, prominence=0, wlen=2 * half + 1)
+        absolute = peaks + self.tail_start
+        # Peaks right after a restart are decided without a full window on their left
+        candidate = (absolute >= self.final_upto) & (absolute < decide_upto) & ((peaks >= half) | (self.tail_start == 0))
+        self.final_upto = decide_upto
+        if not candidate.any():
+            return [], []
+
+        peaks, absolute = peaks[candidate], absolute[candidate]
+        prominences = properties["prominences"][candidate]
+
+        # Local peak-to-peak amplitude in the same window the prominence used
+        padded = np.pad(buffer, half, mode="edge")
+        windows = sliding_window_view(padded, 2 * half + 1)[peaks]
+        amplitude = windows.max(axis=1) - windows.min(axis=1)
+        strong = prominences >= PROMINENCE_FRACTION * amplitude
+
+        beats, intervals = [], []
+        for index in absolute[strong].tolist():
+            if self.last_beat is not None:
+                gap = index - self.last_beat
+                if gap < self.distance:
+                    continue
+                intervals.append(gap * 1000.0 / self.sample_rate)
+            self.last_beat = index
+            beats.append(index)
+        self.intervals.extend(intervals)
+        self.beats_detected += len(beats)
+        return beats, intervals
+
+class BeatDetectorStore:
+    """One BeatDetector per user, created on the first waveform packet"""
+
+    def __init__(self, bandpass_hz: tuple = (0.5, 4.0), min_interval: float = 0.3,
+                 finger_threshold: float = 20000, context_seconds: float = 2.0):
+        self.bandpass_hz = bandpass_hz
+        self.min_interval = min_interval
+        self.finger_threshold = finger_threshold
+        self.context_seconds = context_seconds
+        self.detectors: Dict[Any, BeatDetector] = {}
+        self.packets = 0
+        self.samples = 0
+
+    def process(self, user_id: Any, timestamp_ms: int, sample_rate: int, samples) -> Optional[Dict[str, Any]]:
+        self.packets += 1
+        self.samples += len(samples)
+        detector = self.detectors.get(user_id)
+        if detector is None or detector.sample_rate != sample_rate:
+            detector = self.detectors[user_id] = BeatDetector(
+                sample_rate, self.bandpass_hz, self.min_interval, self.finger_threshold, self.context_seconds)
+        return detector.process(timestamp_ms, samples)
+
+    def remove(self, user_id: Any):
+        self.detectors.pop(user_id, None)
+
+    def get_stats(self) -> dict:
+        return {
+            "devices": len(self.detectors),
+            "packets": self.packets,
+            "samples": self.samples,
+            "beats": sum(detector.beats_detected for detector in self.detectors.values()),
+            "resets": sum(detector.resets for detector in self.detectors.values())
+        }
@@ -14,38 +14,130 @@ License: MIT
 """
 
 import asyncio
+import importlib
+import os
 import websockets
 import json
 import socket
 import logging
+import math
 import time
 import threading
 from datetime import datetime
-from typing import Set, Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 from collections import deque
-import numpy as np
 
+from urllib.parse import urlparse, parse_qs
+
+from bpm_packet import is_binary_packet, decode_packet, is_waveform_packet, decode_waveform
+from bpm_codecs import Codec, EncodedMessage, SnapshotMessage, get_codec, decode_command
+from bpm_workers import IngestWorkerPool
+from bpm_recorder import SessionRecorder
+from bpm_logging import setup_logging, get_logging_stats, forget_logged_user
+from bpm_metrics import BrokerMetrics, MetricsServer, Histogram
+from bpm_filters import FilterChain, build_filter_chain
+from bpm_delta import DeltaEncoder
+from bpm_lifecycle import UserLifecycle
+from bpm_static import DashboardAssets, supports_dashboard
+from bpm_history import HistoryStore
+from bpm_link import LinkMonitor
+
+# NumPy/SciPy-backed features are imported when first used (see ANALYTICS_MODULES)
+if TYPE_CHECKING:
+    from bpm_engine import VectorSmoothingEngine
+    from bpm_sync import SynchronyEngine
+    from bpm_beats import BeatDetectorStore
 
-from scipy import signal
 
 # Configuration
 UDP_HOST = "0.0.0.0"
 UDP_PORT = 8888
 WEBSOCKET_HOST = "0.0.0.0"
 WEBSOCKET_PORT = 6789
+SERVE_DASHBOARD = False  # Also serve the web dashboard over plain HTTP on WEBSOCKET_PORT
+DASHBOARD_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web_dashboard"))
 
 # Signal processing configuration
 SMOOTHING_ENABLED = True
 SMOOTHING_ALPHA = 0.3  # Exponential moving average factor (0-1, lower = more smoothing)
 HISTORY_LENGTH = 100  # Number of samples to keep in history
+HISTORY_TIERS = ((1.0, 3600), (10.0, 2160), (60.0, 1440))  # Rollups: (bucket seconds, buckets kept) - 1 h, 6 h, 24 h
+HISTORY_MAX_POINTS = 2000  # Most points a get_history_range response may return
 MIN_BPM = 40  # Minimum valid BPM
 MAX_BPM = 200  # Maximum valid BPM
-
-# Logging setup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+FILTER_CHAIN = ("ema",)  # Any of "hampel", "median", "butterworth", then "ema" last, e.g. ("hampel", "butterworth", "ema")
+HAMPEL_WINDOW = 7  # Readings in the Hampel outlier window
+HAMPEL_SIGMAS = 3.0  # Outlier threshold in (MAD-estimated) standard deviations
+MEDIAN_WINDOW = 5  # Readings in the median filter window
+BUTTERWORTH_ORDER = 2  # Low-pass filter order
+BUTTERWORTH_CUTOFF_HZ = 0.15  # Low-pass cutoff frequency
+FILTER_SAMPLE_RATE_HZ = 1.0  # Rate at which devices send readings (BPM_SEND_INTERVAL)
+SMOOTHING_ENGINE = "scalar"  # "scalar" (one SignalSmoother per user) or "vector" (NumPy arrays, whole batches at once)
+
+# Raw PPG waveform streaming (firmware built with USE_PPG_STREAMING)
+PPG_BANDPASS_HZ = (0.5, 4.0)  # Band-pass applied before peak finding (30-240 BPM)
+PPG_MIN_BEAT_INTERVAL = 0.3  # Seconds; closer peaks are treated as the same beat
+PPG_FINGER_THRESHOLD = 20000  # Mean IR below this means no finger (same as the firmware)
+PPG_CONTEXT_SECONDS = 2.0  # Filtered signal kept across packets for peak finding
+
+# UDP ingest configuration
+INGEST_QUEUE_SIZE = 4096  # Max datagrams buffered between the UDP socket and the broker
+INGEST_OVERFLOW_POLICY = "drop_oldest"  # "drop_oldest" or "drop_newest" when the buffer is full
+INGEST_BATCH_SIZE = 512  # Max datagrams processed per drain before yielding to the loop
+INGEST_WORKERS = 0  # Worker processes sharing the UDP port via SO_REUSEPORT (0 = single process)
+
+# Pairwise synchrony configuration
+SYNC_ENABLED = True  # Track synchrony between every pair of active users
+SYNC_INTERVAL_SECONDS = 1.0  # One synchrony tick (and frame) per interval
+SYNC_WINDOW = 60  # Ticks in the synchrony window
+SYNC_MAX_LAG = 5  # Largest cross-correlation lag in ticks
+SYNC_THRESHOLD_BPM = 4.0  # Pairs within this many BPM count as "in sync"
+SYNC_STALE_SECONDS = 3.0  # Readings older than this are treated as missing
+
+# Per-user state lifecycle
+USER_STALE_SECONDS = 30.0  # Users silent this long are reported as stale
+USER_EVICT_SECONDS = 600.0  # Users silent this long have all their state dropped
+MAX_TRACKED_USERS = 1024  # Hard cap; the least recently seen user is evicted first
+USER_SWEEP_INTERVAL = 1.0  # Seconds between stale/eviction sweeps
+
+# Link quality (packet loss from "seq" numbers, clock offset/drift and latency from device timestamps)
+LINK_STATS_ENABLED = True
+
+# Startup (NumPy/SciPy-backed features are imported on first use)
+PRELOAD_ANALYTICS = False  # Import them in the background once listening, instead of on first use
+ANALYTICS_MODULES = ("bpm_sync", "bpm_beats", "bpm_engine")  # Modules that pull in NumPy/SciPy
+
+# Session recording configuration
+RECORDING_ENABLED = False  # Record every published sample to memory-mapped segment files
+RECORDING_DIR = "recordings"  # One sub-directory per broker session
+RECORDING_SEGMENT_SECONDS = 600  # Start a new segment file per user after this many seconds
+
+# WebSocket output mode
+OUTPUT_MODE = "per_packet"  # "per_packet" (one message per UDP packet) or "tick" (one combined frame per tick)
+TICK_RATE_HZ = 30  # Frame rate in "tick" mode (e.g. 30 or 60 to match TouchDesigner)
+
+# WebSocket client output configuration
+CLIENT_QUEUE_SIZE = 256  # Max messages buffered per client before the policy kicks in
+CLIENT_QUEUE_POLICY = "drop_oldest"  # "drop_oldest", "conflate" (latest per user) or "disconnect"
+CLIENT_BACKLOG_TIMEOUT = 5.0  # Seconds of backlog tolerated under the "disconnect" policy
+SNAPSHOT_INTERVAL = 0.1  # Status/statistics/bootstrap snapshots are rebuilt at most this often
+
+# Delta stream mode (clients connecting with ?stream=delta)
+DELTA_KEYFRAME_INTERVAL = 50  # Full keyframe every N messages per user
+DELTA_EPSILON = 0.05  # Numeric changes up to this size are not sent
+DELTA_KEEPALIVE_SECONDS = 5.0  # Send an update at least this often while data keeps arriving
+DELTA_VOLATILE_FIELDS = ("timestamp", "server_timestamp", "received_at")  # Never a reason to send on their own
+
+# Metrics endpoint (Prometheus text format; stage timings are always collected)
+METRICS_ENABLED = True  # Serve http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_HOST = "127.0.0.1"  # Local only by default
+METRICS_PORT = 9108
+
+# Logging setup (records are written by a background thread)
+LOG_LEVEL = logging.INFO
+LOG_USER_INTERVAL = 5.0  # Seconds between per-user log lines (0 = log every packet)
+
+setup_logging(LOG_LEVEL, LOG_USER_INTERVAL)
 logger = logging.getLogger(__name__)
 
 # Global broker instance for WebSocket handler
@@ -58,15 +150,105 @@ async def websocket_connection_handler(websocket, path=None):
         await websocket.close()
         return
 
-    return await _broker_instance.handle_websocket_connection(websocket, path or "/")
+    return await _broker_instance.handle_websocket_connection(websocket, path)
+
+class RollingStatistics:
+    """Windowed mean/std/min/max updated in O(1) per sample
+
+    Mean and variance use Welford's update with removal of the sample that
+    leaves the window; min and max use monotonic deques. The running sums are
+    recomputed from the window once per window length to stop float drift.
+    """
+
+    def __init__(self, window: int = HISTORY_LENGTH):
+        self.window = window
+        self.values: deque = deque()
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared differences from the mean
+        self.index = 0  # Index of the next sample
+        self.min_candidates: deque = deque()  # (index, value), values increasing
+        self.max_candidates: deque = deque()  # (index, value), values decreasing
+        self.removals = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value: float):
+        """Add a sample, evicting the oldest one if the window is full"""
+        values = self.values
+
+        if len(values) == self.window:
+            old = values.popleft()
+            values.append(value)
+            old_mean = self.mean
+            self.mean += (value - old) / self.window
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+
+            self.removals += 1
+            if self.removals >= self.window:
+                self._resync()
+        else:
+            values.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(values)
+            self.m2 += delta * (value - self.mean)
+
+        # Monotonic deques for window min/max
+        index = self.index
+        self.index += 1
+        oldest = index - len(values) + 1
+
+        min_candidates = self.min_candidates
+        while min_candidates and min_candidates[-1][1] >= value:
+            min_candidates.pop()
+        min_candidates.append((index, value))
+        if min_candidates[0][0] < oldest:
+            min_candidates.popleft()
+
+        max_candidates = self.max_candidates
+        while max_candidates and max_candidates[-1][1] <= value:
+            max_candidates.pop()
+        max_candidates.append((index, value))
+        if max_candidates[0][0] < oldest:
+            max_candidates.popleft()
+
+    def _resync(self):
+        """Recompute mean and M2 exactly from the current window"""
+        values = self.values
+        mean = sum(values) / len(values)
+        self.mean = mean
+        self.m2 = sum((v - mean) ** 2 for v in values)
+        self.removals = 0
+
+    def get_statistics(self) -> Dict[str, float]:
+        """Get mean, std, min, max and last value of the window"""
+        if not self.values:
+            return {}
+
+        return {
+            "mean": float(self.mean),
+            "std": float(math.sqrt(max(self.m2, 0.0) / len(self.values))),
+            "min": float(self.min_candidates[0][1]),
+            "max": float(self.max_candidates[0][1]),
+            "last": float(self.values[-1])
+        }
 
 class SignalSmoother:
-    """Signal smoothing and filtering for heart rate data"""
+    """Signal smoothing and filtering for heart rate data
+
+    In-range readings pass through the optional filter chain (outlier
+    rejection, low-pass) before the EMA.
+    """
 
-    def __init__(self, alpha: float = SMOOTHING_ALPHA):
+    def __init__(self, alpha: float = SMOOTHING_ALPHA, user_id: Any = None,
+                 filters: Optional[FilterChain] = None):
         self.alpha = alpha  # EMA factor
+        self.user_id = user_id  # Only used to tag log records
+        self.filters = filters if filters is not None and filters.stages else None
+        self.use_ema = filters is None or filters.ema
         self.last_value: Optional[float] = None
         self.history: deque = deque(maxlen=HISTORY_LENGTH)
+        self.statistics = RollingStatistics(HISTORY_LENGTH)
         self.startup_readings = 0  # Count of readings since startup/reset
         self.startup_threshold = 10  # Skip smoothing for first 10 readings
 
@@ -74,25 +256,62 @@ class SignalSmoother:
         """Add a new sample and return the smoothed value"""
         # Basic range validation
         if value < MIN_BPM or value > MAX_BPM:
-            logger.warning(f"BPM value {value} outside valid range ({MIN_BPM}-{MAX_BPM})")
+            logger.warning("BPM value %s outside valid range (%s-%s)", value, MIN_BPM, MAX_BPM,
+                           extra={"user_id": self.user_id})
             return self.last_value or value
 
+        if self.filters is not None:
+            value = self.filters.process_one(value)
+
+        return self._add_filtered(value)
+
+    def add_samples(self, values: list) -> tuple:
+        """Add a run of samples at once
+
+        The filter chain runs once over all in-range values. Returns the
+        smoothed value and the statistics after each sample.
+        """
+        in_range = [MIN_BPM <= value <= MAX_BPM for value in values]
+        accepted = [value for value, ok in zip(values, in_range) if ok]
+        if self.filters is not None and accepted:
+            accepted = self.filters.process(accepted).tolist()
+        filtered = iter(accepted)
+
+        smoothed_values = []
+        statistics = []
+        for value, ok in zip(values, in_range):
+            if ok:
+                smoothed_values.append(self._add_filtered(next(filtered)))
+            else:
+                logger.warning("BPM value %s outside valid range (%s-%s)", value, MIN_BPM, MAX_BPM,
+                               extra={"user_id": self.user_id})
+                smoothed_values.append(self.last_value or value)
+            statistics.append(self.statistics.get_statistics())
+
+        return smoothed_values, statistics
+
+    def _add_filtered(self, value: float) -> float:
+        """Apply the startup period and EMA to an in-range, filtered sample"""
         # Skip smoothing for the first 10 readings to let sensor stabilize
         if self.startup_readings < self.startup_threshold:
             self.startup_readings += 1
             self.last_value = value
             self.history.append(value)
-            logger.info(f"Startup reading {self.startup_readings}/{self.startup_threshold}: {value:.1f} BPM (no smoothing)")
+            self.statistics.add(value)
+            logger.info("Startup reading %d/%d: %.1f BPM (no smoothing)",
+                        self.startup_readings, self.startup_threshold, value,
+                        extra={"user_id": self.user_id})
             return value
 
         # Exponential moving average (normal operation)
-        if self.last_value is None:
+        if self.last_value is None or not self.use_ema:
             smoothed_value = value
         else:
             smoothed_value = self.alpha * value + (1 - self.alpha) * self.last_value
 
         self.last_value = smoothed_value
         self.history.append(smoothed_value)
+        self.statistics.add(smoothed_value)
 
         return smoothed_value
 
@@ -100,8 +319,10 @@ class SignalSmoother:
         """Reset the smoother for a new finger detection session"""
         self.startup_readings = 0
         self.last_value = None
+        if self.filters is not None:
+            self.filters.reset()
         # Keep some history but clear startup state
-        logger.info("Signal smoother reset for new finger detection session")
+        logger.info("Signal smoother reset for new finger detection session", extra={"user_id": self.user_id})
 
     def get_history(self) -> list:
         """Get the complete history of smoothed values"""
@@ -109,16 +330,437 @@ class SignalSmoother:
 
     def get_statistics(self) -> Dict[str, float]:
         """Get basic statistics of the signal"""
-        if not self.history:
-            return {}
+        return self.statistics.get_statistics()
+
+class ClientSession:
+    """Bounded outbound queue and writer task for a single WebSocket client
+
+    Broadcasts only enqueue messages, so a stalled client can never hold up
+    the UDP pipeline or the other clients. What happens when the queue fills
+    up is decided by the queue policy:
+
+    - "drop_oldest": discard the oldest pending message
+    - "conflate": keep only the latest pending message per user
+    - "disconnect": close the client once its backlog is older than
+      CLIENT_BACKLOG_TIMEOUT seconds (or the queue is full)
+
+    Clients can also subscribe to a subset of users and fields, with a
+    maximum update rate per user; updates beyond the rate are held back and
+    only the latest one is sent when the interval has passed.
+    """
+
+    POLICIES = ("drop_oldest", "conflate", "disconnect")
+
+    def __init__(self, websocket, client_ip: str = "unknown",
+                 codec: Optional[Codec] = None,
+                 max_size: int = CLIENT_QUEUE_SIZE,
+                 policy: str = CLIENT_QUEUE_POLICY,
+                 backlog_timeout: float = CLIENT_BACKLOG_TIMEOUT,
+                 metrics: Optional[BrokerMetrics] = None,
+                 delta: Optional[DeltaEncoder] = None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown client queue policy: {policy}")
+
+        self.websocket = websocket
+        self.client_ip = client_ip
+        self.codec = codec or get_codec()
+        self.max_size = max_size
+        self.policy = policy
+        self.backlog_timeout = backlog_timeout
+        self.metrics = metrics
+        self.delta = delta  # Delta stream mode: broadcasts are queued as dicts and encoded by the writer
+
+        # Each entry is [key, message, enqueued_at]; entries are mutable so
+        # conflation can swap in a newer message without moving it
+        self.queue: deque = deque()
+        self.pending_by_key: Dict[Any, list] = {}
+        self.wakeup = asyncio.Event()
+        self.writer_task: Optional[asyncio.Task] = None
+        self.closing = False
+
+        # Counters
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_depth = 0
+        self.rate_limited = 0
+        self.connected_at = time.time()
+        self.queue_wait = Histogram()  # Time messages spend queued for this client
+
+        # Subscription (defaults: every user, every field, no rate cap)
+        self.users: Optional[set] = None  # None = all users
+        self.excluded_users: set = set()  # Unsubscribed while subscribed to all
+        self.fields: Optional[tuple] = None  # None = all fields
+        self.min_interval = 0.0  # Seconds between updates per user (0 = no cap)
+        self.view_key: Optional[tuple] = None  # Identifies the subscription; None = default
+        self.next_due: Dict[Any, float] = {}  # key -> earliest time of the next update
+        self.held: Dict[Any, Any] = {}  # key -> latest update held back by the rate cap
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.sync = False  # Receive pairwise synchrony frames
+
+    def subscribe(self, users: Optional[list] = None, fields: Optional[list] = None,
+                  max_rate_hz: Optional[float] = None, set_fields: bool = False,
+                  set_rate: bool = False, sync: Optional[bool] = None):
+        """Subscribe to users and optionally change the field projection and rate cap
+
+        users=None subscribes to every user; a list switches from "every
+        user" to an explicit list, or adds to the existing one.
+        """
+        self.excluded_users = set()
+        if users is None:
+            self.users = None
+        elif self.users is None:
+            self.users = set(users)
+        else:
+            self.users |= set(users)
+        if set_fields:
+            self.fields = tuple(fields) if fields else None
+        if set_rate:
+            self.min_interval = 1.0 / max_rate_hz if max_rate_hz and max_rate_hz > 0 else 0.0
+        if sync is not None:
+            self.sync = sync
+        self._update_view_key()
+
+    def unsubscribe(self, users: Optional[list] = None):
+        """Remove users from the subscription (None = all users)"""
+        if users is None:
+            self.users = set()
+            self.excluded_users = set()
+        elif self.users is None:
+            self.excluded_users |= set(users)
+        else:
+            self.users -= set(users)
+        for user_id in users if users is not None else list(self.held):
+            self.held.pop(user_id, None)
+        self._update_view_key()
+
+    def _update_view_key(self):
+        if self.users is None and not self.excluded_users and self.fields is None:
+            self.view_key = None
+        else:
+            self.view_key = (None if self.users is None else frozenset(self.users),
+                             frozenset(self.excluded_users), self.fields)
+
+    def wants(self, user_id: Any) -> bool:
+        """Whether updates for a user are subscribed"""
+        if self.users is None:
+            return user_id not in self.excluded_users
+        return user_id in self.users
+
+    def project(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the subscribed fields (plus the user id and message type)"""
+        if self.fields is None:
+            return data
+        projected = {field: data[field] for field in ('type', 'user') if field in data}
+        for field in self.fields:
+            if field in data:
+                projected[field] = data[field]
+        return projected
+
+    def select(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The part of a broadcast this client subscribed to (None = nothing)"""
+        if data.get('type') == 'frame':
+            users = {user_id: self.project(user_data) for user_id, user_data in data['users'].items()
+                     if self.wants(user_id)}
+            return {**data, 'users': users} if users else None
+
+        user_id = data.get('user')
+        if user_id is not None and not self.wants(user_id):
+            return None
+        return self.project(data)
+
+    def payload(self, data: Dict[str, Any]):
+        """What to queue for a broadcast dict: encoded, or as-is in delta mode"""
+        return data if self.delta is not None else self.codec.encode(data)
+
+    def offer(self, message, key: Any = None) -> bool:
+        """Queue a broadcast update, applying the client's rate cap per key"""
+        if not self.min_interval:
+            return self.enqueue(message, key)
+
+        now = time.monotonic()
+        due = self.next_due.get(key, 0.0)
+        if now >= due and key not in self.held:
+            self.next_due[key] = now + self.min_interval
+            return self.enqueue(message, key)
+
+        # Too soon: hold the latest update until the interval has passed
+        if key in self.held:
+            self.rate_limited += 1
+        self.held[key] = message
+        if self.flush_handle is None and not self.closing:
+            self.flush_handle = asyncio.get_running_loop().call_later(max(0.0, due - now), self._flush_held)
+        return True
+
+    def _flush_held(self):
+        """Send held updates whose interval has passed"""
+        self.flush_handle = None
+        now = time.monotonic()
+        next_wakeup = None
+
+        for key in list(self.held):
+            due = self.next_due.get(key, 0.0)
+            if now >= due:
+                self.next_due[key] = now + self.min_interval
+                self.enqueue(self.held.pop(key), key)
+            elif next_wakeup is None or due < next_wakeup:
+                next_wakeup = due
+
+        if next_wakeup is not None and not self.closing:
+            self.flush_handle = asyncio.get_running_loop().call_later(next_wakeup - now, self._flush_held)
+
+    def forget_user(self, user_id: Any):
+        """Drop rate-cap and delta state for an evicted user"""
+        self.held.pop(user_id, None)
+        self.next_due.pop(user_id, None)
+        if self.delta is not None:
+            self.delta.invalidate(user_id)
+
+    def get_subscription(self) -> Dict[str, Any]:
+        """The current subscription, for responses and stats"""
+        return {
+            "users": None if self.users is None else sorted(self.users, key=str),
+            "excluded_users": sorted(self.excluded_users, key=str),
+            "fields": None if self.fields is None else list(self.fields),
+            "max_rate_hz": 1.0 / self.min_interval if self.min_interval else None,
+            "sync": self.sync
+        }
+
+    def start(self):
+        """Start the writer task"""
+        if self.writer_task is None:
+            self.writer_task = asyncio.create_task(self._writer())
+
+    async def stop(self):
+        """Stop the writer task and discard anything still queued"""
+        self.closing = True
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.writer_task = None
+        self.queue.clear()
+        self.pending_by_key.clear()
+        self.held.clear()
+
+    def enqueue(self, message, key: Any = None) -> bool:
+        """Queue a message for this client without blocking
+
+        key identifies messages that may be conflated (normally the user id);
+        messages without a key are never conflated.
+        Returns False if the message was not accepted.
+        """
+        if self.closing:
+            return False
+
+        now = time.time()
+
+        if self.policy == "conflate" and key is not None:
+            entry = self.pending_by_key.get(key)
+            if entry is not None:
+                entry[1] = message
+                self.conflated += 1
+                if self.metrics is not None:
+                    self.metrics.count("client_dropped")
+                return True
+
+        if self.policy == "disconnect" and self.queue:
+            backlog_age = now - self.queue[0][2]
+            if len(self.queue) >= self.max_size or backlog_age > self.backlog_timeout:
+                self._disconnect(f"backlog of {len(self.queue)} messages ({backlog_age:.1f}s)")
+                return False
+
+        if len(self.queue) >= self.max_size:
+            self._drop_oldest()
+
+        entry = [key, message, now]
+        self.queue.append(entry)
+        if self.policy == "conflate" and key is not None:
+            self.pending_by_key[key] = entry
+
+        depth = len(self.queue)
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+        self.wakeup.set()
+        return True
+
+    def _drop_oldest(self):
+        """Discard the oldest pending message"""
+        key, _, _ = entry = self.queue.popleft()
+        if self.pending_by_key.get(key) is entry:
+            del self.pending_by_key[key]
+        self.dropped += 1
+        if self.metrics is not None:
+            self.metrics.count("client_dropped")
+
+    def _disconnect(self, reason: str):
+        """Close a client that cannot keep up"""
+        if self.closing:
+            return
+        self.closing = True
+        self.dropped += len(self.queue)
+        if self.metrics is not None:
+            self.metrics.count("client_dropped", len(self.queue))
+            self.metrics.count("client_disconnected_slow")
+        self.queue.clear()
+        self.pending_by_key.clear()
+        logger.warning(f"Disconnecting slow WebSocket client {self.client_ip}: {reason}")
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+        asyncio.create_task(self.websocket.close(code=1008, reason="Client too slow"))
+
+    async def _writer(self):
+        """Drain the queue into the socket, one message at a time"""
+        try:
+            while True:
+                if not self.queue:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+
+                key, message, enqueued_at = entry = self.queue.popleft()
+                if self.pending_by_key.get(key) is entry:
+                    del self.pending_by_key[key]
+                waited = time.time() - enqueued_at
+                self.queue_wait.observe(waited)
+                if self.metrics is not None:
+                    self.metrics.observe("queue", waited)
+
+                if isinstance(message, dict):
+                    # Delta mode: encode against what this client has received
+                    message = self.delta.encode(message, time.monotonic())
+                    if message is None:
+                        continue
+                    message = self.codec.encode(message)
+
+                send_start = time.perf_counter()
+                await self.websocket.send(message)
+                if self.metrics is not None:
+                    self.metrics.observe("send", time.perf_counter() - send_start)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except websockets.exceptions.ConnectionClosed:
+            self.closing = True
+        except Exception as e:
+            logger.error(f"Error sending to WebSocket client {self.client_ip}: {e}")
+            self.closing = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue counters for this client"""
+        return {
+            "client_ip": self.client_ip,
+            "codec": self.codec.name,
+            "policy": self.policy,
+            "queue_depth": len(self.queue),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "rate_limited": self.rate_limited,
+            "queue_wait": self.queue_wait.summary(),
+            "subscription": self.get_subscription(),
+            "stream": "delta" if self.delta is not None else "full",
+            "delta": self.delta.get_stats() if self.delta is not None else None,
+            "connected_at": self.connected_at
+        }
+
+class IngestQueue:
+    """Bounded ring buffer between the UDP socket and the broker
+
+    datagram_received only appends here; a single consumer task drains
+    everything that has arrived in batches, preserving arrival order.
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest")
+
+    def __init__(self, max_size: int = INGEST_QUEUE_SIZE,
+                 policy: str = INGEST_OVERFLOW_POLICY,
+                 metrics: Optional[BrokerMetrics] = None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown ingest overflow policy: {policy}")
+
+        self.max_size = max_size
+        self.policy = policy
+        self.metrics = metrics
+        self.buffer: deque = deque()
+        self.arrivals: deque = deque()  # perf_counter() of each buffered datagram
+        self.ready = asyncio.Event()
+
+        # Counters
+        self.received = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.batches = 0
+        self.max_batch = 0
+
+    def put(self, item) -> bool:
+        """Append a datagram without blocking; returns False if it was dropped"""
+        self.received += 1
+
+        if len(self.buffer) >= self.max_size:
+            self.dropped += 1
+            if self.metrics is not None:
+                self.metrics.count("ingest_dropped")
+            if self.policy == "drop_newest":
+                return False
+            self.buffer.popleft()
+            self.arrivals.popleft()
+
+        self.buffer.append(item)
+        self.arrivals.append(time.perf_counter())
+
+        depth = len(self.buffer)
+        if depth > self.high_water:
+            self.high_water = depth
+
+        self.ready.set()
+        return True
+
+    async def wait(self):
+        """Wait until at least one datagram is buffered"""
+        while not self.buffer:
+            self.ready.clear()
+            await self.ready.wait()
+
+    def drain(self, max_items: int = INGEST_BATCH_SIZE) -> list:
+        """Remove and return up to max_items buffered datagrams"""
+        buffer = self.buffer
+        count = min(len(buffer), max_items)
+        batch = [buffer.popleft() for _ in range(count)]
+        arrivals = self.arrivals
+        if self.metrics is not None:
+            now = time.perf_counter()
+            observe = self.metrics.stages["receive"].observe
+            for _ in range(count):
+                observe(now - arrivals.popleft())
+        else:
+            for _ in range(count):
+                arrivals.popleft()
+
+        if batch:
+            self.batches += 1
+            if count > self.max_batch:
+                self.max_batch = count
+
+        return batch
 
-        history_array = np.array(self.history)
+    def get_stats(self) -> Dict[str, Any]:
+        """Get ingest counters"""
         return {
-            "mean": float(np.mean(history_array)),
-            "std": float(np.std(history_array)),
-            "min": float(np.min(history_array)),
-            "max": float(np.max(history_array)),
-            "last": float(history_array[-1]) if len(history_array) > 0 else 0.0
+            "policy": self.policy,
+            "depth": len(self.buffer),
+            "high_water": self.high_water,
+            "received": self.received,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "max_batch": self.max_batch
         }
 
 class UDPProtocol(asyncio.DatagramProtocol):
@@ -132,27 +774,83 @@ class UDPProtocol(asyncio.DatagramProtocol):
         logger.info(f"UDP server listening on {UDP_HOST}:{UDP_PORT}")
 
     def datagram_received(self, data, addr):
-        """Called when UDP data is received"""
-        try:
-            data_str = data.decode('utf-8')
-            # Process in async context
-            asyncio.create_task(self.broker.process_udp_data(data_str, addr))
-        except Exception as e:
-            logger.error(f"Error receiving UDP data: {e}")
+        """Called when UDP data is received - queue it for the ingest consumer"""
+        self.broker.ingest_queue.put((data, addr))
 
 class BPMBroker:
     def __init__(self):
-        self.websocket_clients: Set[websockets.WebSocketServerProtocol] = set()
+        self.websocket_clients: Dict[Any, ClientSession] = {}  # websocket -> outbound session
         self.latest_data: Dict[int, Dict[str, Any]] = {}
+        self.latest_messages: Dict[int, EncodedMessage] = {}  # latest_data, serialized once per codec
         self.user_smoothers: Dict[int, Dict[str, Any]] = {}  # Signal smoothers for each user
         self.user_finger_status: Dict[int, Dict[str, Any]] = {}  # Finger detection tracking
+        self.smoothing_engine: Optional["VectorSmoothingEngine"] = None
+        # Batches run each user's filter chain once over all of their readings
+        self.filter_batching = SMOOTHING_ENABLED and bool(self.create_filter_chain().stages)
+        if SMOOTHING_ENGINE == "vector" and SMOOTHING_ENABLED:
+            if self.filter_batching:
+                logger.warning("The vector smoothing engine only supports the EMA - "
+                               f"using per-user smoothers for FILTER_CHAIN {FILTER_CHAIN}")
+            else:
+                # Finger and smoother state for every user lives in the engine's arrays
+                from bpm_engine import VectorSmoothingEngine
+                self.smoothing_engine = VectorSmoothingEngine(SMOOTHING_ALPHA, HISTORY_LENGTH, MIN_BPM, MAX_BPM)
         self.udp_transport = None
+        self.metrics = BrokerMetrics()
+        self.metrics_server: Optional[MetricsServer] = None
+        self.ingest_queue = IngestQueue(metrics=self.metrics)
+        self.ingest_task: Optional[asyncio.Task] = None
+        self.ingest_workers: Optional[IngestWorkerPool] = None
+        self.recorder: Optional[SessionRecorder] = None
+        self.frame_updates: Dict[int, Dict[str, Any]] = {}  # Users changed since the last frame
+        self.frame_count = 0
+        self.frame_task: Optional[asyncio.Task] = None
+        self.sync_engine: Optional["SynchronyEngine"] = None  # Created by the synchrony ticker
+        self.sync_metrics: Optional[Dict[str, Any]] = None  # Result of the latest synchrony tick
+        self.sync_task: Optional[asyncio.Task] = None
+        self.user_lifecycle = UserLifecycle(USER_STALE_SECONDS, USER_EVICT_SECONDS, MAX_TRACKED_USERS)
+        self.sweep_task: Optional[asyncio.Task] = None
+        self.dashboard_assets: Optional[DashboardAssets] = None
+        self.history = HistoryStore(HISTORY_TIERS)  # Long-range BPM rollups per user
+        self.links: Optional[LinkMonitor] = LinkMonitor() if LINK_STATS_ENABLED else None
+        self.beat_detectors: Optional["BeatDetectorStore"] = None  # Created on the first waveform packet
+        self.ppg_available = True  # False once importing the beat detector has failed
+        self.listening = asyncio.Event()  # Set once the UDP and WebSocket servers are both up
+
+        # Pre-encoded snapshots of the broker state, rebuilt when state_version has moved on
+        self.state_version = 0  # Bumped on every published packet, eviction and (dis)connect
+        self.bootstrap_snapshot = SnapshotMessage(self.build_bootstrap, SNAPSHOT_INTERVAL)
+        self.status_snapshot = SnapshotMessage(self.build_status, SNAPSHOT_INTERVAL)
+        self.statistics_snapshot = SnapshotMessage(self.build_all_statistics, SNAPSHOT_INTERVAL)
+
+    def create_filter_chain(self) -> FilterChain:
+        """Build a fresh filter chain (one per user) from the configuration"""
+        return build_filter_chain(FILTER_CHAIN, HAMPEL_WINDOW, HAMPEL_SIGMAS, MEDIAN_WINDOW,
+                                  BUTTERWORTH_ORDER, BUTTERWORTH_CUTOFF_HZ, FILTER_SAMPLE_RATE_HZ)
+
+    def create_sync_engine(self) -> Optional["SynchronyEngine"]:
+        """Import and build the synchrony engine (None if NumPy is unavailable)"""
+        try:
+            from bpm_sync import SynchronyEngine
+        except ImportError as e:
+            logger.warning(f"Synchrony tracking disabled: {e}")
+            return None
+        return SynchronyEngine(SYNC_WINDOW, SYNC_MAX_LAG, SYNC_THRESHOLD_BPM)
+
+    def create_beat_detectors(self) -> Optional["BeatDetectorStore"]:
+        """Import and build the PPG beat detectors (None if NumPy/SciPy are unavailable)"""
+        try:
+            from bpm_beats import BeatDetectorStore
+        except ImportError as e:
+            logger.error(f"Cannot run beat detection on PPG waveforms: {e}")
+            return None
+        return BeatDetectorStore(PPG_BANDPASS_HZ, PPG_MIN_BEAT_INTERVAL, PPG_FINGER_THRESHOLD, PPG_CONTEXT_SECONDS)
 
     def get_or_create_smoother(self, user_id: int) -> SignalSmoother:
         """Get or create a signal smoother for a user"""
         if user_id not in self.user_smoothers:
             self.user_smoothers[user_id] = {
-                'smoother': SignalSmoother(),
+                'smoother': SignalSmoother(user_id=user_id, filters=self.create_filter_chain()),
                 'created_at': time.time()
             }
             logger.info(f"Created signal smoother for User {user_id}")
@@ -175,6 +873,13 @@ class BPMBroker:
         """Start UDP server to receive data from ESP32 devices"""
         loop = asyncio.get_running_loop()
 
+        if INGEST_WORKERS > 0:
+            # Workers bind the port themselves and send back processed packets
+            self.ingest_workers = IngestWorkerPool(INGEST_WORKERS, UDP_HOST, UDP_PORT, BPMBroker)
+            self.ingest_workers.start(loop, lambda data: self.ingest_queue.put((data, None)))
+            self.ingest_task = asyncio.create_task(self.consume_udp_ingest())
+            return None
+
         # Create UDP endpoint
         transport, protocol = await loop.create_datagram_endpoint(
             lambda: UDPProtocol(self),
@@ -182,21 +887,288 @@ class BPMBroker:
         )
 
         self.udp_transport = transport
+        self.ingest_task = asyncio.create_task(self.consume_udp_ingest())
         return transport
 
-    async def process_udp_data(self, data_str: str, addr: tuple):
-        """Process UDP data from ESP32 devices"""
+    async def consume_udp_ingest(self):
+        """Drain the ingest queue in batches for as long as the broker runs"""
+        while True:
+            await self.ingest_queue.wait()
+            batch = self.ingest_queue.drain()
+            try:
+                await self.process_udp_batch(batch)
+            except Exception as e:
+                # Packets are guarded one by one; this only keeps the consumer alive if that ever misses something
+                self.metrics.count("processing_errors")
+                logger.error("Error processing UDP batch of %d datagrams: %s", len(batch), e)
+
+            # Let WebSocket writers run between large batches
+            await asyncio.sleep(0)
+
+    async def process_udp_batch(self, batch: list):
+        """Process a batch of raw datagrams in arrival order"""
+        if self.smoothing_engine is not None:
+            await self.process_udp_batch_vectorized(batch)
+            return
+        if self.filter_batching:
+            await self.process_udp_batch_grouped(batch)
+            return
+
+        for data, addr in batch:
+            if isinstance(data, dict):
+                # Already parsed and smoothed by an ingest worker process
+                await self.publish_packet(data)
+                continue
+
+            packet = self.parse_datagram(data, addr)
+            if packet is not None:
+                await self.process_packet(packet, addr)
+
+    async def process_udp_batch_vectorized(self, batch: list):
+        """Parse a batch, then smooth every packet in it with the vector engine"""
+        packets = []
+        addrs = []
+        for data, addr in batch:
+            if isinstance(data, dict):
+                await self.publish_packet(data)
+                continue
+
+            packet = self.parse_datagram(data, addr)
+            if packet is not None:
+                packets.append(packet)
+                addrs.append(addr)
+
+        if not packets:
+            return
+
+        engine = self.smoothing_engine
+        start = time.perf_counter()
+        results = engine.apply_batch(packets, addrs)
+        per_packet = (time.perf_counter() - start) / len(packets)
+
+        observe = self.metrics.stages["smoothing"].observe
+        for _ in range(len(packets)):
+            observe(per_packet)
+        if engine.out_of_range:
+            self.metrics.count("out_of_range_bpm", engine.out_of_range)
+
+        for data in results:
+            if data is None:
+                self.metrics.count("processing_errors")
+                continue
+
+            user_id = data['user']
+            if data['bpm_smoothed'] and user_id not in self.user_smoothers:
+                self.user_smoothers[user_id] = {
+                    'smoother': engine.get_view(user_id),
+                    'created_at': time.time()
+                }
+            await self.publish_packet(data)
+
+    async def process_udp_batch_grouped(self, batch: list):
+        """Process a batch, filtering each user's readings in one pass where possible
+
+        A user's packets are filtered together if all of them carry a heart
+        rate with the finger detected (so no finger-state change can happen in
+        between); anything else goes through apply_packet one by one.
+        Packets are published in arrival order either way.
+        """
+        entries = []  # (packet, addr, already processed)
+        by_user: Dict[Any, list] = {}
+        for data, addr in batch:
+            if isinstance(data, dict):
+                entries.append((data, addr, True))
+                continue
+            packet = self.parse_datagram(data, addr)
+            if packet is not None:
+                by_user.setdefault(packet['user'], []).append(len(entries))
+                entries.append((packet, addr, False))
+
+        results: list = [data if processed else None for data, _, processed in entries]
+        for user_id, indices in by_user.items():
+            tracker = self.user_finger_status.get(user_id)
+            if (len(indices) > 1 and (tracker is None or tracker['last_finger_detected'])
+                    and all(self.is_plain_reading(entries[i][0]) for i in indices)):
+                run = self.apply_packet_run(user_id, [entries[i][0] for i in indices],
+                                            [entries[i][1] for i in indices])
+                for i, data in zip(indices, run):
+                    results[i] = data
+            else:
+                for i in indices:
+                    results[i] = self.apply_packet(entries[i][0], entries[i][1])
+
+        for data in results:
+            if data is not None:
+                await self.publish_packet(data)
+
+    @staticmethod
+    def is_plain_reading(data: Dict[str, Any]) -> bool:
+        """A reading with a heart rate and the finger detected"""
+        bpm = data['bpm']
+        return (data.get('finger_detected', True) and isinstance(bpm, (int, float))
+                and not isinstance(bpm, bool) and bpm > 0)
+
+    def apply_packet_run(self, user_id: Any, packets: list, addrs: list) -> list:
+        """apply_packet for several plain readings of one user, filtered in one pass"""
+        finger_tracker = self.get_or_create_finger_tracker(user_id)
+        finger_tracker['consecutive_no_finger'] = 0
+        finger_tracker['last_finger_detected'] = True
+
+        smoother = self.get_or_create_smoother(user_id)
+        raw_values = [float(data['bpm']) for data in packets]
+        out_of_range = sum(1 for value in raw_values if not MIN_BPM <= value <= MAX_BPM)
+        if out_of_range:
+            self.metrics.count("out_of_range_bpm", out_of_range)
+
+        start = time.perf_counter()
+        smoothed_values, statistics = smoother.add_samples(raw_values)
+        per_packet = (time.perf_counter() - start) / len(packets)
+        observe = self.metrics.stages["smoothing"].observe
+
+        server_timestamp = time.time()
+        received_at = datetime.now().isoformat()
+        for data, addr, raw_bpm, smoothed_bpm, stats in zip(packets, addrs, raw_values,
+                                                             smoothed_values, statistics):
+            data['bpm_raw'] = raw_bpm
+            data['bpm'] = smoothed_bpm
+            data['bpm_smoothed'] = True
+            data['signal_stats'] = stats
+            data['no_heart_rate'] = False
+            data['server_timestamp'] = server_timestamp
+            data['source_ip'] = addr[0]
+            data['received_at'] = received_at
+            observe(per_packet)
+
+        logger.info("User %s (%s): %d readings → %.1f BPM (smoothed together)",
+                    user_id, addrs[-1][0], len(packets), smoothed_values[-1], extra={"user_id": user_id})
+        return packets
+
+    def parse_datagram(self, data: bytes, addr: tuple) -> Optional[Dict[str, Any]]:
+        """Parse a raw datagram into a packet dict (None if invalid)
+
+        Binary packets are recognised by their magic byte; anything else is
+        treated as JSON so older firmware keeps working. Waveform packets go
+        through beat detection and only yield a packet when there is a new
+        beat (or a finger-off report) to publish. With ingest workers, a
+        device's datagrams always reach the same worker (SO_REUSEPORT hashes
+        on the source address), so its detector state stays in one place.
+        """
+        start = time.perf_counter()
+
+        if is_waveform_packet(data):
+            return self.parse_waveform(data, addr, start)
+
+        if is_binary_packet(data):
+            try:
+                packet = decode_packet(data)
+            except ValueError as e:
+                self.metrics.count("invalid_binary")
+                logger.error("Invalid binary packet from %s: %s", addr, e)
+                return None
+            self.metrics.observe("decode", time.perf_counter() - start)
+            return packet
+
+        try:
+            data_str = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            self.metrics.count("invalid_encoding")
+            logger.error("Error decoding UDP data from %s: %s", addr, e)
+            return None
+        self.metrics.observe("decode", time.perf_counter() - start)
+
+        return self.parse_json(data_str, addr)
+
+    def parse_waveform(self, data: bytes, addr: tuple, start: float) -> Optional[Dict[str, Any]]:
+        """Run beat detection on a waveform packet (None if invalid or nothing new)"""
+        try:
+            waveform = decode_waveform(data)
+        except ValueError as e:
+            self.metrics.count("invalid_binary")
+            logger.error("Invalid waveform packet from %s: %s", addr, e)
+            return None
+        self.metrics.observe("decode", time.perf_counter() - start)
+
+        # The band-pass needs the upper cutoff below the Nyquist frequency
+        if waveform['sample_rate'] <= 2 * PPG_BANDPASS_HZ[1]:
+            self.metrics.count("invalid_binary")
+            logger.error("Invalid waveform packet from %s: sample rate %d Hz is too low for a %.1f Hz band-pass",
+                         addr, waveform['sample_rate'], PPG_BANDPASS_HZ[1])
+            return None
+
+        if self.beat_detectors is None:
+            if not self.ppg_available:
+                return None
+            self.beat_detectors = self.create_beat_detectors()
+            if self.beat_detectors is None:
+                self.ppg_available = False  # Logged once, then waveforms are dropped
+                return None
+
+        self.admit_user(waveform['user'])  # Before its detector exists, so eviction reaches it
+        detected_at = time.perf_counter()
+        reading = self.beat_detectors.process(waveform['user'], waveform['timestamp'],
+                                              waveform['sample_rate'], waveform['samples'])
+        self.metrics.observe("beats", time.perf_counter() - detected_at)
+        if reading is None:
+            return None
+
+        reading['user'] = waveform['user']
+        reading['timestamp'] = waveform['timestamp']
+        reading['signal_strength'] = waveform['signal_strength']
+        return reading
+
+    def parse_json(self, data_str: str, addr: tuple) -> Optional[Dict[str, Any]]:
+        """Parse and validate a JSON message (None if invalid)"""
+        start = time.perf_counter()
         try:
-            # Parse JSON data
             data = json.loads(data_str)
+        except json.JSONDecodeError:
+            self.metrics.count("invalid_json")
+            logger.error("Invalid JSON from %s: %s", addr, data_str)
+            return None
+
+        # Validate required fields; user ids key every per-user table, so they must be ints or strings
+        if not isinstance(data, dict) or 'user' not in data or 'bpm' not in data:
+            self.metrics.count("invalid_format")
+            logger.warning("Invalid data format from %s: %s", addr, data_str)
+            return None
+        user_id = data['user']
+        if isinstance(user_id, float) and user_id.is_integer():
+            data['user'] = int(user_id)  # Older firmware sends e.g. 3.0; keep it the same user as 3
+        elif isinstance(user_id, bool) or not isinstance(user_id, (int, str)):
+            self.metrics.count("invalid_format")
+            logger.warning("Invalid data format from %s: %s", addr, data_str)
+            return None
+
+        self.metrics.observe("parse", time.perf_counter() - start)
+        return data
 
-            # Validate required fields
-            if 'user' not in data or 'bpm' not in data:
-                logger.warning(f"Invalid data format from {addr}: {data_str}")
-                return
+    async def process_udp_data(self, data_str: str, addr: tuple):
+        """Process JSON UDP data from ESP32 devices"""
+        data = self.parse_json(data_str, addr)
+        if data is not None:
+            await self.process_packet(data, addr)
+
+    async def process_packet(self, data: Dict[str, Any], addr: tuple):
+        """Process a decoded packet (from JSON or the binary format)"""
+        data = self.apply_packet(data, addr)
+        if data is not None:
+            await self.publish_packet(data)
+
+    def apply_packet(self, data: Dict[str, Any], addr: tuple) -> Optional[Dict[str, Any]]:
+        """Run finger detection and smoothing on a packet
 
+        Returns the enriched packet, or None if it could not be processed.
+        """
+        start = time.perf_counter()
+        smoothing_time = 0.0  # Timed separately by smooth_packet
+
+        try:
             user_id = data['user']
             raw_bpm = data['bpm']
+            log_extra = {"user_id": user_id}
+            # Before any per-user state exists: users only become tracked (and evictable) once published
+            if not isinstance(raw_bpm, (int, float)):
+                raise TypeError(f"BPM must be a number, got {raw_bpm!r}")
 
             # Get finger detection tracker
             finger_tracker = self.get_or_create_finger_tracker(user_id)
@@ -216,7 +1188,8 @@ class BPMBroker:
                     data['bpm_smoothed'] = False
                     data['no_heart_rate'] = True
                     data['finger_detected'] = False
-                    logger.info(f"User {user_id} ({addr[0]}): No finger detected for {finger_tracker['consecutive_no_finger']} readings - sending '--'")
+                    logger.info("User %s (%s): No finger detected for %d readings - sending '--'",
+                                user_id, addr[0], finger_tracker['consecutive_no_finger'], extra=log_extra)
                 else:
                     # Still within threshold, process normally but mark as no finger
                     if raw_bpm <= 0:
@@ -224,28 +1197,27 @@ class BPMBroker:
                         data['bpm_raw'] = raw_bpm
                         data['bpm_smoothed'] = False
                         data['no_heart_rate'] = True
-                        logger.info(f"User {user_id} ({addr[0]}): No finger + no BPM")
+                        logger.info("User %s (%s): No finger + no BPM", user_id, addr[0], extra=log_extra)
                     else:
                         # Process BPM normally even though no finger detected (might be last valid reading)
                         raw_bpm = float(raw_bpm)
 
                         if SMOOTHING_ENABLED:
-                            smoother = self.get_or_create_smoother(user_id)
-                            smoothed_bpm = smoother.add_sample(raw_bpm)
-                            data['bpm_raw'] = raw_bpm
-                            data['bpm'] = smoothed_bpm
-                            data['bpm_smoothed'] = True
-                            stats = smoother.get_statistics()
-                            data['signal_stats'] = stats
-                            logger.info(f"User {user_id} ({addr[0]}): No finger but BPM {raw_bpm:.1f} → {smoothed_bpm:.1f} (smoothed)")
+                            smoothing_start = time.perf_counter()
+                            smoothed_bpm = self.smooth_packet(user_id, raw_bpm, data)
+                            smoothing_time = time.perf_counter() - smoothing_start
+                            logger.info("User %s (%s): No finger but BPM %.1f → %.1f (smoothed)",
+                                        user_id, addr[0], raw_bpm, smoothed_bpm, extra=log_extra)
                         else:
                             data['bpm'] = raw_bpm
                             data['bpm_smoothed'] = False
-                            logger.info(f"User {user_id} ({addr[0]}): No finger but BPM {raw_bpm:.1f}")
+                            logger.info("User %s (%s): No finger but BPM %.1f",
+                                        user_id, addr[0], raw_bpm, extra=log_extra)
 
                         data['no_heart_rate'] = False
 
-                    logger.info(f"User {user_id} ({addr[0]}): No finger detected ({finger_tracker['consecutive_no_finger']}/2)")
+                    logger.info("User %s (%s): No finger detected (%d/2)",
+                                user_id, addr[0], finger_tracker['consecutive_no_finger'], extra=log_extra)
             else:
                 # Finger detected, reset counter
                 finger_tracker['consecutive_no_finger'] = 0
@@ -255,7 +1227,8 @@ class BPMBroker:
                     if SMOOTHING_ENABLED and user_id in self.user_smoothers:
                         smoother = self.user_smoothers[user_id]['smoother']
                         smoother.reset_for_new_session()
-                        logger.info(f"User {user_id}: Finger detected after absence - reset smoother")
+                        logger.info("User %s: Finger detected after absence - reset smoother",
+                                    user_id, extra=log_extra)
 
                 finger_tracker['last_finger_detected'] = True
 
@@ -266,29 +1239,23 @@ class BPMBroker:
                     data['bpm_raw'] = raw_bpm
                     data['bpm_smoothed'] = False
                     data['no_heart_rate'] = True
-                    logger.info(f"User {user_id} ({addr[0]}): Finger detected but no heart rate")
+                    logger.info("User %s (%s): Finger detected but no heart rate", user_id, addr[0], extra=log_extra)
                 else:
                     raw_bpm = float(raw_bpm)
 
                     # Apply signal smoothing if enabled
                     if SMOOTHING_ENABLED:
-                        smoother = self.get_or_create_smoother(user_id)
-                        smoothed_bpm = smoother.add_sample(raw_bpm)
-
-                        # Add smoothing info to data
-                        data['bpm_raw'] = raw_bpm
-                        data['bpm'] = smoothed_bpm
-                        data['bpm_smoothed'] = True
-
-                        # Add signal statistics
-                        stats = smoother.get_statistics()
-                        data['signal_stats'] = stats
+                        # Adds smoothing info and signal statistics to data
+                        smoothing_start = time.perf_counter()
+                        smoothed_bpm = self.smooth_packet(user_id, raw_bpm, data)
+                        smoothing_time = time.perf_counter() - smoothing_start
 
-                        logger.info(f"User {user_id} ({addr[0]}): {raw_bpm:.1f} → {smoothed_bpm:.1f} BPM (smoothed)")
+                        logger.info("User %s (%s): %.1f → %.1f BPM (smoothed)",
+                                    user_id, addr[0], raw_bpm, smoothed_bpm, extra=log_extra)
                     else:
                         data['bpm'] = raw_bpm
                         data['bpm_smoothed'] = False
-                        logger.info(f"User {user_id} ({addr[0]}): {raw_bpm:.1f} BPM")
+                        logger.info("User %s (%s): %.1f BPM", user_id, addr[0], raw_bpm, extra=log_extra)
 
                     data['no_heart_rate'] = False
 
@@ -297,71 +1264,327 @@ class BPMBroker:
             data['source_ip'] = addr[0]
             data['received_at'] = datetime.now().isoformat()
 
-            # Store latest data for each user
-            self.latest_data[user_id] = data
+            self.metrics.observe("finger", time.perf_counter() - start - smoothing_time)
+            return data
 
+        except Exception as e:
+            self.metrics.count("processing_errors")
+            logger.error("Error processing UDP data: %s", e)
+            return None
+
+    def smooth_packet(self, user_id: int, raw_bpm: float, data: Dict[str, Any]) -> float:
+        """Smooth a reading and add the smoothed value and statistics to the packet"""
+        metrics = self.metrics
+        smoother = self.get_or_create_smoother(user_id)
+        if not MIN_BPM <= raw_bpm <= MAX_BPM:
+            metrics.count("out_of_range_bpm")
+
+        start = time.perf_counter()
+        smoothed_bpm = smoother.add_sample(raw_bpm)
+        smoothed_at = time.perf_counter()
+        stats = smoother.get_statistics()
+        metrics.observe("smoothing", smoothed_at - start)
+        metrics.observe("statistics", time.perf_counter() - smoothed_at)
+
+        data['bpm_raw'] = raw_bpm
+        data['bpm'] = smoothed_bpm
+        data['bpm_smoothed'] = True
+        data['signal_stats'] = stats
+        return smoothed_bpm
+
+    async def publish_packet(self, data: Dict[str, Any]):
+        """Store a processed packet as the user's latest data and send it out
+
+        Errors (e.g. a value one of the client codecs cannot encode) are
+        logged and counted per packet, so a bad packet never stops ingest.
+        """
+        try:
+            await self.store_and_send(data)
+        except Exception as e:
+            self.metrics.count("processing_errors")
+            logger.error("Error processing UDP data: %s", e)
+            # Don't keep serving a packet that could not be sent to everyone
+            user_id = data.get('user')
+            if isinstance(user_id, (int, str)) and self.latest_data.get(user_id) is data:
+                del self.latest_data[user_id]
+                self.latest_messages.pop(user_id, None)
+                self.invalidate_snapshots()
+
+    async def store_and_send(self, data: Dict[str, Any]):
+        """publish_packet without the error handling"""
+        user_id = data['user']
+        self.metrics.count_packet(user_id)
+        self.state_version += 1
+        received = data.get('server_timestamp') or time.time()
+        bpm = data.get('bpm')
+        if isinstance(bpm, (int, float)) and not isinstance(bpm, bool):
+            self.history.add(user_id, received, bpm)
+        if self.links is not None:
+            self.links.observe(user_id, data.get('seq'), data.get('timestamp'), received)
+        self.admit_user(user_id)
+
+        # Store latest data for each user
+        new_user = user_id not in self.latest_data
+        self.latest_data[user_id] = data
+        message = EncodedMessage(data)
+        self.latest_messages[user_id] = message
+        if new_user:
+            self.invalidate_snapshots()  # Clients connecting now must see the new user
+
+        if self.recorder is not None:
+            self.recorder.record(data)
+
+        if OUTPUT_MODE == "tick":
+            # Coalesce into the next frame
+            self.frame_updates[user_id] = data
+        else:
             # Broadcast to all WebSocket clients
-            await self.broadcast_to_websockets(data)
+            await self.broadcast_to_websockets(message)
 
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON from {addr}: {data_str}")
-        except Exception as e:
-            logger.error(f"Error processing UDP data: {e}")
+    async def broadcast_to_websockets(self, data):
+        """Queue data (a dict or EncodedMessage) for all connected WebSocket clients
 
-    async def broadcast_to_websockets(self, data: Dict[str, Any]):
-        """Broadcast data to all connected WebSocket clients"""
+        Messages are serialized once per codec and the payload is shared by
+        every client using that codec. Clients with a subscription get the
+        selected users and fields instead, serialized once per distinct
+        subscription. The actual socket writes happen in the per-client
+        writer tasks.
+        """
         if not self.websocket_clients:
             return
 
-        message = json.dumps(data)
+        start = time.perf_counter()
+        message = data if isinstance(data, EncodedMessage) else EncodedMessage(data)
+        key = message.data.get('user')
+        views: Dict[tuple, Any] = {}  # (codec, subscription) -> payload or None
 
-        # Send to all connected clients
-        disconnected_clients = set()
+        for session in list(self.websocket_clients.values()):
+            if session.view_key is None:
+                payload = message.data if session.delta is not None else message.encode(session.codec)
+            else:
+                view = (session.codec.name, session.view_key, session.delta is not None)
+                if view in views:
+                    payload = views[view]
+                else:
+                    selected = session.select(message.data)
+                    payload = None if selected is None else session.payload(selected)
+                    views[view] = payload
+                if payload is None:
+                    continue
+            session.offer(payload, key)
+
+        self.metrics.observe("serialize", time.perf_counter() - start)
+
+    async def send_to_client(self, websocket, data):
+        """Send data (a dict or EncodedMessage) to one client through its outbound queue"""
+        message = data if isinstance(data, EncodedMessage) else EncodedMessage(data)
+        session = self.websocket_clients.get(websocket)
+        if session is not None:
+            session.enqueue(message.encode(session.codec))
+        else:
+            await websocket.send(message.encode(get_codec()))
 
-        for client in self.websocket_clients:
-            try:
-                await client.send(message)
-            except websockets.exceptions.ConnectionClosed:
-                disconnected_clients.add(client)
-            except Exception as e:
-                logger.error(f"Error sending to WebSocket client: {e}")
-                disconnected_clients.add(client)
+    async def run_frame_ticker(self, rate_hz: float = TICK_RATE_HZ):
+        """Emit one combined frame per tick while in "tick" output mode"""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / rate_hz
+        next_tick = loop.time() + interval
+
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            await self.emit_frame()
+
+            next_tick += interval
+            if next_tick < loop.time():
+                # Fell behind (e.g. a long batch); don't try to catch up
+                next_tick = loop.time() + interval
+
+    async def emit_frame(self):
+        """Send the latest state of every user that changed since the last frame"""
+        if not self.frame_updates:
+            return
 
-        # Remove disconnected clients
-        self.websocket_clients -= disconnected_clients
+        updates = self.frame_updates
+        self.frame_updates = {}
+        self.frame_count += 1
 
-        if disconnected_clients:
-            logger.info(f"Removed {len(disconnected_clients)} disconnected clients")
+        frame = {
+            "type": "frame",
+            "frame": self.frame_count,
+            "users": updates,
+            "timestamp": time.time()
+        }
+        await self.broadcast_to_websockets(frame)
+
+    async def run_sync_ticker(self, interval: float = SYNC_INTERVAL_SECONDS):
+        """Sample every user's BPM into the synchrony engine once per interval"""
+        if self.sync_engine is None:
+            # Imported off the event loop so packets keep flowing meanwhile
+            self.sync_engine = await asyncio.to_thread(self.create_sync_engine)
+            if self.sync_engine is None:
+                return
+        while True:
+            await asyncio.sleep(interval)
+            await self.update_sync()
+
+    async def update_sync(self):
+        """Add one synchrony tick and send the frame to subscribed clients"""
+        now = time.time()
+        readings = {}
+        for user_id, data in self.latest_data.items():
+            bpm = data.get('bpm')
+            if (isinstance(bpm, (int, float)) and not isinstance(bpm, bool)
+                    and now - data.get('server_timestamp', now) <= SYNC_STALE_SECONDS):
+                readings[user_id] = float(bpm)
+
+        self.sync_engine.add(readings)
+        self.sync_metrics = self.sync_engine.compute()
+
+        subscribers = [session for session in self.websocket_clients.values() if session.sync]
+        if not subscribers:
+            return
+        frame = self.sync_engine.frame(self.sync_metrics)
+        if frame is None:
+            return
+        frame["timestamp"] = now
+        message = EncodedMessage(frame)
+        for session in subscribers:
+            session.offer(message.data if session.delta is not None else message.encode(session.codec), "sync")
+
+    async def run_user_sweeper(self, interval: float = USER_SWEEP_INTERVAL):
+        """Report users that went stale and evict idle ones"""
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            stale, evicted = self.user_lifecycle.sweep(now)
+            for user_id in stale:
+                idle = self.user_lifecycle.idle_seconds(user_id, now)
+                logger.info(f"User {user_id} is stale (no data for {idle:.0f}s)")
+                self.broadcast_event({
+                    "type": "user_stale",
+                    "user_id": user_id,
+                    "idle_seconds": round(idle, 1),
+                    "timestamp": time.time()
+                }, user_id)
+            if evicted:
+                self.evict_users(evicted, "idle")
+
+    def admit_user(self, user_id: Any):
+        """Track a user in the lifecycle, evicting others if at the user cap"""
+        evicted = self.user_lifecycle.touch(user_id, time.monotonic())
+        if evicted:
+            self.evict_users(evicted, "capacity")
+
+    def invalidate_snapshots(self):
+        """Rebuild every snapshot on its next request: the set of users has changed"""
+        for snapshot in (self.bootstrap_snapshot, self.status_snapshot, self.statistics_snapshot):
+            snapshot.invalidate()
+
+    def evict_users(self, user_ids: List[Any], reason: str):
+        """Drop every piece of per-user state for users and tell the clients"""
+        now = time.time()
+        for user_id in user_ids:
+            self.forget_user_state(user_id)
+            for session in self.websocket_clients.values():
+                session.forget_user(user_id)
+            self.broadcast_event({
+                "type": "user_evicted",
+                "user_id": user_id,
+                "reason": reason,
+                "timestamp": now
+            }, user_id)
+        if self.sync_engine is not None:
+            self.sync_engine.remove_users(user_ids)
+        if self.ingest_workers is not None:
+            self.ingest_workers.evict_users(user_ids)  # Their smoothers live in the workers
+        self.state_version += 1
+        self.invalidate_snapshots()  # Never hand out an evicted user's data
+
+        self.metrics.count("users_evicted", len(user_ids))
+        if len(user_ids) == 1:
+            logger.info(f"Evicted User {user_ids[0]} ({reason})")
+        else:
+            logger.info(f"Evicted {len(user_ids)} users ({reason})")
+
+    def forget_user_state(self, user_id: Any):
+        """Drop a user from every per-user table of this process"""
+        self.latest_data.pop(user_id, None)
+        self.latest_messages.pop(user_id, None)
+        self.user_smoothers.pop(user_id, None)
+        self.user_finger_status.pop(user_id, None)
+        self.frame_updates.pop(user_id, None)
+        self.history.remove(user_id)
+        self.user_lifecycle.remove(user_id)
+        if self.beat_detectors is not None:
+            self.beat_detectors.remove(user_id)
+        if self.links is not None:
+            self.links.remove(user_id)
+        self.metrics.forget_user(user_id)
+        forget_logged_user(user_id)
+        if self.smoothing_engine is not None:
+            self.smoothing_engine.release(user_id)
+
+    def broadcast_event(self, event: Dict[str, Any], user_id: Any):
+        """Queue a lifecycle event for the clients subscribed to a user"""
+        message = EncodedMessage(event)
+        for session in self.websocket_clients.values():
+            if session.wants(user_id):
+                session.enqueue(message.data if session.delta is not None else message.encode(session.codec))
 
     async def handle_websocket_command(self, websocket, command: Dict[str, Any]):
         """Handle commands from WebSocket clients"""
         cmd_type = command.get('type')
 
         if cmd_type == 'get_status':
-            status = {
-                "type": "status_response",
-                "active_devices": list(self.latest_data.keys()),
-                "connected_clients": len(self.websocket_clients),
-                "latest_data": self.latest_data,
-                "smoothing_enabled": SMOOTHING_ENABLED,
-                "smoothing_config": {
-                    "alpha": SMOOTHING_ALPHA,
-                    "history_length": HISTORY_LENGTH
-                },
-                "timestamp": time.time()
-            }
-            await websocket.send(json.dumps(status))
+            await self.send_to_client(websocket, self.status_snapshot.get(self.state_version))
 
         elif cmd_type == 'get_latest':
             user_id = command.get('user_id')
             if user_id and user_id in self.latest_data:
-                await websocket.send(json.dumps(self.latest_data[user_id]))
+                await self.send_to_client(websocket, self.latest_messages[user_id])
             else:
-                await websocket.send(json.dumps({"error": "User not found"}))
+                await self.send_to_client(websocket, {"error": "User not found"})
+
+        elif cmd_type == 'get_history_range':
+            user_id = command.get('user_id')
+            now = time.time()
+            try:
+                end = float(command.get('end', now))
+                start = float(command['start']) if 'start' in command else end - float(command.get('seconds', 3600))
+                max_points = int(command.get('max_points', 500))
+            except (TypeError, ValueError):
+                await self.send_to_client(websocket, {"error": "start, end, seconds and max_points must be numbers"})
+                return
+            if not start < end or max_points < 2:
+                await self.send_to_client(websocket, {"error": "Need start < end and max_points >= 2"})
+                return
+
+            try:
+                series = self.history.query(user_id, start, end, min(max_points, HISTORY_MAX_POINTS))
+            except ImportError as e:
+                await self.send_to_client(websocket, {"error": f"History queries need NumPy: {e}"})
+                return
+            if series is None:
+                await self.send_to_client(websocket, {"error": "User not found"})
+                return
+            response = {
+                "type": "history_range_response",
+                "user_id": user_id,
+                "start": start,
+                "end": end,
+                **series,
+                "timestamp": now
+            }
+            await self.send_to_client(websocket, response)
 
         elif cmd_type == 'get_signal_history':
             user_id = command.get('user_id')
-            if user_id and user_id in self.user_smoothers:
+            if self.ingest_workers is not None:
+                # The smoothers live in the worker processes
+                await self.send_to_client(websocket, {
+                    "error": "Signal history is not available with INGEST_WORKERS > 0; use get_history_range"
+                })
+            elif user_id and user_id in self.user_smoothers:
                 smoother = self.user_smoothers[user_id]['smoother']
                 response = {
                     "type": "signal_history_response",
@@ -370,25 +1593,200 @@ class BPMBroker:
                     "statistics": smoother.get_statistics(),
                     "timestamp": time.time()
                 }
-                await websocket.send(json.dumps(response))
+                await self.send_to_client(websocket, response)
             else:
-                await websocket.send(json.dumps({"error": "User not found or no signal data"}))
+                await self.send_to_client(websocket, {"error": "User not found or no signal data"})
 
-        elif cmd_type == 'get_all_statistics':
-            stats = {}
-            for user_id, user_data in self.user_smoothers.items():
-                stats[user_id] = user_data['smoother'].get_statistics()
+        elif cmd_type in ('subscribe', 'unsubscribe'):
+            session = self.websocket_clients.get(websocket)
+            if session is None:
+                return
+            users = command.get('users')
+            if users is not None and not isinstance(users, list):
+                users = [users]
+
+            if cmd_type == 'subscribe':
+                fields = command.get('fields')
+                max_rate_hz = command.get('max_rate_hz')
+                if ((fields is not None and not isinstance(fields, list))
+                        or (max_rate_hz is not None and not isinstance(max_rate_hz, (int, float)))):
+                    await self.send_to_client(websocket, {"error": "Invalid subscription"})
+                    return
+                session.subscribe(users, fields, max_rate_hz,
+                                  set_fields='fields' in command, set_rate='max_rate_hz' in command,
+                                  sync=bool(command['sync']) if 'sync' in command else None)
+            else:
+                session.unsubscribe(users)
+
+            await self.send_to_client(websocket, {
+                "type": "subscription",
+                **session.get_subscription(),
+                "timestamp": time.time()
+            })
+
+            if cmd_type == 'subscribe':
+                # Bring the client up to date on what it just subscribed to
+                for user_id, latest in self.latest_data.items():
+                    if users is None or user_id in users:
+                        selected = session.select(latest)
+                        if selected is not None:
+                            session.enqueue(session.payload(selected), user_id)
+
+        elif cmd_type == 'keyframe':
+            # Delta clients that lost track can ask for full state again
+            session = self.websocket_clients.get(websocket)
+            if session is not None and session.delta is not None:
+                session.delta.invalidate()
+                for user_id, latest in self.latest_data.items():
+                    selected = session.select(latest)
+                    if selected is not None:
+                        session.enqueue(selected, user_id)
+
+        elif cmd_type == 'get_sync':
+            if self.sync_engine is None:
+                await self.send_to_client(websocket, {"error": "Synchrony tracking is disabled"})
+                return
+            try:
+                pairs = self.sync_engine.top_pairs(int(command.get('top_k', 5)),
+                                                   command.get('metric', 'in_sync'),
+                                                   command.get('order', 'most') != 'least',
+                                                   self.sync_metrics)
+            except (TypeError, ValueError) as e:
+                await self.send_to_client(websocket, {"error": str(e)})
+                return
+            response = {
+                "type": "sync_pairs",
+                "metric": command.get('metric', 'in_sync'),
+                "order": command.get('order', 'most'),
+                "pairs": pairs,
+                "timestamp": time.time()
+            }
+            await self.send_to_client(websocket, response)
+
+        elif cmd_type == 'get_latency':
+            await self.send_to_client(websocket, self.build_latency_report())
+
+        elif cmd_type == 'ping':
+            # Echoed through the client's queue, so the round trip includes any backlog
+            await self.send_to_client(websocket, {
+                "type": "pong",
+                "client_time": command.get('client_time'),
+                "server_time": time.time()
+            })
 
+        elif cmd_type == 'get_metrics':
             response = {
-                "type": "all_statistics_response",
-                "user_statistics": stats,
+                "type": "metrics_response",
+                **self.metrics.snapshot(self.get_metrics_gauges()),
                 "timestamp": time.time()
             }
-            await websocket.send(json.dumps(response))
+            await self.send_to_client(websocket, response)
+
+        elif cmd_type == 'get_all_statistics':
+            await self.send_to_client(websocket, self.statistics_snapshot.get(self.state_version))
 
         else:
             logger.warning(f"Unknown command type: {cmd_type}")
 
+    def build_status(self, version: int) -> Dict[str, Any]:
+        """Status response as of a state version"""
+        return {
+            "type": "status_response",
+            "snapshot": version,
+            "active_devices": list(self.latest_data.keys()),
+            "stale_devices": list(self.user_lifecycle.stale),
+            "user_lifecycle": self.user_lifecycle.get_stats(),
+            "connected_clients": len(self.websocket_clients),
+            "client_stats": [session.get_stats() for session in self.websocket_clients.values()],
+            "ingest_stats": self.ingest_queue.get_stats(),
+            "ingest_workers": self.ingest_workers.get_stats() if self.ingest_workers else None,
+            "recording": self.recorder.get_stats() if self.recorder else None,
+            "dashboard": self.dashboard_assets.get_stats() if self.dashboard_assets else None,
+            "ppg": self.beat_detectors.get_stats() if self.beat_detectors is not None else None,
+            "links": self.links.get_stats() if self.links is not None else None,
+            "logging": get_logging_stats(),
+            "snapshots": {
+                "bootstrap": self.bootstrap_snapshot.get_stats(),
+                "status": self.status_snapshot.get_stats(),
+                "statistics": self.statistics_snapshot.get_stats()
+            },
+            "output_mode": OUTPUT_MODE,
+            "tick_rate_hz": TICK_RATE_HZ if OUTPUT_MODE == "tick" else None,
+            "latest_data": dict(self.latest_data),
+            "smoothing_enabled": SMOOTHING_ENABLED,
+            "smoothing_config": {
+                "alpha": SMOOTHING_ALPHA,
+                "history_length": HISTORY_LENGTH
+            },
+            "timestamp": time.time()
+        }
+
+    def build_latency_report(self) -> Dict[str, Any]:
+        """Where the time goes: device links, broker stages and client queues"""
+        stages = self.metrics.stages
+        return {
+            "type": "latency_report",
+            "devices": self.links.get_stats() if self.links is not None else None,
+            "broker": {stage: stages[stage].summary()
+                       for stage in ("receive", "decode", "beats", "parse", "finger", "smoothing",
+                                     "statistics", "serialize")},
+            "clients": [{
+                "client_ip": session.client_ip,
+                "queue_depth": len(session.queue),
+                "queue_wait": session.queue_wait.summary(),
+                "dropped": session.dropped
+            } for session in self.websocket_clients.values()],
+            "timestamp": time.time()
+        }
+
+    def build_all_statistics(self, version: int) -> Dict[str, Any]:
+        """Every user's signal statistics as of a state version"""
+        stats = {}
+        if self.ingest_workers is not None:
+            # The smoothers live in the workers; every result carries their statistics
+            for user_id, data in self.latest_data.items():
+                if 'signal_stats' in data:
+                    stats[user_id] = data['signal_stats']
+        else:
+            for user_id, user_data in self.user_smoothers.items():
+                stats[user_id] = user_data['smoother'].get_statistics()
+
+        return {
+            "type": "all_statistics_response",
+            "snapshot": version,
+            "user_statistics": stats,
+            "timestamp": time.time()
+        }
+
+    def build_bootstrap(self, version: int) -> Dict[str, Any]:
+        """Every user's latest data in one frame, for newly connected clients"""
+        return {
+            "type": "frame",
+            "frame": self.frame_count,
+            "snapshot": version,
+            "users": dict(self.latest_data),
+            "timestamp": time.time()
+        }
+
+    def get_metrics_gauges(self) -> Dict[str, float]:
+        """Point-in-time values to report next to the stage metrics"""
+        client_depths = [len(session.queue) for session in self.websocket_clients.values()]
+        return {
+            "connected_clients": len(self.websocket_clients),
+            "active_users": len(self.latest_data),
+            "stale_users": len(self.user_lifecycle.stale),
+            "ingest_queue_depth": len(self.ingest_queue.buffer),
+            "ingest_queue_high_water": self.ingest_queue.high_water,
+            "client_queue_depth_total": sum(client_depths),
+            "client_queue_depth_max": max(client_depths, default=0),
+            "frame_updates_pending": len(self.frame_updates),
+            **(self.links.get_worst() if self.links is not None else {})
+        }
+
+    def render_metrics(self) -> str:
+        """Prometheus text for the metrics endpoint"""
+        return self.metrics.render_prometheus(self.get_metrics_gauges())
+
     async def start_websocket_server(self):
         """Start WebSocket server for clients like TouchDesigner"""
         logger.info(f"WebSocket server starting on {WEBSOCKET_HOST}:{WEBSOCKET_PORT}")
@@ -397,10 +1795,22 @@ class BPMBroker:
         global _broker_instance
         _broker_instance = self
 
+        options = {}
+        if SERVE_DASHBOARD:
+            if supports_dashboard():
+                # Plain HTTP requests get dashboard files; upgrades become WebSocket connections
+                self.dashboard_assets = DashboardAssets(DASHBOARD_DIR)
+                options["process_request"] = self.dashboard_assets.process_request
+                logger.info(f"Serving the dashboard on http://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/")
+            else:
+                logger.warning(f"SERVE_DASHBOARD needs websockets 14 or newer (found {websockets.__version__}) "
+                               "- run web_dashboard/server.py instead")
+
         return await websockets.serve(
             websocket_connection_handler,
             WEBSOCKET_HOST,
-            WEBSOCKET_PORT
+            WEBSOCKET_PORT,
+            **options
         )
 
     async def handle_websocket_connection(self, websocket, path):
@@ -411,32 +1821,57 @@ class BPMBroker:
         except Exception:
             client_ip = "unknown"
 
+        # Newer websockets versions no longer pass the path to the handler
+        if path is None:
+            request = getattr(websocket, "request", None)
+            path = getattr(request, "path", None) or getattr(websocket, "path", None)
         path = path or "/"
         logger.info(f"WebSocket client connected: {client_ip} (path: {path})")
 
+        # Clients choose their codec and stream mode at connect time,
+        # e.g. /?codec=msgpack&stream=delta
+        query = parse_qs(urlparse(path).query)
+        codec_name = query.get('codec', [None])[0]
         try:
-            # Add client to set
-            self.websocket_clients.add(websocket)
+            codec = get_codec(codec_name)
+        except ValueError as e:
+            logger.warning(f"{e} - using default codec for {client_ip}")
+            codec = get_codec()
+
+        delta = None
+        if query.get('stream', [None])[0] == 'delta':
+            delta = DeltaEncoder(DELTA_KEYFRAME_INTERVAL, DELTA_EPSILON,
+                                 DELTA_KEEPALIVE_SECONDS, DELTA_VOLATILE_FIELDS)
+
+        session = ClientSession(websocket, client_ip, codec, metrics=self.metrics, delta=delta)
+
+        try:
+            # Register client and start its writer
+            self.websocket_clients[websocket] = session
+            self.state_version += 1
+            session.start()
             logger.info(f"Total WebSocket clients: {len(self.websocket_clients)}")
 
-            # Send current data to new client
+            # Send current data to the new client as one frame (keyframes in delta mode)
             if self.latest_data:
-                for user_id, data in self.latest_data.items():
-                    try:
-                        await websocket.send(json.dumps(data))
-                    except Exception as e:
-                        logger.warning(f"Failed to send historical data: {e}")
+                try:
+                    bootstrap = self.bootstrap_snapshot.get(self.state_version)
+                    session.enqueue(bootstrap.data if delta is not None else bootstrap.encode(codec))
+                except Exception as e:
+                    logger.warning(f"Failed to send historical data: {e}")
 
             # Send heartbeat/status message
             status_message = {
                 "type": "status",
                 "message": "Connected to BPM Broker",
                 "active_devices": list(self.latest_data.keys()),
+                "codec": codec.name,
+                "stream": "delta" if delta is not None else "full",
                 "timestamp": time.time()
             }
 
             try:
-                await websocket.send(json.dumps(status_message))
+                await self.send_to_client(websocket, status_message)
                 logger.info(f"Status message sent to {client_ip}")
             except Exception as e:
                 logger.warning(f"Failed to send status message: {e}")
@@ -446,10 +1881,10 @@ class BPMBroker:
                 async for message in websocket:
                     try:
                         if message.strip():  # Only process non-empty messages
-                            command = json.loads(message)
+                            command = decode_command(message, codec)
                             await self.handle_websocket_command(websocket, command)
-                    except json.JSONDecodeError:
-                        logger.warning(f"Invalid JSON from {client_ip}: {message}")
+                    except ValueError:
+                        logger.warning(f"Invalid message from {client_ip}: {message!r}")
                     except Exception as e:
                         logger.warning(f"Error processing message from {client_ip}: {e}")
 
@@ -461,16 +1896,51 @@ class BPMBroker:
         except Exception as e:
             logger.error(f"WebSocket handler error for {client_ip}: {e}")
         finally:
-            self.websocket_clients.discard(websocket)
+            self.websocket_clients.pop(websocket, None)
+            self.state_version += 1
+            await session.stop()
             logger.info(f"WebSocket client {client_ip} disconnected (Total: {len(self.websocket_clients)})")
 
+    async def preload_analytics(self):
+        """Import the NumPy/SciPy-backed modules in a thread so first use does not pause the event loop"""
+        start = time.perf_counter()
+        for name in ANALYTICS_MODULES:
+            try:
+                await asyncio.to_thread(importlib.import_module, name)
+            except ImportError as e:
+                logger.warning(f"Could not preload {name}: {e}")
+        logger.info(f"Analytics modules loaded in {time.perf_counter() - start:.2f}s")
+
     async def run(self):
         """Main broker run loop"""
         logger.info("Starting BPM Broker...")
 
-        # Start both servers concurrently
-        websocket_server = await self.start_websocket_server()
+        if RECORDING_ENABLED:
+            self.recorder = SessionRecorder(RECORDING_DIR, segment_seconds=RECORDING_SEGMENT_SECONDS)
+            self.recorder.start()
+
+        # Start UDP first so ingest worker processes (if any) are forked
+        # before the WebSocket listening socket exists
         udp_transport = await self.start_udp_server()
+        websocket_server = await self.start_websocket_server()
+
+        if METRICS_ENABLED:
+            self.metrics_server = MetricsServer(self.render_metrics, METRICS_HOST, METRICS_PORT)
+            await self.metrics_server.start()
+
+        if OUTPUT_MODE == "tick":
+            self.frame_task = asyncio.create_task(self.run_frame_ticker())
+            logger.info(f"Frame coalescing enabled at {TICK_RATE_HZ} Hz")
+
+        if SYNC_ENABLED:
+            self.sync_task = asyncio.create_task(self.run_sync_ticker())
+
+        if PRELOAD_ANALYTICS:
+            asyncio.create_task(self.preload_analytics())
+
+        self.listening.set()
+
+        self.sweep_task = asyncio.create_task(self.run_user_sweeper())
 
         logger.info("BPM Broker is running!")
         logger.info(f"UDP: {UDP_HOST}:{UDP_PORT}")
@@ -483,10 +1953,24 @@ class BPMBroker:
         except KeyboardInterrupt:
             logger.info("Shutting down...")
         finally:
+            if self.frame_task:
+                self.frame_task.cancel()
+            if self.sync_task:
+                self.sync_task.cancel()
+            if self.sweep_task:
+                self.sweep_task.cancel()
+            if self.ingest_task:
+                self.ingest_task.cancel()
             if self.udp_transport:
                 self.udp_transport.close()
+            if self.ingest_workers:
+                self.ingest_workers.stop()
             websocket_server.close()
             await websocket_server.wait_closed()
+            if self.metrics_server:
+                await self.metrics_server.stop()
+            if self.recorder:
+                self.recorder.stop()
 
 async def main():
     """Main entry point"""
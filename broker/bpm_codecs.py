@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Message codecs for the BPM Broker WebSocket output
+
+Every message the broker sends goes through a codec. The stdlib JSON codec
+is the default; orjson and msgpack are used when installed and a client asks
+for them at connect time, e.g. ws://localhost:6789/?codec=msgpack
+
+Messages are wrapped in EncodedMessage so each one is serialized at most
+once per codec, no matter how many clients receive it. SnapshotMessage does
+the same for messages built from broker state (status, statistics, the
+connect bootstrap), rebuilding them only after the state has changed.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import json
+import time
+from typing import Callable, Dict, Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULT_CODEC = "json"
+
+class Codec:
+    """Base class for message codecs"""
+
+    name = ""
+    binary = False  # True if payloads are sent as binary WebSocket frames
+
+    def encode(self, data: Any):
+        raise NotImplementedError
+
+    def decode(self, payload) -> Any:
+        raise NotImplementedError
+
+class JsonCodec(Codec):
+    """Standard library JSON (text frames)"""
+
+    name = "json"
+
+    def encode(self, data: Any) -> str:
+        return json.dumps(data)
+
+    def decode(self, payload) -> Any:
+        return json.loads(payload)
+
+class OrjsonCodec(Codec):
+    """orjson - same JSON text frames, several times faster to produce"""
+
+    name = "orjson"
+
+    def encode(self, data: Any) -> str:
+        # User ids are used as dict keys, so non-string keys must be allowed
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    def decode(self, payload) -> Any:
+        return orjson.loads(payload)
+
+class MsgpackCodec(Codec):
+    """MessagePack (binary frames)"""
+
+    name = "msgpack"
+    binary = True
+
+    def encode(self, data: Any) -> bytes:
+        return msgpack.packb(data)
+
+    def decode(self, payload) -> Any:
+        return msgpack.unpackb(payload, strict_map_key=False)
+
+CODECS: Dict[str, Codec] = {"json": JsonCodec()}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec()
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+def available_codecs() -> list:
+    """Names of the codecs usable in this environment"""
+    return list(CODECS.keys())
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """Look up a codec by name (default: DEFAULT_CODEC)"""
+    name = name or DEFAULT_CODEC
+    if name not in CODECS:
+        raise ValueError(f"Codec '{name}' is not available (available: {', '.join(CODECS)})")
+    return CODECS[name]
+
+def decode_command(payload, codec: Codec) -> Any:
+    """Decode an incoming client message
+
+    Text frames are always JSON so simple clients can send commands as text
+    regardless of the codec they receive with.
+    """
+    if isinstance(payload, str):
+        return json.loads(payload)
+    return codec.decode(payload)
+
+class EncodedMessage:
+    """A message that is serialized lazily, at most once per codec"""
+
+    __slots__ = ("data", "encoded")
+
+    def __init__(self, data: Any):
+        self.data = data
+        self.encoded: Dict[str, Any] = {}
+
+    def encode(self, codec: Codec):
+        """Get the payload for a codec, serializing it on first use"""
+        payload = self.encoded.get(codec.name)
+        if payload is None:
+            payload = codec.encode(self.data)
+            self.encoded[codec.name] = payload
+        return payload
+
+class SnapshotMessage:
+    """An EncodedMessage rebuilt from broker state at most once per state
+    version, and no more often than every `interval` seconds
+
+    Requests in between get the same pre-encoded payload, so a burst of
+    clients asking for it costs one build and one encode per codec.
+    """
+
+    def __init__(self, build: Callable[[int], Dict[str, Any]], interval: float = 0.1):
+        self.build = build
+        self.interval = interval
+        self.message: Optional[EncodedMessage] = None
+        self.version = -1
+        self.built_at = 0.0
+
+        # Counters
+        self.builds = 0
+        self.hits = 0
+
+    def get(self, version: int) -> EncodedMessage:
+        """The snapshot for a state version (possibly up to `interval` seconds old)"""
+        now = time.monotonic()
+        if self.message is None or (version != self.version and now - self.built_at >= self.interval):
+            self.message = EncodedMessage(self.build(version))
+            self.version = version
+            self.built_at = now
+            self.builds += 1
+        else:
+            self.hits += 1
+        return self.message
+
+    def invalidate(self):
+        """Rebuild on the next request regardless of the interval"""
+        self.message = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "version": self.version,
+            "builds": self.builds,
+            "hits": self.hits
+        }
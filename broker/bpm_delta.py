@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Field-level delta encoding for the BPM Broker WebSocket stream
+
+Clients that connect with ?stream=delta receive, per user, a keyframe with
+every field first and then only the fields that changed since the last
+message actually sent to them:
+
+    {"type": "delta", "user": 1, "keyframe": true,  "fields": {"bpm": 72.1, ...}}
+    {"type": "delta", "user": 1, "keyframe": false, "fields": {"bpm": 72.4, "server_timestamp": ...}}
+
+Numbers that moved by no more than `epsilon` count as unchanged, and
+"volatile" fields (timestamps) never count as a change on their own, so a
+steady signal produces no messages at all except a keepalive every
+`keepalive` seconds. A full keyframe is sent every `keyframe_interval`
+messages per user. In "tick" mode the same records are sent inside frames:
+{"type": "frame", "users": {"1": {"keyframe": false, "fields": {...}}}}.
+
+Deltas are computed when a message is written to the socket, against what
+that client has actually received, so queue drops, conflation and rate caps
+never leave the client with a wrong base.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+from typing import Any, Dict, Optional
+
+class DeltaEncoder:
+    """Per-client delta state for every user"""
+
+    def __init__(self, keyframe_interval: int = 50, epsilon: float = 0.05,
+                 keepalive: float = 5.0, volatile_fields: tuple = ()):
+        self.keyframe_interval = keyframe_interval
+        self.epsilon = epsilon
+        self.keepalive = keepalive
+        self.volatile_fields = frozenset(volatile_fields)
+
+        # user id -> {"fields": what the client has, "count": messages since keyframe, "sent_at": time}
+        self.state: Dict[Any, Dict[str, Any]] = {}
+
+        # Counters
+        self.keyframes = 0
+        self.deltas = 0
+        self.suppressed = 0
+
+    def invalidate(self, user_id: Any = None):
+        """Send a keyframe next (for one user, or for everybody)"""
+        if user_id is None:
+            self.state.clear()
+        else:
+            self.state.pop(user_id, None)
+
+    def encode(self, data: Dict[str, Any], now: float) -> Optional[Dict[str, Any]]:
+        """Turn a broadcast message into what to send (None = suppress it)"""
+        if data.get('type') == 'frame':
+            users = {}
+            for user_id, user_data in data['users'].items():
+                record = self.encode_user(user_id, user_data, now)
+                if record is not None:
+                    users[user_id] = record
+            return {**data, 'users': users} if users else None
+
+        user_id = data.get('user')
+        if user_id is None:
+            return data
+
+        record = self.encode_user(user_id, data, now)
+        return None if record is None else {"type": "delta", "user": user_id, **record}
+
+    def encode_user(self, user_id: Any, data: Dict[str, Any], now: float) -> Optional[Dict[str, Any]]:
+        """Keyframe or delta record for one user's update (None = suppress it)"""
+        state = self.state.get(user_id)
+
+        if state is None or state["count"] >= self.keyframe_interval:
+            fields = {field: value for field, value in data.items() if field != 'user'}
+            self.state[user_id] = {"fields": dict(fields), "count": 1, "sent_at": now}
+            self.keyframes += 1
+            return {"keyframe": True, "fields": fields}
+
+        known = state["fields"]
+        volatile = self.volatile_fields
+        changed = {}
+        volatile_changed = {}
+        for field, value in data.items():
+            if field == 'user':
+                continue
+            if field not in known or self._changed(known[field], value):
+                if field in volatile:
+                    volatile_changed[field] = value
+                else:
+                    changed[field] = value
+        removed = [field for field in known if field not in data and field not in volatile]
+
+        if not changed and not removed and now - state["sent_at"] < self.keepalive:
+            self.suppressed += 1
+            return None
+
+        changed.update(volatile_changed)
+        known.update(changed)
+        for field in removed:
+            del known[field]
+        state["count"] += 1
+        state["sent_at"] = now
+        self.deltas += 1
+
+        record = {"keyframe": False, "fields": changed}
+        if removed:
+            record["removed"] = removed
+        return record
+
+    def _changed(self, old: Any, new: Any) -> bool:
+        """Whether a value differs from what the client has (beyond epsilon for numbers)"""
+        if isinstance(old, dict) and isinstance(new, dict):
+            if old.keys() != new.keys():
+                return True
+            return any(self._changed(old[key], new[key]) for key in new)
+        if (isinstance(old, (int, float)) and isinstance(new, (int, float))
+                and not isinstance(old, bool) and not isinstance(new, bool)):
+            return abs(new - old) > self.epsilon
+        return old != new
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "keyframes": self.keyframes,
+            "deltas": self.deltas,
+            "suppressed": self.suppressed
+        }
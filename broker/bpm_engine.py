@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Vectorized multi-user smoothing engine for the BPM Broker
+
+Instead of one SignalSmoother object per user, every user's state lives in
+preallocated NumPy arrays indexed by a dense user slot: EMA value, startup
+counter, finger counters, the history ring and the running window
+statistics. A drained batch of packets is applied in a few array
+operations per "round", where round k holds the k-th packet of every user in
+the batch (so each user appears at most once per round and the per-user
+recurrences stay in order).
+
+The arithmetic mirrors SignalSmoother.add_sample and RollingStatistics
+operation for operation, so smoothed values and statistics are identical to
+the per-packet path, not just close.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 64  # User slots allocated up front; doubled when full
+NO_FINGER_THRESHOLD = 2  # Consecutive no-finger readings before sending "--"
+
+class VectorSmoothingEngine:
+    """Struct-of-arrays smoothing state for every user"""
+
+    def __init__(self, alpha: float, history_length: int, min_bpm: float, max_bpm: float,
+                 startup_threshold: int = 10, capacity: int = INITIAL_CAPACITY):
+        self.alpha = alpha
+        self.window = history_length
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.startup_threshold = startup_threshold
+
+        self.out_of_range = 0  # Readings rejected by the range check in the last batch
+        self.slots: Dict[Any, int] = {}  # user id -> slot
+        self.user_ids: List[Any] = []  # slot -> user id (None = free)
+        self.free_slots: List[int] = []  # Released slots, reused before growing
+        self.capacity = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        """Grow every state array to `capacity` slots, keeping existing state"""
+        def grow(array: Optional[np.ndarray], fill, dtype, width: int = 0):
+            shape = (capacity, width) if width else (capacity,)
+            grown = np.full(shape, fill, dtype=dtype)
+            if array is not None:
+                grown[:len(array)] = array
+            return grown
+
+        existing = self.capacity > 0
+        self.last_value = grow(self.last_value if existing else None, np.nan, np.float64)  # NaN = no value yet
+        self.startup = grow(self.startup if existing else None, 0, np.int32)
+        self.no_finger = grow(self.no_finger if existing else None, 0, np.int32)
+        self.last_finger = grow(self.last_finger if existing else None, True, np.bool_)
+        self.has_smoother = grow(self.has_smoother if existing else None, False, np.bool_)
+
+        # History ring (NaN = empty) and window statistics
+        self.ring = grow(self.ring if existing else None, np.nan, np.float64, self.window)
+        self.position = grow(self.position if existing else None, 0, np.int64)  # Next write index
+        self.count = grow(self.count if existing else None, 0, np.int64)
+        self.mean = grow(self.mean if existing else None, 0.0, np.float64)
+        self.m2 = grow(self.m2 if existing else None, 0.0, np.float64)
+        self.removals = grow(self.removals if existing else None, 0, np.int64)
+
+        self.capacity = capacity
+
+    def slot_for(self, user_id: Any) -> int:
+        """Get the slot of a user, assigning the next free one if needed"""
+        slot = self.slots.get(user_id)
+        if slot is None:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+                self.user_ids[slot] = user_id
+            else:
+                slot = len(self.user_ids)
+                if slot >= self.capacity:
+                    self._allocate(self.capacity * 2)
+                self.user_ids.append(user_id)
+            self.slots[user_id] = slot
+            logger.info(f"Assigned smoothing slot {slot} to User {user_id}")
+        return slot
+
+    def release(self, user_id: Any):
+        """Forget a user and clear their slot for reuse"""
+        slot = self.slots.pop(user_id, None)
+        if slot is None:
+            return
+        self.user_ids[slot] = None
+        self.free_slots.append(slot)
+
+        self.last_value[slot] = np.nan
+        self.startup[slot] = 0
+        self.no_finger[slot] = 0
+        self.last_finger[slot] = True
+        self.has_smoother[slot] = False
+        self.ring[slot] = np.nan
+        self.position[slot] = 0
+        self.count[slot] = 0
+        self.mean[slot] = 0.0
+        self.m2[slot] = 0.0
+        self.removals[slot] = 0
+
+    def apply_batch(self, packets: List[Dict[str, Any]], addrs: List[tuple]) -> List[Optional[Dict[str, Any]]]:
+        """Run finger detection and smoothing on a batch of packets
+
+        Returns the enriched packets in input order, with None for packets
+        that could not be processed (as BPMBroker.apply_packet would).
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(packets)
+        self.out_of_range = 0
+
+        # Split the batch into rounds with at most one packet per user
+        rounds: List[List[int]] = []
+        occurrences: Dict[int, int] = {}
+        slots = [0] * len(packets)
+        raw_values = [0.0] * len(packets)
+        fingers = [True] * len(packets)
+
+        for i, data in enumerate(packets):
+            try:
+                raw_bpm = data['bpm']
+                if not isinstance(raw_bpm, (int, float)):
+                    raise TypeError(f"BPM must be a number, got {raw_bpm!r}")
+                raw_values[i] = float(raw_bpm)
+                slot = self.slot_for(data['user'])
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error("Error processing UDP data: %s", e)
+                continue
+
+            slots[i] = slot
+            fingers[i] = bool(data.get('finger_detected', True))
+            occurrence = occurrences.get(slot, 0)
+            occurrences[slot] = occurrence + 1
+            if occurrence == len(rounds):
+                rounds.append([])
+            rounds[occurrence].append(i)
+
+        server_timestamp = time.time()
+        received_at = datetime.now().isoformat()
+
+        for indices in rounds:
+            self._apply_round(indices, packets, slots, raw_values, fingers, results)
+
+        for i in range(len(packets)):
+            data = results[i]
+            if data is not None:
+                data['server_timestamp'] = server_timestamp
+                data['source_ip'] = addrs[i][0]
+                data['received_at'] = received_at
+
+        return results
+
+    def _apply_round(self, indices: List[int], packets: list, all_slots: list,
+                     all_raw: list, all_fingers: list, results: list):
+        """Apply one packet for each of a set of distinct users"""
+        slots = np.array([all_slots[i] for i in indices], dtype=np.int64)
+        raw = np.array([all_raw[i] for i in indices], dtype=np.float64)
+        finger = np.array([all_fingers[i] for i in indices], dtype=np.bool_)
+
+        # Finger tracking
+        no_finger = np.where(finger, 0, self.no_finger[slots] + 1)
+        self.no_finger[slots] = no_finger
+        reset = finger & ~self.last_finger[slots] & self.has_smoother[slots]
+        if reset.any():
+            # Finger is back after an absence: new session (history is kept)
+            self.startup[slots[reset]] = 0
+            self.last_value[slots[reset]] = np.nan
+        self.last_finger[slots] = finger
+
+        finger_lost = ~finger & (no_finger > NO_FINGER_THRESHOLD)
+        no_heart_rate = finger_lost | (raw <= 0)
+        smooth = ~no_heart_rate
+
+        smoothed_values, stats = self._smooth(slots[smooth], raw[smooth])
+
+        finger_lost = finger_lost.tolist()
+        no_heart_rate = no_heart_rate.tolist()
+        smoothed_iter = iter(smoothed_values)
+        stats_iter = iter(stats)
+
+        for position, i in enumerate(indices):
+            data = packets[i]
+            if no_heart_rate[position]:
+                data['bpm_raw'] = data['bpm']
+                data['bpm'] = "--"
+                data['bpm_smoothed'] = False
+                data['no_heart_rate'] = True
+                if finger_lost[position]:
+                    data['finger_detected'] = False
+            else:
+                data['bpm_raw'] = all_raw[i]
+                data['bpm'] = next(smoothed_iter)
+                data['bpm_smoothed'] = True
+                data['signal_stats'] = next(stats_iter)
+                data['no_heart_rate'] = False
+            results[i] = data
+
+    def _smooth(self, slots: np.ndarray, values: np.ndarray):
+        """Vectorized SignalSmoother.add_sample + get_statistics for distinct slots"""
+        if not len(slots):
+            return [], []
+
+        self.has_smoother[slots] = True
+        last = self.last_value[slots]
+        in_range = (values >= self.min_bpm) & (values <= self.max_bpm)
+        warming_up = in_range & (self.startup[slots] < self.startup_threshold)
+
+        # Out of range: keep the previous value (or pass the reading through)
+        held = np.where(np.isnan(last) | (last == 0), values, last)
+        ema = np.where(np.isnan(last), values, self.alpha * values + (1 - self.alpha) * last)
+        smoothed = np.where(in_range, np.where(warming_up, values, ema), held)
+        self.out_of_range += int(np.count_nonzero(~in_range))
+
+        self.startup[slots[warming_up]] += 1
+        accepted = slots[in_range]
+        self.last_value[accepted] = smoothed[in_range]
+        self._push(accepted, smoothed[in_range])
+
+        return smoothed.tolist(), self.statistics(slots)
+
+    def _push(self, slots: np.ndarray, values: np.ndarray):
+        """Append one value per slot to the history ring and window statistics"""
+        if not len(slots):
+            return
+
+        window = self.window
+        count = self.count[slots]
+        position = self.position[slots]
+        mean = self.mean[slots]
+        m2 = self.m2[slots]
+        full = count == window
+
+        # Welford update with removal of the value leaving the window
+        old = self.ring[slots, position]
+        full_mean = mean + (values - old) / window
+        full_m2 = m2 + (values - old) * (values - full_mean + old - mean)
+
+        grown = count + 1
+        delta = values - mean
+        grow_mean = mean + delta / grown
+        grow_m2 = m2 + delta * (values - grow_mean)
+
+        self.mean[slots] = np.where(full, full_mean, grow_mean)
+        self.m2[slots] = np.where(full, full_m2, grow_m2)
+        self.ring[slots, position] = values
+        self.position[slots] = (position + 1) % window
+        self.count[slots] = np.minimum(grown, window)
+
+        self.removals[slots[full]] += 1
+        for slot in slots[self.removals[slots] >= window].tolist():
+            self._resync(slot)
+
+    def _resync(self, slot: int):
+        """Recompute mean and M2 exactly from the window (as RollingStatistics does)"""
+        values = self.history(slot)
+        mean = sum(values) / len(values)
+        self.mean[slot] = mean
+        self.m2[slot] = sum((v - mean) ** 2 for v in values)
+        self.removals[slot] = 0
+
+    def statistics(self, slots: np.ndarray) -> List[Dict[str, float]]:
+        """Window statistics for each slot, as RollingStatistics.get_statistics"""
+        count = self.count[slots]
+        rows = self.ring[slots]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.maximum(self.m2[slots], 0.0) / count)
+        filled = count > 0
+        minimum = np.full(len(slots), np.nan)
+        maximum = np.full(len(slots), np.nan)
+        if filled.any():
+            minimum[filled] = np.nanmin(rows[filled], axis=1)
+            maximum[filled] = np.nanmax(rows[filled], axis=1)
+        last = rows[np.arange(len(slots)), (self.position[slots] - 1) % self.window]
+
+        stats = []
+        for n, mean, s, lo, hi, value in zip(count.tolist(), self.mean[slots].tolist(), std.tolist(),
+                                            minimum.tolist(), maximum.tolist(), last.tolist()):
+            if n:
+                stats.append({"mean": mean, "std": s, "min": lo, "max": hi, "last": value})
+            else:
+                stats.append({})
+        return stats
+
+    def history(self, slot: int) -> List[float]:
+        """Values in a slot's window, oldest first"""
+        count = int(self.count[slot])
+        position = int(self.position[slot])
+        row = self.ring[slot]
+        if count < self.window:
+            return row[:count].tolist()
+        return np.concatenate((row[position:], row[:position])).tolist()
+
+    def get_view(self, user_id: Any) -> "VectorSmootherView":
+        return VectorSmootherView(self, self.slot_for(user_id))
+
+class VectorSmootherView:
+    """Read-only SignalSmoother-like view of one user's slot (for the commands)"""
+
+    def __init__(self, engine: VectorSmoothingEngine, slot: int):
+        self.engine = engine
+        self.slot = slot
+
+    def get_history(self) -> list:
+        return self.engine.history(self.slot)
+
+    def get_statistics(self) -> Dict[str, float]:
+        return self.engine.statistics(np.array([self.slot]))[0]
+
+    def reset_for_new_session(self):
+        self.engine.startup[self.slot] = 0
+        self.engine.last_value[self.slot] = np.nan
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Streaming filter stages for the BPM Broker smoothing pipeline
+
+A FilterChain runs a user's in-range readings through a configurable list
+of stages before the smoother's EMA:
+
+    "hampel"       replace outliers with the median of the last HAMPEL_WINDOW
+                   readings (|x - median| > HAMPEL_SIGMAS * 1.4826 * MAD)
+    "median"       output the median of the last MEDIAN_WINDOW readings
+    "butterworth"  low-pass IIR filter run as second-order sections, with the
+                   filter state (zi) carried from one reading to the next
+    "ema"          the existing exponential moving average (must come last)
+
+All windows are trailing (causal), so every stage costs constant time per
+reading. Each stage can take one reading at a time (process_one) or a run
+of readings at once (process), and both carry the same state.
+
+NumPy and SciPy are imported when a stage first needs them, so the default
+chain (just "ema") starts without loading either.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+from collections import deque
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAD_SCALE = 1.4826  # MAD -> standard deviation for normally distributed noise
+
+class FilterStage:
+    """Base class for filter stages"""
+
+    name = ""
+
+    def process_one(self, value: float) -> float:
+        raise NotImplementedError
+
+    def process(self, values: "np.ndarray") -> "np.ndarray":
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+class WindowMedianFilter(FilterStage):
+    """Trailing-window median filter, optionally as a Hampel outlier filter"""
+
+    name = "median"
+
+    def __init__(self, window: int, sigmas: Optional[float] = None):
+        if window < 1:
+            raise ValueError("Filter window must be at least 1")
+        self.window = window
+        self.sigmas = sigmas  # None = plain median filter
+        self.recent: deque = deque(maxlen=window)  # Raw readings
+
+    def _apply(self, value: float, median: float, mad: float) -> float:
+        if self.sigmas is None:
+            return median
+        return median if abs(value - median) > self.sigmas * MAD_SCALE * mad else value
+
+    def process_one(self, value: float) -> float:
+        self.recent.append(value)
+        ordered = sorted(self.recent)
+        median = _median_sorted(ordered)
+        mad = _median_sorted(sorted(abs(v - median) for v in ordered)) if self.sigmas is not None else 0.0
+        return self._apply(value, median, mad)
+
+    def process(self, values: "np.ndarray") -> "np.ndarray":
+        import numpy as np
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        output = np.empty(len(values))
+        history = len(self.recent)
+
+        # Readings before the window has filled up (only right after a reset)
+        partial = min(len(values), self.window - 1 - history) if history < self.window - 1 else 0
+        for i in range(partial):
+            output[i] = self.process_one(float(values[i]))
+        if partial == len(values):
+            return output
+
+        rest = values[partial:]
+        buffer = np.concatenate((np.fromiter(self.recent, float, len(self.recent))[1 - self.window:]
+                                 if self.window > 1 else np.empty(0), rest))
+        windows = sliding_window_view(buffer, self.window)
+        median = np.median(windows, axis=1)
+        if self.sigmas is None:
+            output[partial:] = median
+        else:
+            mad = np.median(np.abs(windows - median[:, None]), axis=1)
+            output[partial:] = np.where(np.abs(rest - median) > self.sigmas * MAD_SCALE * mad, median, rest)
+
+        self.recent.extend(rest[-self.window:].tolist())
+        return output
+
+    def reset(self):
+        self.recent.clear()
+
+class HampelFilter(WindowMedianFilter):
+    name = "hampel"
+
+    def __init__(self, window: int, sigmas: float):
+        super().__init__(window, sigmas)
+
+class ButterworthFilter(FilterStage):
+    """Butterworth low-pass filter as second-order sections with carried state"""
+
+    name = "butterworth"
+
+    def __init__(self, order: int, cutoff_hz: float, sample_rate_hz: float):
+        from scipy import signal
+
+        self.signal = signal
+        self.sos = signal.butter(order, cutoff_hz, btype="low", fs=sample_rate_hz, output="sos")
+        self.coefficients = self.sos.tolist()
+        self.steady_state = signal.sosfilt_zi(self.sos)  # State for a unit step
+        self.zi: Optional["np.ndarray"] = None
+
+    def _start(self, value: float):
+        # Start as if the input had always been at the first reading, so the
+        # output does not ramp up from zero
+        self.zi = self.steady_state * value
+
+    def process_one(self, value: float) -> float:
+        if self.zi is None:
+            self._start(value)
+        zi = self.zi
+        for section, (b0, b1, b2, _, a1, a2) in enumerate(self.coefficients):
+            z0, z1 = zi[section]
+            output = b0 * value + z0
+            zi[section, 0] = b1 * value - a1 * output + z1
+            zi[section, 1] = b2 * value - a2 * output
+            value = output
+        return float(value)
+
+    def process(self, values: "np.ndarray") -> "np.ndarray":
+        if self.zi is None:
+            self._start(float(values[0]))
+        output, self.zi = self.signal.sosfilt(self.sos, values, zi=self.zi)
+        return output
+
+    def reset(self):
+        self.zi = None
+
+class FilterChain:
+    """The stages a user's readings pass through before the EMA"""
+
+    def __init__(self, stages: List[FilterStage], ema: bool = True):
+        self.stages = stages
+        self.ema = ema  # Whether the smoother applies its EMA afterwards
+
+    def process_one(self, value: float) -> float:
+        for stage in self.stages:
+            value = stage.process_one(value)
+        return value
+
+    def process(self, values: Sequence[float]) -> "np.ndarray":
+        import numpy as np
+
+        values = np.asarray(values, dtype=np.float64)
+        for stage in self.stages:
+            values = stage.process(values)
+        return values
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+FILTER_STAGES = ("hampel", "median", "butterworth", "ema")
+
+def build_filter_chain(names: Sequence[str], hampel_window: int = 7, hampel_sigmas: float = 3.0,
+                       median_window: int = 5, butterworth_order: int = 2,
+                       butterworth_cutoff_hz: float = 0.15, sample_rate_hz: float = 1.0) -> FilterChain:
+    """Build a FilterChain from stage names, e.g. ("hampel", "butterworth", "ema")"""
+    stages: List[FilterStage] = []
+    ema = False
+
+    for name in names:
+        if name not in FILTER_STAGES:
+            raise ValueError(f"Unknown filter stage: {name} (available: {', '.join(FILTER_STAGES)})")
+        if ema:
+            raise ValueError('"ema" must be the last filter stage')
+
+        if name == "hampel":
+            stages.append(HampelFilter(hampel_window, hampel_sigmas))
+        elif name == "median":
+            stages.append(WindowMedianFilter(median_window))
+        elif name == "butterworth":
+            stages.append(ButterworthFilter(butterworth_order, butterworth_cutoff_hz, sample_rate_hz))
+        else:
+            ema = True
+
+    return FilterChain(stages, ema)
+
+def _median_sorted(ordered: list) -> float:
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Multi-resolution BPM history for the BPM Broker
+
+Every smoothed reading is folded into per-user rollup tiers as it arrives,
+by default 1 s buckets for the last hour, 10 s buckets for the last 6 hours
+and 1 min buckets for the last 24 hours. Each bucket holds min, max, sum
+and count, and each tier is a ring of compact arrays that grows as buckets
+close up to a fixed size, so memory per user follows the history actually
+recorded and is bounded no matter how long the broker runs.
+
+Range queries pick the best-fitting tier (the coarsest one that still has
+at least the requested number of buckets in the range, among tiers that
+cover it) and thin the buckets to the requested number of points with
+Largest-Triangle-Three-Buckets (LTTB), which keeps peaks and dips a plain
+stride would miss. Recording is pure Python; NumPy is only imported for
+the first range query.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import math
+from array import array
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_TIERS = ((1.0, 3600), (10.0, 2160), (60.0, 1440))  # (bucket seconds, buckets kept)
+
+class RollupTier:
+    """Fixed-size ring of (start, min, max, sum, count) buckets at one resolution"""
+
+    def __init__(self, resolution: float, capacity: int):
+        self.resolution = resolution
+        self.capacity = capacity
+        # Columns grow as buckets close, up to capacity
+        self.starts = array('d')
+        self.minimums = array('d')
+        self.maximums = array('d')
+        self.sums = array('d')
+        self.counts = array('d')
+        self.head = 0  # Next ring index to write
+        self.size = 0  # Closed buckets in the ring
+        self.dropped = False  # Whether old buckets have been overwritten
+
+        # The bucket still receiving samples
+        self.open_start: Optional[float] = None
+        self.open_min = self.open_max = self.open_sum = 0.0
+        self.open_count = 0
+
+    def add(self, timestamp: float, value: float):
+        """Fold one sample into its bucket"""
+        start = timestamp - timestamp % self.resolution
+        if self.open_start is not None and start <= self.open_start:
+            # Same bucket (or a clock step backwards: keep it in the open bucket)
+            if value < self.open_min:
+                self.open_min = value
+            if value > self.open_max:
+                self.open_max = value
+            self.open_sum += value
+            self.open_count += 1
+            return
+
+        if self.open_start is not None:
+            self._close()
+        self.open_start = start
+        self.open_min = self.open_max = self.open_sum = value
+        self.open_count = 1
+
+    def _close(self):
+        head = self.head
+        if self.size < self.capacity:
+            # Still filling up: head is the end of the columns
+            self.starts.append(self.open_start)
+            self.minimums.append(self.open_min)
+            self.maximums.append(self.open_max)
+            self.sums.append(self.open_sum)
+            self.counts.append(self.open_count)
+            self.size += 1
+        else:
+            self.starts[head] = self.open_start
+            self.minimums[head] = self.open_min
+            self.maximums[head] = self.open_max
+            self.sums[head] = self.open_sum
+            self.counts[head] = self.open_count
+            self.dropped = True
+        self.head = (head + 1) % self.capacity
+
+    def oldest(self) -> Optional[float]:
+        """Start time of the oldest bucket held"""
+        if self.size:
+            return self.starts[(self.head - self.size) % self.capacity]
+        return self.open_start
+
+    def covers(self, start: float) -> bool:
+        """Whether this tier holds everything from `start` onwards"""
+        oldest = self.oldest()
+        return not self.dropped or (oldest is not None and oldest <= start)
+
+    def buckets(self, start: float, end: float) -> Tuple["np.ndarray", ...]:
+        """(starts, minimums, maximums, means, counts) of the buckets in [start, end], oldest first"""
+        import numpy as np
+
+        order = (np.arange(self.size) + (self.head - self.size)) % self.capacity
+        columns = [np.frombuffer(column, dtype=np.float64)[order]
+                   for column in (self.starts, self.minimums, self.maximums, self.sums, self.counts)]
+        if self.open_start is not None:
+            opened = (self.open_start, self.open_min, self.open_max, self.open_sum, self.open_count)
+            columns = [np.append(column, value) for column, value in zip(columns, opened)]
+
+        starts, minimums, maximums, sums, counts = columns
+        selected = (starts + self.resolution > start) & (starts <= end)
+        return (starts[selected], minimums[selected], maximums[selected],
+                sums[selected] / counts[selected], counts[selected])
+
+    def count_in(self, start: float, end: float) -> int:
+        """Roughly how many buckets fall in [start, end]"""
+        oldest = self.oldest()
+        if oldest is None:
+            return 0
+        span = min(end, self.open_start + self.resolution) - max(start, oldest)
+        return max(0, int(span / self.resolution))
+
+class HistoryRollups:
+    """Rollup tiers for one user"""
+
+    def __init__(self, tiers: tuple = DEFAULT_TIERS):
+        self.tiers = [RollupTier(resolution, capacity) for resolution, capacity in tiers]
+
+    def add(self, timestamp: float, value: float):
+        for tier in self.tiers:
+            tier.add(timestamp, value)
+
+    def choose_tier(self, start: float, end: float, max_points: int) -> RollupTier:
+        """The coarsest covering tier that still fills max_points, else the finest covering one"""
+        covering = [tier for tier in self.tiers if tier.covers(start)]
+        if not covering:
+            return max(self.tiers, key=lambda tier: tier.resolution)  # Longest history available
+        covering.sort(key=lambda tier: tier.resolution)
+        for tier in reversed(covering):
+            if tier.count_in(start, end) >= max_points:
+                return tier
+        return covering[0]
+
+    def query(self, start: float, end: float, max_points: int) -> Dict[str, Any]:
+        """Downsampled series for [start, end] in columnar form"""
+        import numpy as np
+
+        tier = self.choose_tier(start, end, max_points)
+        starts, minimums, maximums, means, counts = tier.buckets(start, end)
+        keep = lttb_indices(starts, means, max_points)
+        return {
+            "resolution": tier.resolution,
+            "buckets": len(starts),
+            "t": starts[keep].tolist(),
+            "mean": np.round(means[keep], 2).tolist(),
+            "min": np.round(minimums[keep], 2).tolist(),
+            "max": np.round(maximums[keep], 2).tolist(),
+            "count": counts[keep].astype(np.int64).tolist()
+        }
+
+class HistoryStore:
+    """Rollups for every user"""
+
+    def __init__(self, tiers: tuple = DEFAULT_TIERS):
+        self.tier_config = tiers
+        self.users: Dict[Any, HistoryRollups] = {}
+
+    def add(self, user_id: Any, timestamp: float, value: float):
+        rollups = self.users.get(user_id)
+        if rollups is None:
+            rollups = self.users[user_id] = HistoryRollups(self.tier_config)
+        rollups.add(timestamp, value)
+
+    def remove(self, user_id: Any):
+        self.users.pop(user_id, None)
+
+    def query(self, user_id: Any, start: float, end: float, max_points: int) -> Optional[Dict[str, Any]]:
+        rollups = self.users.get(user_id)
+        if rollups is None:
+            return None
+        return rollups.query(start, end, max_points)
+
+def lttb_indices(x: "np.ndarray", y: "np.ndarray", threshold: int) -> "np.ndarray":
+    """Indices of the points Largest-Triangle-Three-Buckets keeps (always including both ends)"""
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(threshold, 1)])
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        if end >= n - 1:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x = x[end:next_end].mean()
+            avg_y = y[end:next_end].mean()
+
+        # Point in this bucket forming the largest triangle with the last pick and the next bucket's average
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected.append(a)
+
+    selected.append(n - 1)
+    return np.array(selected)
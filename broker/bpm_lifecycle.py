@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Per-user state lifecycle for the BPM Broker
+
+Every user id the broker publishes data for is tracked here by the time it
+was last seen. A user that stays silent for `stale_after` seconds is
+reported as stale; after `evict_after` seconds its state is evicted. At
+most `max_users` users are tracked: when a new user arrives at the cap, the
+least recently seen user is evicted to make room.
+
+Deadlines live in a heap with one entry per user. An entry is not moved
+when new data arrives (that would cost a heap operation per packet);
+instead, when it comes due, the user's actual last-seen time decides whether
+to mark them stale, evict them or schedule the next check.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import heapq
+import itertools
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+class UserLifecycle:
+    """Last-seen times with stale/evict deadlines and an LRU cap"""
+
+    def __init__(self, stale_after: float = 30.0, evict_after: float = 600.0, max_users: int = 1024):
+        if not 0 < stale_after <= evict_after:
+            raise ValueError("stale_after must be positive and no longer than evict_after")
+        self.stale_after = stale_after
+        self.evict_after = evict_after
+        self.max_users = max_users
+
+        self.last_seen: OrderedDict = OrderedDict()  # user id -> time, least recently seen first
+        self.stale: set = set()
+        self.deadlines: list = []  # Heap of (time, sequence, user id)
+        self.scheduled: Dict[Any, int] = {}  # user id -> sequence of their live heap entry
+        self.sequence = itertools.count()
+
+        # Counters
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def _schedule(self, user_id: Any, when: float):
+        sequence = next(self.sequence)
+        self.scheduled[user_id] = sequence
+        heapq.heappush(self.deadlines, (when, sequence, user_id))
+
+    def touch(self, user_id: Any, now: float) -> List[Any]:
+        """Record data for a user; returns users evicted to stay under the cap"""
+        last_seen = self.last_seen
+        if user_id in last_seen:
+            last_seen[user_id] = now
+            last_seen.move_to_end(user_id)
+            if self.stale:
+                self.stale.discard(user_id)
+            return []
+
+        evicted = []
+        while len(last_seen) >= self.max_users:
+            oldest = next(iter(last_seen))
+            self.remove(oldest)
+            evicted.append(oldest)
+        self.evicted_capacity += len(evicted)
+
+        last_seen[user_id] = now
+        self._schedule(user_id, now + self.stale_after)
+        return evicted
+
+    def sweep(self, now: float) -> Tuple[List[Any], List[Any]]:
+        """Process due deadlines; returns (users now stale, users evicted)"""
+        stale = []
+        evicted = []
+        deadlines = self.deadlines
+
+        while deadlines and deadlines[0][0] <= now:
+            _, sequence, user_id = heapq.heappop(deadlines)
+            if self.scheduled.get(user_id) != sequence:
+                continue  # Superseded (the user was evicted and came back)
+
+            seen = self.last_seen[user_id]
+            if now - seen >= self.evict_after:
+                self.remove(user_id)
+                evicted.append(user_id)
+            elif now - seen >= self.stale_after:
+                if user_id not in self.stale:
+                    self.stale.add(user_id)
+                    stale.append(user_id)
+                self._schedule(user_id, seen + self.evict_after)
+            else:
+                self._schedule(user_id, seen + self.stale_after)
+
+        self.evicted_idle += len(evicted)
+        return stale, evicted
+
+    def remove(self, user_id: Any):
+        """Stop tracking a user"""
+        self.last_seen.pop(user_id, None)
+        self.stale.discard(user_id)
+        self.scheduled.pop(user_id, None)
+
+    def idle_seconds(self, user_id: Any, now: float) -> float:
+        return now - self.last_seen[user_id]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "tracked": len(self.last_seen),
+            "stale": len(self.stale),
+            "max_users": self.max_users,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity
+        }
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Device link quality for the BPM Broker: packet loss and sensor-to-broker latency
+
+Each device's packets are tracked on two fronts:
+
+    sequence  optional per-device sequence numbers ("seq", 16 bits, wrapping)
+              give loss, reordering and duplicates, RTP style: a reading
+              behind the highest number seen so far is reordered (or a
+              duplicate if it already arrived), a big jump means the device
+              restarted
+    clock     every packet pairs the device's millis() timestamp with the
+              broker's receive time. Their difference is the clock offset
+              plus the one-way latency; the lowest differences in each
+              CLOCK_BUCKET_SECONDS are the fastest packets, and a line under
+              them gives the offset and the drift between the two clocks.
+              A packet's latency is how far above that line it arrived
+
+Without a round trip the fixed part of the one-way latency cannot be told
+apart from the clock offset, so latency here is the delay on top of the
+fastest packet from that device: Wi-Fi retries, buffering and congestion,
+which is what makes visuals feel laggy. Jitter is the RFC 3550 estimate.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+from collections import deque
+from typing import Any, Dict, Optional
+
+SEQ_MODULO = 1 << 16
+MAX_DROPOUT = 3000  # Jumps ahead up to this many numbers are losses, further is a restart
+MAX_MISORDER = 100  # Numbers this far behind the highest are late packets, further is a restart
+SEEN_WINDOW = 128  # Numbers behind the highest remembered for duplicate detection
+CLOCK_BUCKET_SECONDS = 10.0  # One lowest-offset point per bucket
+CLOCK_BUCKETS = 30  # Buckets in the offset/drift fit (5 minutes)
+CLOCK_RESET_SECONDS = 30.0  # Offset jumps larger than this mean the device clock restarted
+LATENCY_WINDOW = 256  # Recent latencies kept for the percentiles
+
+class SequenceTracker:
+    """Loss, reordering and duplicates from 16-bit wrapping sequence numbers"""
+
+    def __init__(self):
+        self.restarts = 0
+        self.start()
+
+    def start(self, seq: Optional[int] = None):
+        self.base = seq  # Extended number of the first packet
+        self.highest = seq  # Highest extended number seen
+        self.seen = 1 if seq is not None else 0  # Bit k: highest - k has arrived
+        self.received = 1 if seq is not None else 0  # Unique packets
+        self.duplicates = 0
+        self.reordered = 0
+
+    def observe(self, seq: int):
+        seq %= SEQ_MODULO
+        if self.highest is None:
+            self.start(seq)
+            return
+
+        ahead = (seq - self.highest) % SEQ_MODULO
+        if ahead == 0:
+            self.duplicates += 1
+        elif ahead < MAX_DROPOUT:
+            self.highest += ahead
+            self.seen = ((self.seen << ahead) | 1) & ((1 << SEEN_WINDOW) - 1)
+            self.received += 1
+        elif SEQ_MODULO - ahead <= MAX_MISORDER:
+            behind = SEQ_MODULO - ahead
+            if self.seen >> behind & 1:
+                self.duplicates += 1
+            else:
+                self.base = min(self.base, self.highest - behind)  # Sent before the first one we saw
+                self.seen |= 1 << behind
+                self.received += 1
+                self.reordered += 1
+        else:
+            self.restart(seq)
+
+    def restart(self, seq: int):
+        """The device restarted (or the numbers jumped): count from here"""
+        self.restarts += 1
+        self.start(seq)
+
+    def get_stats(self) -> Dict[str, Any]:
+        expected = self.highest - self.base + 1 if self.highest is not None else 0
+        lost = max(0, expected - self.received)
+        return {
+            "expected": expected,
+            "received": self.received,
+            "lost": lost,
+            "loss_rate": round(lost / expected, 4) if expected else 0.0,
+            "reordered": self.reordered,
+            "duplicates": self.duplicates,
+            "restarts": self.restarts
+        }
+
+class ClockTracker:
+    """Device clock offset and drift, and per-packet latency above the fastest path"""
+
+    def __init__(self):
+        self.resets = 0
+        self.start()
+
+    def start(self):
+        self.origin: Optional[float] = None  # Receive time the fit is relative to
+        self.buckets: deque = deque(maxlen=CLOCK_BUCKETS)  # Closed (time, lowest offset) points
+        self.bucket_start = 0.0
+        self.bucket_low: Optional[tuple] = None  # (time, offset) of the open bucket
+        self.intercept = 0.0  # Offset at origin, seconds
+        self.drift = 0.0  # Seconds of offset per second
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.jitter = 0.0
+        self.previous: Optional[tuple] = None  # (device time, receive time) of the last packet
+
+    def predict(self, received: float) -> float:
+        """Offset of the fastest possible packet at a receive time"""
+        return self.intercept + self.drift * (received - self.origin)
+
+    def observe(self, device_ms: float, received: float) -> float:
+        """Add a packet; returns its latency above the fastest path in seconds"""
+        device = device_ms / 1000.0
+        offset = received - device
+
+        if self.origin is not None and abs(offset - self.predict(received)) > CLOCK_RESET_SECONDS:
+            self.resets += 1
+            self.start()
+        if self.origin is None:
+            self.origin = self.bucket_start = received
+            self.intercept = offset
+
+        # RFC 3550 interarrival jitter
+        if self.previous is not None:
+            difference = (received - self.previous[1]) - (device - self.previous[0])
+            self.jitter += (abs(difference) - self.jitter) / 16.0
+        self.previous = (device, received)
+
+        if received - self.bucket_start >= CLOCK_BUCKET_SECONDS:
+            self.buckets.append(self.bucket_low)
+            self.bucket_start = received
+            self.bucket_low = None
+            self._fit()
+        if self.bucket_low is None or offset < self.bucket_low[1]:
+            self.bucket_low = (received, offset)
+
+        # Nothing arrives faster than the fastest path: move the line down if needed
+        latency = offset - self.predict(received)
+        if latency < 0:
+            self.intercept += latency
+            latency = 0.0
+        self.latencies.append(latency)
+        return latency
+
+    def _fit(self):
+        """Fit the offset line under the lowest point of each bucket"""
+        points = list(self.buckets)
+        if len(points) < 3:
+            return
+        # Least squares on small numbers (relative to the first point), then lower it under every point
+        times = [point[0] - self.origin for point in points]
+        offsets = [point[1] - points[0][1] for point in points]
+        mean_time = sum(times) / len(times)
+        mean_offset = sum(offsets) / len(offsets)
+        spread = sum((t - mean_time) ** 2 for t in times)
+        drift = sum((t - mean_time) * (o - mean_offset) for t, o in zip(times, offsets)) / spread if spread else 0.0
+        intercept = mean_offset - drift * mean_time
+        self.drift = drift
+        self.intercept = points[0][1] + intercept + min(o - (intercept + drift * t) for t, o in zip(times, offsets))
+
+    def get_stats(self) -> Dict[str, Any]:
+        if self.origin is None:
+            return {"offset_ms": None, "drift_ppm": None, "latency_ms": None, "jitter_ms": None, "resets": self.resets}
+        ordered = sorted(self.latencies)
+        return {
+            "offset_ms": round(self.predict(self.previous[1]) * 1000.0, 1),
+            "drift_ppm": round(self.drift * 1e6, 1),
+            "latency_ms": {
+                "last": round(self.latencies[-1] * 1000.0, 1),
+                "p50": round(_percentile(ordered, 0.50) * 1000.0, 1),
+                "p95": round(_percentile(ordered, 0.95) * 1000.0, 1),
+                "max": round(ordered[-1] * 1000.0, 1)
+            },
+            "jitter_ms": round(self.jitter * 1000.0, 1),
+            "resets": self.resets
+        }
+
+class DeviceLink:
+    """Sequence and clock tracking for one device"""
+
+    def __init__(self):
+        self.sequence: Optional[SequenceTracker] = None  # Created on the first numbered packet
+        self.clock = ClockTracker()
+        self.packets = 0
+
+    def observe(self, seq: Optional[int], device_ms: Optional[float], received: float) -> Optional[float]:
+        self.packets += 1
+        if seq is not None:
+            if self.sequence is None:
+                self.sequence = SequenceTracker()
+            self.sequence.observe(seq)
+        if device_ms is None:
+            return None
+        return self.clock.observe(device_ms, received)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "packets": self.packets,
+            "sequence": self.sequence.get_stats() if self.sequence is not None else None,
+            **self.clock.get_stats()
+        }
+
+class LinkMonitor:
+    """DeviceLink per user"""
+
+    def __init__(self):
+        self.links: Dict[Any, DeviceLink] = {}
+
+    def observe(self, user_id: Any, seq: Any, device_ms: Any, received: float) -> Optional[float]:
+        """Track a packet; returns its latency above the fastest path in seconds (None if unknown)"""
+        link = self.links.get(user_id)
+        if link is None:
+            link = self.links[user_id] = DeviceLink()
+        if not isinstance(seq, int) or isinstance(seq, bool):
+            seq = None
+        if not isinstance(device_ms, (int, float)) or isinstance(device_ms, bool):
+            device_ms = None
+        return link.observe(seq, device_ms, received)
+
+    def remove(self, user_id: Any):
+        self.links.pop(user_id, None)
+
+    def get_stats(self) -> Dict[Any, Dict[str, Any]]:
+        return {user_id: link.get_stats() for user_id, link in self.links.items()}
+
+    def get_worst(self) -> Dict[str, float]:
+        """Highest loss rate and p95 latency over all devices, for the metrics gauges"""
+        loss_rate = latency_p95 = 0.0
+        for link in self.links.values():
+            if link.sequence is not None:
+                loss_rate = max(loss_rate, link.sequence.get_stats()["loss_rate"])
+            if link.clock.latencies:
+                latency_p95 = max(latency_p95, _percentile(sorted(link.clock.latencies), 0.95) * 1000.0)
+        return {"link_loss_rate_max": loss_rate, "link_latency_p95_ms_max": round(latency_p95, 1)}
+
+def _percentile(ordered: list, fraction: float) -> float:
+    """Linearly interpolated percentile of a sorted, non-empty list"""
+    position = fraction * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
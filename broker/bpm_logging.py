@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Non-blocking, sampled logging for the BPM Broker
+
+Log records are handed to a background thread through a QueueHandler, so the
+event loop never waits on terminal or file I/O. Messages are only formatted
+on that thread, and only for records that are actually emitted.
+
+Per-user records (logged with extra={"user_id": ...}) are sampled: at most
+one line per user every `user_interval` seconds. The next line that gets
+through reports how many were suppressed in between. Errors are never
+sampled.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from typing import Any, Dict, Optional
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+class UserSampleFilter(logging.Filter):
+    """Let through at most one record per user every `interval` seconds"""
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self.next_allowed: Dict[Any, float] = {}
+        self.suppressed: Dict[Any, int] = {}
+        self.total_suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        user_id = getattr(record, "user_id", None)
+        if user_id is None or self.interval <= 0 or record.levelno >= logging.ERROR:
+            return True
+
+        now = time.monotonic()
+        if now < self.next_allowed.get(user_id, 0.0):
+            self.suppressed[user_id] = self.suppressed.get(user_id, 0) + 1
+            self.total_suppressed += 1
+            return False
+
+        self.next_allowed[user_id] = now + self.interval
+        record.suppressed = self.suppressed.pop(user_id, 0)
+        return True
+
+    def forget_user(self, user_id: Any):
+        """Drop an evicted user's sampling state"""
+        self.next_allowed.pop(user_id, None)
+        self.suppressed.pop(user_id, None)
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread
+
+    The stock QueueHandler formats every record in the calling thread; here
+    the record is queued as-is (with the exception info rendered to text,
+    since tracebacks cannot cross threads reliably).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class SampledFormatter(logging.Formatter):
+    """Appends the number of suppressed lines to sampled records"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message += f" (+{suppressed} similar lines suppressed)"
+        return message
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_sample_filter: Optional[UserSampleFilter] = None
+
+def setup_logging(level: int = logging.INFO, user_interval: float = 5.0,
+                  handler: Optional[logging.Handler] = None) -> UserSampleFilter:
+    """Install the queue-based handler on the root logger (once per process)
+
+    Like logging.basicConfig, this does nothing if the root logger already
+    has handlers, so applications embedding the broker keep their own setup.
+    """
+    global _listener, _sample_filter
+
+    if _sample_filter is not None:
+        return _sample_filter
+
+    _sample_filter = UserSampleFilter(user_interval)
+    root = logging.getLogger()
+    if root.handlers:
+        return _sample_filter
+
+    output = handler or logging.StreamHandler()
+    output.setFormatter(SampledFormatter(LOG_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(_sample_filter)
+
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    # Threads do not survive fork(); give forked children (e.g. ingest
+    # workers) their own listener so their records are still written
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_listener)
+
+    return _sample_filter
+
+def _restart_listener():
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers,
+                                                   respect_handler_level=True)
+        _listener.start()
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def forget_logged_user(user_id: Any):
+    """Drop an evicted user's sampling state (see UserSampleFilter)"""
+    if _sample_filter is not None:
+        _sample_filter.forget_user(user_id)
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Counters for the status response"""
+    if _sample_filter is None:
+        return {}
+    return {
+        "user_interval": _sample_filter.interval,
+        "suppressed_total": _sample_filter.total_suppressed,
+        "suppressed_pending": sum(_sample_filter.suppressed.values())
+    }
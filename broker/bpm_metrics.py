@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Pipeline metrics for the BPM Broker
+
+Each stage of the pipeline records its duration into a fixed-bucket
+histogram (one bisect and two additions per sample, no allocation), next to
+a handful of plain counters. The broker exposes them in the Prometheus text
+format on a local HTTP endpoint and through the `get_metrics` command.
+
+Stages:
+    receive     time a datagram waited in the ingest buffer
+    decode      binary packet decode / UTF-8 decode
+    parse       JSON parse and validation
+    finger      finger-state handling (excluding smoothing and statistics)
+    smoothing   SignalSmoother.add_sample
+    statistics  rolling window statistics
+    serialize   encoding a message for every codec in use and queueing it
+    send        one WebSocket write to one client
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in seconds (5us .. 1s); anything slower lands in +Inf
+LATENCY_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+
+STAGES = ("receive", "decode", "beats", "parse", "finger", "smoothing", "statistics", "serialize", "queue", "send")
+
+COUNTERS = {
+    "ingest_dropped": "Datagrams dropped because the ingest buffer was full",
+    "invalid_binary": "Binary packets that failed to decode",
+    "invalid_encoding": "Datagrams that were not valid UTF-8",
+    "invalid_json": "Datagrams that were not valid JSON",
+    "invalid_format": "JSON messages without the required fields",
+    "processing_errors": "Packets that raised while being processed",
+    "out_of_range_bpm": "Readings outside MIN_BPM..MAX_BPM rejected by the smoother",
+    "client_dropped": "Messages dropped or conflated away from client queues",
+    "client_disconnected_slow": "Clients disconnected for falling behind",
+    "users_evicted": "Users whose state was dropped for being idle or over the user cap"
+}
+
+PROMETHEUS_PREFIX = "bpm_broker"
+
+def escape_label(value: Any) -> str:
+    """A label value with backslashes, quotes and newlines escaped"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile (None if empty)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean and approximate percentiles in milliseconds"""
+        def ms(value):
+            return None if value is None else value * 1000
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p90_ms": ms(self.quantile(0.9)),
+            "p99_ms": ms(self.quantile(0.99))
+        }
+
+class BrokerMetrics:
+    """Stage histograms and counters for one broker"""
+
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.packets_by_user: Dict[Any, int] = {}
+
+    def observe(self, stage: str, seconds: float):
+        """Record the duration of one pipeline stage"""
+        self.stages[stage].observe(seconds)
+
+    def count(self, name: str, amount: int = 1):
+        """Increment a counter"""
+        self.counters[name] += amount
+
+    def count_packet(self, user_id: Any):
+        """Count a published packet for a user"""
+        packets = self.packets_by_user
+        packets[user_id] = packets.get(user_id, 0) + 1
+
+    def forget_user(self, user_id: Any):
+        """Drop the per-user series of an evicted user"""
+        self.packets_by_user.pop(user_id, None)
+
+    def snapshot(self, gauges: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Everything as plain data, for the get_metrics command"""
+        return {
+            "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()},
+            "counters": dict(self.counters),
+            "packets_by_user": dict(self.packets_by_user),
+            "gauges": gauges or {}
+        }
+
+    def render_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Everything in the Prometheus text exposition format"""
+        prefix = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each pipeline stage",
+            f"# TYPE {prefix}_stage_seconds histogram"
+        ]
+        for stage, histogram in self.stages.items():
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum!r}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines.append(f"# HELP {prefix}_packets_total Packets published per user")
+        lines.append(f"# TYPE {prefix}_packets_total counter")
+        for user_id, count in self.packets_by_user.items():
+            lines.append(f'{prefix}_packets_total{{user="{escape_label(user_id)}"}} {count}')
+
+        for name, help_text in COUNTERS.items():
+            lines.append(f"# HELP {prefix}_{name}_total {help_text}")
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {self.counters[name]}")
+
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics on the broker's event loop"""
+
+    def __init__(self, render: Callable[[], str], host: str, port: int):
+        self.render = render
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info(f"Metrics endpoint on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            # Skip headers
+            while (await asyncio.wait_for(reader.readline(), timeout=5.0)).strip():
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?")[0] if len(parts) > 1 else ""
+            if len(parts) > 1 and parts[0] == "GET" and path in ("/", "/metrics"):
+                status = "200 OK"
+                body = self.render().encode("utf-8")
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.warning(f"Error serving metrics request: {e}")
+        finally:
+            writer.close()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Compact binary UDP packet format for BPM data
+
+A fixed-layout alternative to the JSON messages sent by the ESP32 devices.
+Binary packets start with PACKET_MAGIC, which can never begin a JSON
+message, so the broker can accept both formats on the same port.
+
+Layout (little-endian, 20 bytes):
+
+    uint8   magic        0xEC
+    uint8   version      1
+    uint16  user         device/user id
+    int16   bpm_x10      BPM in tenths (0 or negative = no heart rate)
+    uint32  timestamp    device millis()
+    int8    rssi         WiFi signal strength (dBm)
+    uint8   flags        bit 0: finger detected
+    uint32  ir_value     raw IR reading
+    uint32  red_value    raw red reading
+
+Version 2 packets (22 bytes, BPMPacket in esp32/device_*/src/main.cpp)
+append a sequence number, used by the broker to account for lost,
+reordered and duplicated packets:
+
+    uint16  seq          per-device packet counter, wrapping at 65536
+
+Raw waveform packets (optional PPG streaming mode, USE_PPG_STREAMING in the
+firmware) carry a batch of raw IR samples instead of a BPM value and start
+with WAVEFORM_MAGIC. Layout (little-endian, 12-byte header + 4 bytes/sample) -
+must match WaveformPacket in esp32/device_*/src/main.cpp:
+
+    uint8   magic        0xED
+    uint8   version      1
+    uint16  user         device/user id
+    uint32  timestamp    device millis() of the first sample
+    uint16  sample_rate  samples per second
+    uint8   count        samples in this packet
+    int8    rssi         WiFi signal strength (dBm)
+    uint32  ir[count]    raw IR readings
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import struct
+import sys
+from array import array
+from typing import Dict, Any, Optional
+
+PACKET_MAGIC = 0xEC
+PACKET_VERSION = 1
+PACKET_STRUCT = struct.Struct("<BBHhIbBII")
+PACKET_SIZE = PACKET_STRUCT.size
+PACKET_VERSION_SEQ = 2
+PACKET_SEQ = struct.Struct("<H")
+PACKET_SEQ_SIZE = PACKET_SIZE + PACKET_SEQ.size
+
+FLAG_FINGER_DETECTED = 0x01
+
+WAVEFORM_MAGIC = 0xED
+WAVEFORM_VERSION = 1
+WAVEFORM_HEADER = struct.Struct("<BBHIHBb")
+WAVEFORM_HEADER_SIZE = WAVEFORM_HEADER.size
+
+def is_binary_packet(data: bytes) -> bool:
+    """Check whether a datagram uses the binary format"""
+    return len(data) > 0 and data[0] == PACKET_MAGIC
+
+def decode_packet(data: bytes) -> Dict[str, Any]:
+    """Decode a binary packet into the same fields a JSON message carries"""
+    if len(data) < PACKET_SIZE:
+        raise ValueError(f"Binary packet too short: {len(data)} bytes (expected {PACKET_SIZE})")
+
+    (magic, version, user, bpm_x10, timestamp, rssi,
+     flags, ir_value, red_value) = PACKET_STRUCT.unpack_from(data)
+
+    if magic != PACKET_MAGIC:
+        raise ValueError(f"Bad packet magic: 0x{magic:02X}")
+    if version not in (PACKET_VERSION, PACKET_VERSION_SEQ):
+        raise ValueError(f"Unsupported packet version: {version}")
+
+    packet = {
+        "user": user,
+        "bpm": bpm_x10 / 10.0,
+        "timestamp": timestamp,
+        "signal_strength": rssi,
+        "ir_value": ir_value,
+        "red_value": red_value,
+        "finger_detected": bool(flags & FLAG_FINGER_DETECTED)
+    }
+    if version == PACKET_VERSION_SEQ:
+        if len(data) < PACKET_SEQ_SIZE:
+            raise ValueError(f"Binary packet too short: {len(data)} bytes (expected {PACKET_SEQ_SIZE})")
+        packet["seq"] = PACKET_SEQ.unpack_from(data, PACKET_SIZE)[0]
+    return packet
+
+def encode_packet(user: int, bpm: float, timestamp: int, signal_strength: int = 0,
+                  ir_value: int = 0, red_value: int = 0,
+                  finger_detected: bool = True, seq: Optional[int] = None) -> bytes:
+    """Encode BPM data as a binary packet (used by simulators and tests)
+
+    With a sequence number the packet is version 2, otherwise version 1.
+    """
+    flags = FLAG_FINGER_DETECTED if finger_detected else 0
+    packet = PACKET_STRUCT.pack(
+        PACKET_MAGIC,
+        PACKET_VERSION if seq is None else PACKET_VERSION_SEQ,
+        user,
+        int(round(bpm * 10)),
+        int(timestamp) & 0xFFFFFFFF,
+        max(-128, min(127, int(signal_strength))),
+        flags,
+        ir_value,
+        red_value
+    )
+    if seq is not None:
+        packet += PACKET_SEQ.pack(seq & 0xFFFF)
+    return packet
+
+def is_waveform_packet(data: bytes) -> bool:
+    """Check whether a datagram is a raw waveform batch"""
+    return len(data) > 0 and data[0] == WAVEFORM_MAGIC
+
+def decode_waveform(data: bytes) -> Dict[str, Any]:
+    """Decode a waveform packet; samples are returned as an array('I') of uint32"""
+    if len(data) < WAVEFORM_HEADER_SIZE:
+        raise ValueError(f"Waveform packet too short: {len(data)} bytes")
+
+    magic, version, user, timestamp, sample_rate, count, rssi = WAVEFORM_HEADER.unpack_from(data)
+    if magic != WAVEFORM_MAGIC:
+        raise ValueError(f"Bad waveform magic: 0x{magic:02X}")
+    if version != WAVEFORM_VERSION:
+        raise ValueError(f"Unsupported waveform version: {version}")
+    if sample_rate == 0:
+        raise ValueError("Waveform sample rate is 0")
+    expected = WAVEFORM_HEADER_SIZE + 4 * count
+    if len(data) < expected:
+        raise ValueError(f"Waveform packet too short: {len(data)} bytes (expected {expected})")
+
+    return {
+        "user": user,
+        "timestamp": timestamp,
+        "sample_rate": sample_rate,
+        "signal_strength": rssi,
+        "samples": _uint32_array(data[WAVEFORM_HEADER_SIZE:expected])
+    }
+
+def encode_waveform(user: int, timestamp: int, sample_rate: int, samples, signal_strength: int = 0) -> bytes:
+    """Encode raw IR samples as a waveform packet (used by simulators and tests)"""
+    if len(samples) > 255:
+        raise ValueError("At most 255 samples per waveform packet")
+    header = WAVEFORM_HEADER.pack(
+        WAVEFORM_MAGIC,
+        WAVEFORM_VERSION,
+        user,
+        int(timestamp) & 0xFFFFFFFF,
+        sample_rate,
+        len(samples),
+        max(-128, min(127, int(signal_strength)))
+    )
+    return header + struct.pack(f"<{len(samples)}I", *samples)
+
+def _uint32_array(data: bytes) -> array:
+    samples = array('I')
+    samples.frombytes(data)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
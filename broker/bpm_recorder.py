@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Session Recorder - memory-mapped per-user time series
+
+Records every sample the broker publishes as a fixed-width binary record in
+memory-mapped segment files, one series per user:
+
+    <recording dir>/session_YYYYmmdd_HHMMSS/
+        index.json
+        user_1/seg_000001.bin
+        user_1/seg_000002.bin
+        user_2/seg_000001.bin
+
+Segments roll over when they are full or older than the configured duration.
+All file work happens on a background writer thread; the event loop only
+appends a tuple to a queue. SessionReader scans a session segment by segment
+through mmap, so sessions never have to fit in RAM.
+
+Usage (summary of a recorded session):
+    python bpm_recorder.py recordings/session_20240101_120000
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# server_timestamp, device_timestamp, raw_bpm, smoothed_bpm, ir_value, red_value, rssi, flags
+RECORD_STRUCT = struct.Struct("<ddffIIhBx")
+RECORD_SIZE = RECORD_STRUCT.size
+RECORD_FIELDS = ("server_timestamp", "device_timestamp", "raw_bpm", "smoothed_bpm",
+                 "ir_value", "red_value", "rssi", "flags")
+Record = namedtuple("Record", RECORD_FIELDS)
+
+FLAG_FINGER_DETECTED = 0x01
+FLAG_SMOOTHED = 0x02
+FLAG_NO_HEART_RATE = 0x04
+
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+
+DEFAULT_SEGMENT_RECORDS = 65536  # ~2.3 MB per segment
+DEFAULT_SEGMENT_SECONDS = 600.0
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+def _number(value, default=math.nan) -> float:
+    """Coerce a packet field to float (NaN for "--" and missing values)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return default
+    return float(value)
+
+def _uint32(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return max(0, min(0xFFFFFFFF, int(value)))
+
+def _user_dir(user_id: Any) -> str:
+    """Directory name for a user id, safe for any id a packet may carry"""
+    return "user_" + re.sub(r"[^A-Za-z0-9_-]", "_", str(user_id))
+
+def record_from_packet(data: Dict[str, Any]) -> tuple:
+    """Convert a processed broker packet into a record tuple"""
+    smoothed = _number(data.get('bpm'))
+    raw = _number(data.get('bpm_raw', data.get('bpm')))
+
+    flags = 0
+    if data.get('finger_detected', True):
+        flags |= FLAG_FINGER_DETECTED
+    if data.get('bpm_smoothed'):
+        flags |= FLAG_SMOOTHED
+    if data.get('no_heart_rate'):
+        flags |= FLAG_NO_HEART_RATE
+
+    rssi = data.get('signal_strength', 0)
+    rssi = int(rssi) if isinstance(rssi, (int, float)) and not isinstance(rssi, bool) else 0
+
+    return (
+        _number(data.get('server_timestamp'), time.time()),
+        _number(data.get('timestamp'), 0.0),
+        raw,
+        smoothed,
+        _uint32(data.get('ir_value')),
+        _uint32(data.get('red_value')),
+        max(-32768, min(32767, rssi)),
+        flags
+    )
+
+class _Segment:
+    """One preallocated, memory-mapped segment file"""
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self.count = 0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.created = time.monotonic()
+
+        self.file = open(path, "w+b")
+        self.file.truncate(capacity * RECORD_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), capacity * RECORD_SIZE)
+
+    def append(self, record: tuple):
+        RECORD_STRUCT.pack_into(self.map, self.count * RECORD_SIZE, *record)
+        self.count += 1
+        if self.first is None:
+            self.first = record[0]
+        self.last = record[0]
+
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        """Unmap and shrink the file to the records actually written"""
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(self.count * RECORD_SIZE)
+        self.file.close()
+
+    def describe(self, session_dir: str) -> Dict[str, Any]:
+        return {
+            "file": os.path.relpath(self.path, session_dir),
+            "count": self.count,
+            "first": self.first,
+            "last": self.last
+        }
+
+class SessionRecorder:
+    """Append-only recorder writing per-user series on a background thread"""
+
+    def __init__(self, base_dir: str, session_name: Optional[str] = None,
+                 segment_records: int = DEFAULT_SEGMENT_RECORDS,
+                 segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.session_name = session_name or datetime.now().strftime("session_%Y%m%d_%H%M%S")
+        self.session_dir = os.path.join(base_dir, self.session_name)
+        self.segment_records = segment_records
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+        self.started_at = time.time()
+
+        # Writer thread state
+        self.active: Dict[Any, _Segment] = {}
+        self.closed_segments: Dict[Any, List[Dict[str, Any]]] = {}
+        self.segment_numbers: Dict[Any, int] = {}
+
+        # Counters
+        self.recorded = 0
+        self.errors = 0
+
+    def start(self):
+        """Create the session directory and start the writer thread"""
+        os.makedirs(self.session_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="bpm-recorder", daemon=True)
+        self.thread.start()
+        logger.info(f"Recording session to {self.session_dir}")
+
+    def record(self, data: Dict[str, Any]):
+        """Queue a processed packet for recording (never blocks)"""
+        self.queue.put((data['user'], record_from_packet(data)))
+
+    def stop(self):
+        """Flush everything and close all segments"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        last_flush = time.monotonic()
+
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+
+            # Drain whatever else is waiting before doing housekeeping
+            stopping = False
+            while item is not None:
+                if item:
+                    try:
+                        self._write(*item)
+                    except Exception as e:
+                        self.errors += 1
+                        logger.error(f"Recorder write failed: {e}")
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if item is None:
+                stopping = True
+
+            now = time.monotonic()
+            if stopping or now - last_flush >= self.flush_interval:
+                self._housekeeping(now)
+                last_flush = now
+
+            if stopping:
+                self._close_all()
+                return
+
+    def _write(self, user_id: Any, record: tuple):
+        segment = self.active.get(user_id)
+        if segment is None or segment.full():
+            if segment is not None:
+                self._close_segment(user_id)
+                self._write_index()
+            segment = self._open_segment(user_id)
+        segment.append(record)
+        self.recorded += 1
+
+    def _open_segment(self, user_id: Any) -> _Segment:
+        number = self.segment_numbers.get(user_id, 0) + 1
+        self.segment_numbers[user_id] = number
+
+        user_dir = os.path.join(self.session_dir, _user_dir(user_id))
+        os.makedirs(user_dir, exist_ok=True)
+        segment = _Segment(os.path.join(user_dir, f"seg_{number:06d}.bin"), self.segment_records)
+        self.active[user_id] = segment
+        return segment
+
+    def _close_segment(self, user_id: Any):
+        segment = self.active.pop(user_id)
+        segment.close()
+        self.closed_segments.setdefault(user_id, []).append(segment.describe(self.session_dir))
+
+    def _housekeeping(self, now: float):
+        """Periodic flush, time-based rollover and index update"""
+        for user_id, segment in list(self.active.items()):
+            if now - segment.created >= self.segment_seconds:
+                # The next sample for this user opens a fresh segment
+                self._close_segment(user_id)
+            else:
+                segment.flush()
+        self._write_index()
+
+    def _close_all(self):
+        for user_id in list(self.active):
+            self._close_segment(user_id)
+        self._write_index()
+        logger.info(f"Recording closed: {self.recorded} samples in {self.session_dir}")
+
+    def _write_index(self):
+        """Atomically rewrite the session index"""
+        users = {}
+        for user_id in set(self.closed_segments) | set(self.active):
+            segments = list(self.closed_segments.get(user_id, []))
+            if user_id in self.active:
+                segments.append(self.active[user_id].describe(self.session_dir))
+            users[str(user_id)] = {"user": user_id, "segments": segments}
+
+        index = {
+            "version": INDEX_VERSION,
+            "record_format": RECORD_STRUCT.format,
+            "fields": list(RECORD_FIELDS),
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "users": users
+        }
+
+        path = os.path.join(self.session_dir, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "session_dir": self.session_dir,
+            "recorded": self.recorded,
+            "pending": self.queue.qsize(),
+            "errors": self.errors
+        }
+
+class SessionReader:
+    """Scan a recorded session without loading it into memory"""
+
+    def __init__(self, session_dir: str):
+        self.session_dir = session_dir
+        with open(os.path.join(session_dir, INDEX_FILE)) as f:
+            self.index = json.load(f)
+
+        if self.index.get("record_format") != RECORD_STRUCT.format:
+            raise ValueError(f"Unsupported record format: {self.index.get('record_format')}")
+
+    def users(self) -> list:
+        """User ids recorded in this session"""
+        return [entry["user"] for entry in self.index["users"].values()]
+
+    def segments(self, user_id: Any) -> List[Dict[str, Any]]:
+        entry = self.index["users"].get(str(user_id))
+        return entry["segments"] if entry else []
+
+    def iter_records(self, user_id: Any, start: Optional[float] = None,
+                     end: Optional[float] = None) -> Iterator[Record]:
+        """Yield a user's records in order, optionally within [start, end]"""
+        for segment in self.segments(user_id):
+            if start is not None and segment["last"] is not None and segment["last"] < start:
+                continue
+            if end is not None and segment["first"] is not None and segment["first"] > end:
+                break
+
+            path = os.path.join(self.session_dir, segment["file"])
+            size = os.path.getsize(path)
+            if size < RECORD_SIZE:
+                continue
+
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, size - size % RECORD_SIZE, RECORD_SIZE):
+                    record = RECORD_STRUCT.unpack_from(mapped, offset)
+                    # Zero timestamp = unwritten tail of a segment still being recorded
+                    if record[0] == 0.0:
+                        break
+                    if start is not None and record[0] < start:
+                        continue
+                    if end is not None and record[0] > end:
+                        return
+                    yield Record(*record)
+
+    def iter_session(self, start: Optional[float] = None,
+                     end: Optional[float] = None) -> Iterator[tuple]:
+        """Yield (user_id, record) for all users merged in server-time order"""
+        def keyed(n, user_id):
+            for record in self.iter_records(user_id, start, end):
+                yield record.server_timestamp, n, user_id, record
+
+        streams = [keyed(n, user_id) for n, user_id in enumerate(self.users())]
+        for _, _, user_id, record in heapq.merge(*streams):
+            yield user_id, record
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a recorded BPM session")
+    parser.add_argument("session_dir", help="Session directory (contains index.json)")
+    parser.add_argument("--user", help="Print every record for one user")
+    args = parser.parse_args()
+
+    reader = SessionReader(args.session_dir)
+
+    if args.user is not None:
+        for record in reader.iter_records(args.user):
+            print(record)
+        return
+
+    print(f"Session: {args.session_dir}")
+    for user_id in reader.users():
+        count = 0
+        first = last = None
+        bpm_sum = 0.0
+        bpm_count = 0
+        for record in reader.iter_records(user_id):
+            count += 1
+            first = record.server_timestamp if first is None else first
+            last = record.server_timestamp
+            if not math.isnan(record.smoothed_bpm):
+                bpm_sum += record.smoothed_bpm
+                bpm_count += 1
+        duration = (last - first) if count else 0.0
+        mean = bpm_sum / bpm_count if bpm_count else float("nan")
+        print(f"User {user_id}: {count} samples over {duration:.1f}s, "
+              f"{len(reader.segments(user_id))} segments, mean {mean:.1f} BPM")
+
+if __name__ == "__main__":
+    main()
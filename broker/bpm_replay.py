@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Session Replay - drive the BPM broker from recorded data
+
+Replays a recorded session (a directory written by bpm_recorder.py) or an
+NDJSON capture of incoming datagrams with the original timing, scaled by a
+speed factor, or as fast as possible.
+
+NDJSON capture format, one datagram per line:
+    {"t": 1700000000.123, "addr": ["192.168.1.101", 4210], "data": "{\"user\": 1, ...}"}
+"data" may also be a JSON object, or "b64" may hold a base64 binary packet.
+
+Usage:
+    # Re-send a session to a running broker over UDP at 100x real time
+    python bpm_replay.py replay recordings/session_20240101_120000 --speed 100
+
+    # Inject straight into an in-process BPMBroker as fast as possible
+    python bpm_replay.py replay capture.ndjson --inject --fast
+
+    # Capture datagrams to NDJSON while forwarding them to the broker
+    python bpm_replay.py capture capture.ndjson --listen-port 8889 --forward localhost:8888
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import math
+import os
+import socket
+import time
+from typing import Iterator, Optional, Tuple
+
+from bpm_recorder import SessionReader, FLAG_FINGER_DETECTED
+
+DEFAULT_BROKER_HOST = "localhost"
+DEFAULT_BROKER_PORT = 8888
+DEFAULT_ADDR = ("127.0.0.1", 0)
+INJECT_BATCH_SIZE = 512
+
+# (original arrival time, raw datagram, source address)
+ReplayEvent = Tuple[float, bytes, tuple]
+
+def load_ndjson(path: str) -> Iterator[ReplayEvent]:
+    """Read datagrams from an NDJSON capture"""
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                if "b64" in entry:
+                    payload = base64.b64decode(entry["b64"])
+                elif isinstance(entry["data"], str):
+                    payload = entry["data"].encode("utf-8")
+                else:
+                    payload = json.dumps(entry["data"]).encode("utf-8")
+                addr = tuple(entry.get("addr") or DEFAULT_ADDR)
+                yield float(entry["t"]), payload, addr
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping line {line_number}: {e}")
+
+def load_session(session_dir: str) -> Iterator[ReplayEvent]:
+    """Rebuild the device packets of a recorded session"""
+    reader = SessionReader(session_dir)
+    for user_id, record in reader.iter_session():
+        raw_bpm = 0 if math.isnan(record.raw_bpm) else record.raw_bpm
+        device_timestamp = record.device_timestamp
+        if device_timestamp.is_integer():
+            device_timestamp = int(device_timestamp)
+
+        packet = {
+            "user": user_id,
+            "bpm": raw_bpm,
+            "timestamp": device_timestamp,
+            "signal_strength": record.rssi,
+            "ir_value": record.ir_value,
+            "red_value": record.red_value,
+            "finger_detected": bool(record.flags & FLAG_FINGER_DETECTED)
+        }
+        yield record.server_timestamp, json.dumps(packet).encode("utf-8"), DEFAULT_ADDR
+
+def open_source(path: str) -> Iterator[ReplayEvent]:
+    """Open a recorded session directory or an NDJSON capture file"""
+    if os.path.isdir(path):
+        return load_session(path)
+    return load_ndjson(path)
+
+class ReplayClock:
+    """Maps original timestamps onto wall-clock time scaled by a speed factor"""
+
+    def __init__(self, speed: float):
+        self.speed = speed
+        self.origin: Optional[float] = None
+        self.start = 0.0
+
+    def delay(self, t: float) -> float:
+        """Seconds to wait before an event recorded at time t is due"""
+        if self.speed <= 0:
+            return 0.0
+        if self.origin is None:
+            self.origin = t
+            self.start = time.perf_counter()
+            return 0.0
+        due = self.start + (t - self.origin) / self.speed
+        return due - time.perf_counter()
+
+def replay_udp(events: Iterator[ReplayEvent], host: str, port: int, speed: float) -> int:
+    """Re-send datagrams to a broker over UDP; returns the number sent"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    clock = ReplayClock(speed)
+    sent = 0
+
+    try:
+        for t, payload, _ in events:
+            wait = clock.delay(t)
+            if wait > 0:
+                time.sleep(wait)
+            sock.sendto(payload, (host, port))
+            sent += 1
+            if sent % 1000 == 0:
+                print(f"Sent {sent} datagrams")
+    finally:
+        sock.close()
+
+    return sent
+
+async def replay_inject(events: Iterator[ReplayEvent], speed: float, broker=None) -> dict:
+    """Feed datagrams straight into an in-process BPMBroker (no sockets)
+
+    Datagrams that are due at the same time are processed as one batch,
+    like the broker's own ingest consumer does.
+    """
+    if broker is None:
+        from bpm_broker import BPMBroker
+        broker = BPMBroker()
+
+    clock = ReplayClock(speed)
+    batch = []
+    injected = 0
+    slowest_batch = 0.0
+    started = time.perf_counter()
+
+    async def flush():
+        nonlocal batch, injected, slowest_batch
+        if not batch:
+            return
+        batch_start = time.perf_counter()
+        await broker.process_udp_batch(batch)
+        slowest_batch = max(slowest_batch, time.perf_counter() - batch_start)
+        injected += len(batch)
+        batch = []
+
+    for t, payload, addr in events:
+        wait = clock.delay(t)
+        if wait > 0:
+            await flush()
+            await asyncio.sleep(wait)
+        batch.append((payload, addr))
+        if len(batch) >= INJECT_BATCH_SIZE:
+            await flush()
+    await flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "injected": injected,
+        "elapsed_s": elapsed,
+        "rate_per_s": injected / elapsed if elapsed > 0 else 0.0,
+        "slowest_batch_ms": slowest_batch * 1000,
+        "users": len(broker.latest_data)
+    }
+
+def capture(output: str, listen_host: str, listen_port: int, forward: Optional[tuple] = None):
+    """Write incoming datagrams to an NDJSON capture, optionally forwarding them"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((listen_host, listen_port))
+    captured = 0
+
+    print(f"Capturing UDP {listen_host}:{listen_port} to {output}"
+          + (f" (forwarding to {forward[0]}:{forward[1]})" if forward else ""))
+
+    try:
+        with open(output, "a") as f:
+            while True:
+                payload, addr = sock.recvfrom(65535)
+                if forward:
+                    sock.sendto(payload, forward)
+
+                entry = {"t": time.time(), "addr": list(addr)}
+                try:
+                    entry["data"] = payload.decode("utf-8")
+                except UnicodeDecodeError:
+                    entry["b64"] = base64.b64encode(payload).decode("ascii")
+                f.write(json.dumps(entry) + "\n")
+
+                captured += 1
+                if captured % 100 == 0:
+                    f.flush()
+                    print(f"Captured {captured} datagrams")
+    except KeyboardInterrupt:
+        print(f"\nCaptured {captured} datagrams")
+    finally:
+        sock.close()
+
+def parse_host_port(value: str) -> tuple:
+    host, _, port = value.rpartition(":")
+    return host or DEFAULT_BROKER_HOST, int(port)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded BPM sessions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a session or NDJSON capture")
+    replay_parser.add_argument("source", help="Session directory or NDJSON capture file")
+    replay_parser.add_argument("--speed", type=float, default=1.0,
+                               help="Speed factor relative to real time (default: 1.0)")
+    replay_parser.add_argument("--fast", action="store_true",
+                               help="Ignore original timing and replay as fast as possible")
+    replay_parser.add_argument("--inject", action="store_true",
+                               help="Inject into an in-process broker instead of sending UDP")
+    replay_parser.add_argument("--host", default=DEFAULT_BROKER_HOST,
+                               help=f"Broker hostname (default: {DEFAULT_BROKER_HOST})")
+    replay_parser.add_argument("--port", type=int, default=DEFAULT_BROKER_PORT,
+                               help=f"Broker UDP port (default: {DEFAULT_BROKER_PORT})")
+    replay_parser.add_argument("--verbose", action="store_true",
+                               help="Keep the broker's per-packet logging when injecting")
+
+    capture_parser = subparsers.add_parser("capture", help="Capture incoming datagrams to NDJSON")
+    capture_parser.add_argument("output", help="NDJSON file to append to")
+    capture_parser.add_argument("--listen-host", default="0.0.0.0")
+    capture_parser.add_argument("--listen-port", type=int, default=DEFAULT_BROKER_PORT)
+    capture_parser.add_argument("--forward", type=parse_host_port,
+                                help="Forward datagrams to host:port (e.g. the broker)")
+
+    args = parser.parse_args()
+
+    if args.command == "capture":
+        capture(args.output, args.listen_host, args.listen_port, args.forward)
+        return
+
+    speed = 0.0 if args.fast else args.speed
+    events = open_source(args.source)
+    print(f"Replaying {args.source} at {'max speed' if speed <= 0 else f'{speed}x'}"
+          f" {'into in-process broker' if args.inject else f'to {args.host}:{args.port}'}")
+
+    if args.inject:
+        if not args.verbose:
+            logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+        stats = asyncio.run(replay_inject(events, speed))
+        print(json.dumps(stats, indent=2))
+    else:
+        started = time.perf_counter()
+        sent = replay_udp(events, args.host, args.port, speed)
+        print(f"Sent {sent} datagrams in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
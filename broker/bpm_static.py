@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Dashboard file serving on the broker's WebSocket port
+
+With SERVE_DASHBOARD enabled, the broker answers plain HTTP requests on its
+WebSocket port with the web_dashboard/ files; only requests asking for a
+WebSocket upgrade go on to the handshake. A show then needs one process to
+start and one port to open.
+
+Files come from the same in-memory cache web_dashboard/server.py uses
+(precompressed variants, ETags, reload on modification), loaded straight
+from that directory so both servers always behave the same. Responses are
+built in websockets' process_request hook, in a worker thread so reading and
+compressing a new or changed file never stalls the broker's event loop.
+Every response carries an X-BPM-WebSocket header, which tells the dashboard
+to connect back to the host and port it was loaded from.
+
+Requires websockets 14 or newer (the asyncio server implementation).
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import asyncio
+import email.utils
+import http
+import importlib.util
+import json
+import logging
+import os
+from urllib.parse import urlparse
+
+import websockets
+from websockets.datastructures import Headers
+from websockets.http11 import Response
+
+logger = logging.getLogger(__name__)
+
+def supports_dashboard() -> bool:
+    """Whether the installed websockets has the process_request API used here"""
+    try:
+        return int(websockets.__version__.split('.')[0]) >= 14
+    except ValueError:
+        return False
+
+def load_dashboard_server(directory: str):
+    """Import web_dashboard/server.py as a module (it isn't on sys.path)"""
+    spec = importlib.util.spec_from_file_location("bpm_dashboard_server", os.path.join(directory, "server.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class DashboardAssets:
+    """Answers plain HTTP requests on the WebSocket port from the asset cache"""
+
+    def __init__(self, directory: str):
+        server = load_dashboard_server(directory)
+        self.assets = server.AssetCache(directory)
+        self.default_user_names = server.DEFAULT_USER_NAMES
+        self.directory = directory
+
+        # Counters
+        self.requests = 0
+        self.not_modified = 0
+        self.not_found = 0
+
+    async def process_request(self, connection, request) -> "Response | None":
+        """websockets process_request hook: serve files, let upgrades through"""
+        if "websocket" in request.headers.get("Upgrade", "").lower():
+            return None
+        return await asyncio.to_thread(self.respond, request.path, request.headers)
+
+    def respond(self, request_path: str, request_headers) -> Response:
+        """The HTTP response for a GET of a dashboard file"""
+        self.requests += 1
+        path = urlparse(request_path).path
+        resolved = self.assets.resolve(path)
+        cached = self.assets.get(resolved) if resolved else None
+
+        if cached is None:
+            if path == '/user_names.json':
+                # Same fallback as web_dashboard/server.py
+                body = json.dumps(self.default_user_names).encode()
+                return self._response(200, body, [("Content-Type", "application/json"),
+                                                  ("Cache-Control", "no-cache, no-store, must-revalidate")])
+            self.not_found += 1
+            return self._response(404, b"File not found\n", [("Content-Type", "text/plain; charset=utf-8")])
+
+        # Negotiate first: each encoding has its own ETag
+        encoding, body = cached.choose(request_headers.get("Accept-Encoding", ""))
+        vary = [("Vary", "Accept-Encoding")] if len(cached.variants) > 1 else []
+        if cached.matches(encoding, request_headers.get("If-None-Match", "")):
+            self.not_modified += 1
+            return self._response(304, b"", [("ETag", cached.etags[encoding]), ("Cache-Control", "no-cache")] + vary)
+
+        headers = [
+            ("Content-Type", cached.content_type),
+            ("ETag", cached.etags[encoding]),
+            ("Cache-Control", "no-cache")  # Always revalidate; unchanged files cost a 304
+        ] + vary
+        if encoding != "identity":
+            headers.append(("Content-Encoding", encoding))
+        return self._response(200, body, headers)
+
+    @staticmethod
+    def _response(status_code: int, body: bytes, extra_headers: list) -> Response:
+        status = http.HTTPStatus(status_code)
+        headers = Headers([
+            ("Date", email.utils.formatdate(usegmt=True)),
+            ("Connection", "close"),
+            ("Content-Length", str(len(body))),
+            ("Access-Control-Allow-Origin", "*"),
+            ("X-BPM-WebSocket", "same-origin")  # See connectWebSocket() in dashboard.js
+        ])
+        for name, value in extra_headers:
+            headers[name] = value
+        return Response(status.value, status.phrase, headers, body)
+
+    def get_stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "not_found": self.not_found
+        }
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Pairwise heart rate synchrony for every pair of active users
+
+Once per tick the broker samples each user's latest smoothed BPM into a
+row of a ring buffer (NaN when the user has no current reading). For every
+pair of users the engine keeps, over the last `window` ticks:
+
+    difference   |BPM_a - BPM_b| on the latest tick
+    correlation  Pearson cross-correlation at the lag (in ticks, within
+                 ±max_lag) where it is strongest; a positive lag means the
+                 second user of the pair leads the first
+    in_sync      fraction of ticks with both users present and
+                 |BPM_a - BPM_b| <= threshold
+
+Correlation sums are kept per lag as N×N matrices (counts, sums, sums of
+squares and cross products, masked so that each pair only uses ticks where
+both users had a reading). Each tick adds the outer products of the new row
+and removes those of the row leaving the window, so an update costs
+O(max_lag · N²) array operations regardless of the window length. The sums
+are recomputed from the ring once per window to stop float drift.
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+INITIAL_CAPACITY = 8  # User slots allocated up front; doubled when full
+MIN_SAMPLES = 5  # Overlapping ticks needed before a correlation is reported
+
+# Order of the per-lag sum matrices
+COUNT, SUM_A, SUM_B, SUM_AA, SUM_BB, SUM_AB = range(6)
+
+class SynchronyEngine:
+    """Windowed N×N synchrony metrics updated one tick at a time"""
+
+    def __init__(self, window: int = 60, max_lag: int = 5, threshold: float = 4.0,
+                 min_samples: int = MIN_SAMPLES, capacity: int = INITIAL_CAPACITY):
+        if not 0 <= max_lag < window:
+            raise ValueError("max_lag must be smaller than the window")
+        self.window = window
+        self.max_lag = max_lag
+        self.threshold = threshold
+        self.min_samples = min_samples
+
+        self.slots: Dict[Any, int] = {}  # user id -> slot
+        self.user_ids: List[Any] = []  # slot -> user id (None = free)
+        self.ticks = 0
+        self.min_capacity = capacity
+        self.capacity = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        """Grow the ring and sum matrices to `capacity` user slots"""
+        ring = np.full((self.window + 1, capacity), np.nan)  # One extra row: the one leaving the window
+        sums = np.zeros((self.max_lag + 1, 6, capacity, capacity))
+        in_sync = np.zeros((capacity, capacity))
+        if self.capacity:
+            old = self.capacity
+            ring[:, :old] = self.ring
+            sums[:, :, :old, :old] = self.sums
+            in_sync[:old, :old] = self.in_sync
+        self.ring = ring
+        self.sums = sums
+        self.in_sync = in_sync
+        self.capacity = capacity
+
+    def slot_for(self, user_id: Any) -> int:
+        """Get the slot of a user, assigning a free one if needed"""
+        slot = self.slots.get(user_id)
+        if slot is None:
+            if None in self.user_ids:
+                slot = self.user_ids.index(None)
+                self.user_ids[slot] = user_id
+            else:
+                slot = len(self.user_ids)
+                if slot >= self.capacity:
+                    self._allocate(self.capacity * 2)
+                self.user_ids.append(user_id)
+            self.slots[user_id] = slot
+        return slot
+
+    def remove_user(self, user_id: Any):
+        """Forget a user and free their slot"""
+        self.remove_users([user_id])
+
+    def remove_users(self, user_ids: List[Any]):
+        """Forget several users at once (one recomputation for all of them)"""
+        removed = False
+        for user_id in user_ids:
+            slot = self.slots.pop(user_id, None)
+            if slot is not None:
+                self.user_ids[slot] = None
+                self.ring[:, slot] = np.nan
+                removed = True
+        if removed:
+            active = len(self.slots)
+            if self.capacity > self.min_capacity and active <= self.capacity // 4:
+                self._compact()
+            self._resync()
+
+    def _compact(self):
+        """Move the remaining users to the first slots and shrink the matrices
+
+        The sum matrices grow with the square of the capacity, so a crowd
+        that has left would otherwise keep them at their peak size. Sums are
+        left for the caller to recompute from the ring.
+        """
+        kept = [slot for slot, user_id in enumerate(self.user_ids) if user_id is not None]
+        capacity = self.min_capacity
+        while capacity < 2 * len(kept):
+            capacity *= 2
+
+        ring = np.full((self.window + 1, capacity), np.nan)
+        ring[:, :len(kept)] = self.ring[:, kept]
+        self.user_ids = [self.user_ids[slot] for slot in kept]
+        self.slots = {user_id: slot for slot, user_id in enumerate(self.user_ids)}
+        self.ring = ring
+        self.sums = np.zeros((self.max_lag + 1, 6, capacity, capacity))
+        self.in_sync = np.zeros((capacity, capacity))
+        self.capacity = capacity
+
+    def _row(self, tick: int) -> np.ndarray:
+        return self.ring[tick % (self.window + 1)]
+
+    @staticmethod
+    def _terms(row: np.ndarray):
+        """(mask, values, squares) with missing readings zeroed"""
+        mask = ~np.isnan(row)
+        values = np.where(mask, row, 0.0)
+        return mask.astype(np.float64), values, values * values
+
+    def _pair_sums(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """The six sum matrices contributed by one (row a, lagged row b) pair"""
+        mask_a, values_a, squares_a = self._terms(a)
+        mask_b, values_b, squares_b = self._terms(b)
+        left = np.stack((mask_a, values_a, mask_a, squares_a, mask_a, values_a))
+        right = np.stack((mask_b, mask_b, values_b, mask_b, squares_b, values_b))
+        return left[:, :, None] * right[:, None, :]
+
+    def _sync_matrix(self, row: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore"):
+            return (np.abs(row[:, None] - row[None, :]) <= self.threshold).astype(np.float64)
+
+    def add(self, readings: Dict[Any, float]):
+        """Add one tick: the current BPM of every user that has one"""
+        for user_id in readings:
+            self.slot_for(user_id)
+
+        row = np.full(self.capacity, np.nan)
+        for user_id, bpm in readings.items():
+            row[self.slots[user_id]] = bpm
+
+        tick = self.ticks
+        window = self.window
+        leaving = tick - window  # Tick that drops out of the window
+        if leaving >= 0:
+            old_row = self._row(leaving).copy()
+        self._row(tick)[:] = row
+
+        for lag in range(self.max_lag + 1):
+            if tick - lag >= 0:
+                self.sums[lag] += self._pair_sums(row, self._row(tick - lag))
+            if leaving >= 0:
+                # The pair (leaving + lag, leaving) was the oldest one at this lag
+                partner = old_row if lag == 0 else self._row(leaving + lag)
+                self.sums[lag] -= self._pair_sums(partner, old_row)
+
+        self.in_sync += self._sync_matrix(row)
+        if leaving >= 0:
+            self.in_sync -= self._sync_matrix(old_row)
+
+        self.ticks += 1
+        if self.ticks % window == 0:
+            self._resync()
+
+    def _window_rows(self) -> np.ndarray:
+        """Rows of the current window, oldest first"""
+        count = min(self.ticks, self.window)
+        return np.array([self._row(tick) for tick in range(self.ticks - count, self.ticks)])
+
+    def _resync(self):
+        """Recompute every sum exactly from the ring"""
+        rows = self._window_rows()
+        self.sums[:] = 0.0
+        self.in_sync[:] = 0.0
+        if not len(rows):
+            return
+        mask = ~np.isnan(rows)
+        values = np.where(mask, rows, 0.0)
+        mask = mask.astype(np.float64)
+        squares = values * values
+        for lag in range(min(self.max_lag + 1, len(rows))):
+            a = slice(lag, None)
+            b = slice(None, len(rows) - lag)
+            left = np.stack((mask[a], values[a], mask[a], squares[a], mask[a], values[a]))
+            right = np.stack((mask[b], mask[b], values[b], mask[b], squares[b], values[b]))
+            self.sums[lag] = np.einsum("kti,ktj->kij", left, right)
+        with np.errstate(invalid="ignore"):
+            self.in_sync[:] = (np.abs(rows[:, :, None] - rows[:, None, :]) <= self.threshold).sum(axis=0)
+
+    def compute(self) -> Optional[Dict[str, Any]]:
+        """Metrics for every pair of users with data in the window
+
+        Returns the user ids and N×N matrices (NaN where undefined), or None
+        with fewer than two users.
+        """
+        active = [slot for slot, user_id in enumerate(self.user_ids)
+                  if user_id is not None and self.sums[0, COUNT, slot, slot] > 0]
+        if len(active) < 2:
+            return None
+
+        index = np.array(active)
+        sums = self.sums[:, :, index[:, None], index[None, :]]  # (lags, 6, n, n)
+
+        # Negative lags are the positive ones with the two users swapped
+        positive = sums
+        negative = sums[:0:-1][:, [COUNT, SUM_B, SUM_A, SUM_BB, SUM_AA, SUM_AB]].transpose(0, 1, 3, 2)
+        lags = np.concatenate((negative, positive))  # Lag -max_lag .. +max_lag
+        n, sa, sb, saa, sbb, sab = (lags[:, k] for k in range(6))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            covariance = n * sab - sa * sb
+            variance = (n * saa - sa * sa) * (n * sbb - sb * sb)
+            correlation = covariance / np.sqrt(variance)
+        correlation[(n < self.min_samples) | ~(variance > 1e-9)] = np.nan
+
+        # Strongest correlation over the lags
+        ranked = np.where(np.isnan(correlation), -np.inf, correlation)
+        best = ranked.argmax(axis=0)
+        best_correlation = np.take_along_axis(correlation, best[None], axis=0)[0]
+        best_lag = np.where(np.isnan(best_correlation), np.nan, best - self.max_lag)
+
+        latest = self._row(self.ticks - 1)[index]
+        difference = np.abs(latest[:, None] - latest[None, :])
+        overlap = n[self.max_lag]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            in_sync = np.where(overlap > 0, self.in_sync[index[:, None], index[None, :]] / overlap, np.nan)
+
+        return {
+            "users": [self.user_ids[slot] for slot in active],
+            "difference": difference,
+            "correlation": best_correlation,
+            "lag": best_lag,
+            "in_sync": in_sync
+        }
+
+    def frame(self, metrics: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Compact frame: user ids plus upper-triangle arrays in pair order
+        (0,1), (0,2), ... (0,n-1), (1,2), ..."""
+        metrics = metrics if metrics is not None else self.compute()
+        if metrics is None:
+            return None
+        upper = np.triu_indices(len(metrics["users"]), k=1)
+        return {
+            "type": "sync",
+            "users": metrics["users"],
+            "window": self.window,
+            "threshold": self.threshold,
+            "difference": _rounded(metrics["difference"][upper], 2),
+            "correlation": _rounded(metrics["correlation"][upper], 3),
+            "lag": _rounded(metrics["lag"][upper], 0),
+            "in_sync": _rounded(metrics["in_sync"][upper], 3)
+        }
+
+    def top_pairs(self, k: int = 5, metric: str = "in_sync", most: bool = True,
+                  metrics: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """The k most (or least) synchronized pairs by one metric"""
+        if metric not in ("in_sync", "correlation", "difference"):
+            raise ValueError(f"Unknown synchrony metric: {metric}")
+        metrics = metrics if metrics is not None else self.compute()
+        if metrics is None:
+            return []
+
+        upper = np.triu_indices(len(metrics["users"]), k=1)
+        scores = metrics[metric][upper]
+        if metric == "difference":
+            scores = -scores  # Smaller difference = more synchronized
+        if not most:
+            scores = -scores
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        users = metrics["users"]
+        pairs = []
+        for position in order.tolist():
+            i, j = int(upper[0][position]), int(upper[1][position])
+            pairs.append({
+                "users": [users[i], users[j]],
+                "difference": _number(metrics["difference"][i, j], 2),
+                "correlation": _number(metrics["correlation"][i, j], 3),
+                "lag": _number(metrics["lag"][i, j], 0),
+                "in_sync": _number(metrics["in_sync"][i, j], 3)
+            })
+        return pairs
+
+def _number(value: float, digits: int) -> Optional[float]:
+    """JSON-safe rounded value (NaN becomes None)"""
+    if math.isnan(value):
+        return None
+    return int(value) if digits == 0 else round(float(value), digits)
+
+def _rounded(values: np.ndarray, digits: int) -> list:
+    return [_number(value, digits) for value in values.tolist()]
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Multi-process UDP ingest for the BPM Broker
+
+Optional mode for large rooms: N worker processes each bind the UDP port with
+SO_REUSEPORT, so the kernel spreads incoming datagrams across them. Every user
+id is owned by exactly one worker (sharded with a stable hash); a worker that
+receives a packet for a user it does not own hands the parsed packet to the
+owner, so each user's SignalSmoother state lives in a single process.
+Hand-offs never block: if the owner's inbox is full (the owner is itself
+busy handing packets over), the packet is dropped and counted instead of
+the two workers waiting on each other.
+
+Processed packets are sent to the main process - which owns the WebSocket
+server - over a Unix datagram socket pair. Those sends never block either:
+if the main process falls behind, results are dropped and counted. When the main process evicts
+users it sends an eviction message to every worker's inbox, so the workers
+drop their smoothers and beat detectors too.
+
+Linux/BSD only (requires SO_REUSEPORT and fork).
+
+Author: Electric Connections Project
+License: MIT
+"""
+
+import logging
+import multiprocessing
+import os
+import pickle
+import selectors
+import signal
+import socket
+import time
+import zlib
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_DATAGRAM_SIZE = 65535
+DROP_LOG_INTERVAL = 5.0  # Seconds between warnings about dropped hand-offs and results
+RESULTS_BUFFER_BYTES = 4 * 1024 * 1024  # Send buffer of the result channel to the main process
+
+def shard_for_user(user_id: Any, worker_count: int) -> int:
+    """Stable worker index for a user id (identical in every process)"""
+    return zlib.crc32(str(user_id).encode("utf-8")) % worker_count
+
+def reuseport_supported() -> bool:
+    """Check whether this platform can run the multi-process ingest"""
+    return hasattr(socket, "SO_REUSEPORT") and "fork" in multiprocessing.get_all_start_methods()
+
+def _drain(sock: socket.socket):
+    """Yield (payload, addr) for everything readable on a non-blocking socket"""
+    while True:
+        try:
+            yield sock.recvfrom(MAX_DATAGRAM_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+
+def _hand_off(outbox: socket.socket, packet: dict, addr: tuple) -> bool:
+    """Send a packet to the worker owning its user (False if that worker's inbox is full)"""
+    try:
+        outbox.send(pickle.dumps(("packet", packet, addr), pickle.HIGHEST_PROTOCOL))
+        return True
+    except BlockingIOError:
+        return False
+
+def _send_result(results: socket.socket, data: dict) -> bool:
+    """Send a processed packet to the main process (False if it is not keeping up)"""
+    try:
+        results.send(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        return True
+    except BlockingIOError:
+        return False
+
+def _worker_main(index: int, worker_count: int, host: str, port: int,
+                 processor_factory: Callable, inboxes: List[socket.socket],
+                 outboxes: List[socket.socket], results: socket.socket, dropped, results_dropped):
+    """Worker process: receive, parse, shard and smooth packets"""
+    # Ctrl+C is handled by the main process, which terminates the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    processor = processor_factory()
+
+    udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    udp_sock.bind((host, port))
+    udp_sock.setblocking(False)
+
+    inbox = inboxes[index]
+    inbox.setblocking(False)
+
+    selector = selectors.DefaultSelector()
+    selector.register(udp_sock, selectors.EVENT_READ, "udp")
+    selector.register(inbox, selectors.EVENT_READ, "inbox")
+
+    logger.info(f"Ingest worker {index} (pid {os.getpid()}) listening on {host}:{port}")
+
+    results_logged_at = 0.0
+
+    def handle(packet, addr):
+        nonlocal results_logged_at
+        data = processor.apply_packet(packet, addr)
+        if data is not None and not _send_result(results, data):
+            results_dropped[index] += 1
+            now = time.monotonic()
+            if now - results_logged_at >= DROP_LOG_INTERVAL:
+                results_logged_at = now
+                logger.warning(f"Ingest worker {index}: main process is not keeping up - "
+                               f"{results_dropped[index]} results dropped so far")
+
+    logged_at = 0.0
+    while True:
+        for key, _ in selector.select():
+            if key.data == "udp":
+                for payload, addr in _drain(udp_sock):
+                    packet = processor.parse_datagram(payload, addr)
+                    if packet is None:
+                        continue
+
+                    owner = shard_for_user(packet['user'], worker_count)
+                    if owner == index:
+                        handle(packet, addr)
+                    elif not _hand_off(outboxes[owner], packet, addr):
+                        dropped[index] += 1
+                        now = time.monotonic()
+                        if now - logged_at >= DROP_LOG_INTERVAL:
+                            logged_at = now
+                            logger.warning(f"Ingest worker {index}: inbox of worker {owner} is full - "
+                                           f"{dropped[index]} hand-offs dropped so far")
+            else:
+                for payload, _ in _drain(inbox):
+                    kind, *message = pickle.loads(payload)
+                    if kind == "packet":
+                        handle(*message)
+                    else:
+                        for user_id in message[0]:
+                            processor.forget_user_state(user_id)
+
+class IngestWorkerPool:
+    """Worker processes sharing the UDP port, feeding results to the main process"""
+
+    def __init__(self, worker_count: int, host: str, port: int, processor_factory: Callable):
+        self.worker_count = worker_count
+        self.host = host
+        self.port = port
+        self.processor_factory = processor_factory
+        self.processes: List[multiprocessing.Process] = []
+        self.results: Optional[socket.socket] = None
+        self.inboxes: List[socket.socket] = []  # Main process end of each worker's inbox
+        self.loop = None
+        self.received = 0
+        self.dropped = None  # Hand-offs dropped per worker, in shared memory
+        self.results_dropped = None  # Results dropped per worker, in shared memory
+
+    def start(self, loop, on_result: Callable[[dict], Any]):
+        """Fork the workers and deliver their results to on_result on the loop"""
+        if not reuseport_supported():
+            raise RuntimeError("Multi-process ingest needs SO_REUSEPORT and fork (Linux/BSD)")
+
+        context = multiprocessing.get_context("fork")
+
+        # One inbox per worker for packets handed over by other workers
+        inbox_pairs = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+                       for _ in range(self.worker_count)]
+        inboxes = [pair[0] for pair in inbox_pairs]
+        outboxes = [pair[1] for pair in inbox_pairs]
+        for outbox in outboxes:
+            outbox.setblocking(False)
+        self.results, worker_results = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        worker_results.setblocking(False)
+        worker_results.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, RESULTS_BUFFER_BYTES)
+        self.dropped = context.RawArray('Q', self.worker_count)
+        self.results_dropped = context.RawArray('Q', self.worker_count)
+
+        for index in range(self.worker_count):
+            process = context.Process(
+                target=_worker_main,
+                args=(index, self.worker_count, self.host, self.port,
+                      self.processor_factory, inboxes, outboxes, worker_results, self.dropped,
+                      self.results_dropped),
+                name=f"bpm-ingest-{index}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+        # The main process keeps its end of the result channel and a sending
+        # end of each inbox (for evictions)
+        self.inboxes = outboxes
+        for sock in inboxes + [worker_results]:
+            sock.close()
+
+        self.results.setblocking(False)
+
+        def read_results():
+            for payload, _ in _drain(self.results):
+                self.received += 1
+                on_result(pickle.loads(payload))
+
+        self.loop = loop
+        loop.add_reader(self.results.fileno(), read_results)
+
+        logger.info(f"Started {self.worker_count} ingest workers on UDP {self.host}:{self.port} (SO_REUSEPORT)")
+
+    def stop(self):
+        """Terminate the workers and close the result channel"""
+        if self.results is not None:
+            self.loop.remove_reader(self.results.fileno())
+            self.results.close()
+            self.results = None
+
+        for sock in self.inboxes:
+            sock.close()
+        self.inboxes = []
+
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout=2)
+        self.processes = []
+
+    def evict_users(self, user_ids: List[Any]):
+        """Tell every worker to drop the state of evicted users"""
+        payload = pickle.dumps(("evict", list(user_ids)), pickle.HIGHEST_PROTOCOL)
+        for index, inbox in enumerate(self.inboxes):
+            try:
+                inbox.send(payload)
+            except BlockingIOError:
+                logger.warning(f"Inbox of ingest worker {index} is full - "
+                               f"{len(user_ids)} evicted users kept there")
+
+    def get_stats(self) -> dict:
+        """Get worker pool status"""
+        return {
+            "workers": self.worker_count,
+            "alive": sum(1 for process in self.processes if process.is_alive()),
+            "pids": [process.pid for process in self.processes],
+            "results_received": self.received,
+            "handoff_dropped": sum(self.dropped) if self.dropped is not None else 0,
+            "results_dropped": sum(self.results_dropped) if self.results_dropped is not None else 0
+        }
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for broker-side beat detection on raw PPG waveforms
+"""
+
+import asyncio
+import numpy as np
+from bpm_beats import BeatDetector
+from bpm_broker import BPMBroker
+from bpm_lifecycle import UserLifecycle
+from bpm_packet import encode_waveform
+
+def synthetic_ppg(bpm: float, seconds: float, rate: int = 100, seed: int = 0) -> np.ndarray:
+    """IR signal with a pulse and a dicrotic wave per beat, breathing drift and noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    phase = (t * bpm / 60) % 1
+    pulse = np.exp(-((phase - 0.2) / 0.06) ** 2) + 0.35 * np.exp(-((phase - 0.55) / 0.08) ** 2)
+    return (100000 + 3000 * pulse + 800 * np.sin(2 * np.pi * 0.15 * t)
+            + rng.normal(0, 60, len(t))).astype(np.uint32)
+
+def run(detector: BeatDetector, signal: np.ndarray, chunk: int, start_ms: int = 1000) -> list:
+    readings = []
+    for i in range(0, len(signal), chunk):
+        reading = detector.process(start_ms + i * 10, signal[i:i + chunk])
+        if reading is not None:
+            readings.append(reading)
+    return readings
+
+def test_detects_heart_rate():
+    readings = run(BeatDetector(100), synthetic_ppg(72, 30), 25)
+    beats = [beat for reading in readings for beat in reading["beats"]]
+    assert 33 <= len(beats) <= 36  # One per 833 ms, minus the last second still pending
+    assert abs(readings[-1]["bpm"] - 72) < 1.5
+    assert all(abs(ibi - 833) <= 20 for reading in readings for ibi in reading["ibi_ms"])
+
+def test_beats_do_not_depend_on_chunking():
+    signal = synthetic_ppg(95, 20, seed=3)
+    expected = None
+    for chunk in (25, 7, 100, len(signal)):
+        readings = run(BeatDetector(100), signal, chunk)
+        beats = [beat for reading in readings for beat in reading["beats"]]
+        expected = expected or beats
+        assert beats == expected, chunk
+
+def test_finger_off_and_gaps_restart_detection():
+    detector = BeatDetector(100)
+    run(detector, synthetic_ppg(72, 10), 25)
+    off = detector.process(11000, np.full(25, 5000, dtype=np.uint32))
+    assert off["finger_detected"] is False and off["bpm"] == 0
+    assert detector.process(11250, np.full(25, 5000, dtype=np.uint32)) is None  # Reported once a second
+
+    readings = run(detector, synthetic_ppg(60, 10), 25, start_ms=50000)
+    assert detector.resets == 1 and abs(readings[-1]["bpm"] - 60) < 1.5
+
+def test_broker_publishes_detected_beats():
+    async def run_broker():
+        broker = BPMBroker()
+        signal = synthetic_ppg(80, 8)
+        for i in range(0, len(signal), 25):
+            packet = encode_waveform(5, 2000 + i * 10, 100, signal[i:i + 25])
+            await broker.process_udp_batch([(packet, ("10.0.0.5", 4321))])
+        data = broker.latest_data[5]
+        assert data["source"] == "ppg" and data["finger_detected"] is True
+        assert abs(data["bpm_raw"] - 80) < 2 and data["beats"]
+        assert broker.build_status(0)["ppg"]["devices"] == 1
+        broker.evict_users([5], "test")
+        assert broker.build_status(0)["ppg"]["devices"] == 0
+    asyncio.run(run_broker())
+
+def test_broker_drops_waveforms_with_too_low_a_sample_rate():
+    async def run_broker():
+        broker = BPMBroker()
+        invalid = broker.metrics.counters["invalid_binary"]
+        packet = encode_waveform(6, 1000, 4, synthetic_ppg(72, 1, rate=4))
+        await broker.process_udp_batch([(packet, ("10.0.0.6", 4321))])
+        assert broker.metrics.counters["invalid_binary"] == invalid + 1
+        assert 6 not in broker.latest_data
+        assert broker.beat_detectors is None or 6 not in broker.beat_detectors.detectors
+
+        # The broker keeps processing the next packets
+        signal = synthetic_ppg(80, 4)
+        for i in range(0, len(signal), 25):
+            packet = encode_waveform(6, 2000 + i * 10, 100, signal[i:i + 25])
+            await broker.process_udp_batch([(packet, ("10.0.0.6", 4321))])
+        assert broker.latest_data[6]["source"] == "ppg"
+    asyncio.run(run_broker())
+
+def test_detectors_exist_only_for_tracked_users():
+    """Waveform-only users count towards the user cap, so their detectors are evicted too"""
+    async def run_broker():
+        broker = BPMBroker()
+        broker.user_lifecycle = UserLifecycle(stale_after=10, evict_after=60, max_users=3)
+        samples = synthetic_ppg(72, 0.25)  # Too short for a reading: never published
+        for user_id in range(1, 11):
+            await broker.process_udp_batch([(encode_waveform(user_id, 1000, 100, samples), ("10.0.0.7", 4321))])
+        assert sorted(broker.beat_detectors.detectors) == [8, 9, 10]
+        assert sorted(broker.user_lifecycle.last_seen) == [8, 9, 10]
+    asyncio.run(run_broker())
+
+if __name__ == "__main__":
+    test_detects_heart_rate()
+    test_beats_do_not_depend_on_chunking()
+    test_finger_off_and_gaps_restart_detection()
+    test_broker_publishes_detected_beats()
+    test_broker_drops_waveforms_with_too_low_a_sample_rate()
+    test_detectors_exist_only_for_tracked_users()
+    print("✅ Beat detection tests passed")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for bench_broker.py: the WebSocket consumers decode every codec
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+import bpm_broker
+from bench_broker import _consume
+from bpm_codecs import available_codecs
+
+logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+logging.getLogger("websockets").setLevel(logging.WARNING)
+
+UDP_PORT = 18868
+WS_PORT = 16769
+PACKETS = 5
+
+def consume_once(codec: str) -> dict:
+    """Run the consumer path against a live broker; returns its report"""
+    async def run():
+        ports = (bpm_broker.UDP_HOST, bpm_broker.UDP_PORT, bpm_broker.WEBSOCKET_HOST,
+                 bpm_broker.WEBSOCKET_PORT, bpm_broker.METRICS_ENABLED)
+        bpm_broker.UDP_HOST = bpm_broker.WEBSOCKET_HOST = "127.0.0.1"
+        bpm_broker.UDP_PORT, bpm_broker.WEBSOCKET_PORT, bpm_broker.METRICS_ENABLED = UDP_PORT, WS_PORT, False
+        try:
+            broker = bpm_broker.BPMBroker()
+            task = asyncio.create_task(broker.run())
+            await asyncio.wait_for(broker.listening.wait(), 10)
+
+            config = {"ws_port": WS_PORT, "codec": codec, "consumers": 1}
+            ready, stop, results = threading.Event(), threading.Event(), queue.Queue()
+            consumer = asyncio.create_task(_consume(config, ready, stop, results))
+            for _ in range(100):
+                if ready.is_set():
+                    break
+                await asyncio.sleep(0.05)
+
+            sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            for seq in range(PACKETS):
+                packet = {"user": 1 + seq, "bpm": 70, "bench_seq": seq, "bench_sent": time.time()}
+                sender.sendto(json.dumps(packet).encode("utf-8"), ("127.0.0.1", UDP_PORT))
+            sender.close()
+            await asyncio.sleep(0.5)
+            stop.set()
+            await asyncio.wait_for(consumer, 10)
+
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            return results.get_nowait()[1]
+        finally:
+            (bpm_broker.UDP_HOST, bpm_broker.UDP_PORT, bpm_broker.WEBSOCKET_HOST,
+             bpm_broker.WEBSOCKET_PORT, bpm_broker.METRICS_ENABLED) = ports
+    return asyncio.run(run())
+
+def test_consumers_decode_every_codec():
+    for codec in available_codecs():
+        report = consume_once(codec)
+        assert report["unique_delivered"] == [PACKETS], (codec, report)
+        assert report["latency_ms"]["max"] > 0
+
+if __name__ == "__main__":
+    test_consumers_decode_every_codec()
+    print("✅ Benchmark tests passed")
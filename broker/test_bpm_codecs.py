@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for the WebSocket message codecs and encode-once messages
+"""
+
+import json
+import os
+import subprocess
+import sys
+import bpm_codecs
+from bpm_codecs import Codec, EncodedMessage, available_codecs, decode_command, get_codec
+
+PACKET = {
+    "user": 7,
+    "bpm": 72.4,
+    "bpm_raw": 73,
+    "bpm_smoothed": True,
+    "no_heart_rate": False,
+    "finger_detected": True,
+    "timestamp": 123456,
+    "signal_strength": -48,
+    "signal_stats": {"mean": 72.1, "std": 1.5, "min": 70.0, "max": 74.0, "last": 73.0},
+    "source_ip": "192.168.1.107"
+}
+
+SNAPSHOT = {
+    "type": "frame",
+    "frame": 3,
+    "snapshot": 12,
+    "users": {7: PACKET, "guest": dict(PACKET, user="guest")},
+    "timestamp": 1234567890.5
+}
+
+class CountingCodec(Codec):
+    """JSON codec that counts its encodes"""
+
+    name = "counting"
+
+    def __init__(self):
+        self.encodes = 0
+
+    def encode(self, data):
+        self.encodes += 1
+        return json.dumps(data)
+
+def test_round_trips():
+    for name in available_codecs():
+        codec = get_codec(name)
+        payload = codec.encode(PACKET)
+        assert isinstance(payload, bytes if codec.binary else str), name
+        assert codec.decode(payload) == PACKET, name
+
+        # JSON object keys are always strings; msgpack keeps the int user id
+        users = codec.decode(codec.encode(SNAPSHOT))["users"]
+        assert users == ({7: PACKET, "guest": SNAPSHOT["users"]["guest"]} if codec.binary
+                         else {"7": PACKET, "guest": SNAPSHOT["users"]["guest"]}), name
+
+def test_unknown_codec_is_rejected():
+    assert get_codec().name == "json" and get_codec(None) is get_codec("json")
+    try:
+        get_codec("xml")
+    except ValueError as e:
+        assert "available" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
+
+def test_message_is_encoded_once_per_codec():
+    counting = CountingCodec()
+    message = EncodedMessage(PACKET)
+    payloads = [message.encode(counting) for _ in range(50)]  # One per client
+    assert counting.encodes == 1
+    assert all(payload is payloads[0] for payload in payloads)
+
+    for name in available_codecs():
+        assert message.encode(get_codec(name)) is message.encode(get_codec(name))
+    assert set(message.encoded) == {"counting", *available_codecs()}
+
+def test_decode_command():
+    command = {"type": "subscribe", "users": [1, 2]}
+    for name in available_codecs():
+        codec = get_codec(name)
+        assert decode_command(json.dumps(command), codec) == command  # Text frames are always JSON
+        if codec.binary:
+            assert decode_command(codec.encode(command), codec) == command
+
+    # The broker logs and skips commands that raise ValueError
+    malformed = [("{not json", "json"), (b"\xff\xfe", "json")]
+    if "msgpack" in available_codecs():
+        malformed.append((b"\xc1", "msgpack"))  # A reserved byte, never valid
+    for payload, name in malformed:
+        try:
+            decode_command(payload, get_codec(name))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"expected {payload!r} to be rejected")
+
+def test_optional_codecs_fall_back_to_json():
+    """Without orjson and msgpack only the stdlib codec is offered"""
+    check = ("import sys; sys.modules['orjson'] = sys.modules['msgpack'] = None\n"
+             "import bpm_codecs, json\n"
+             "print(json.dumps([bpm_codecs.available_codecs(), bpm_codecs.get_codec().name]))\n"
+             "try:\n"
+             "    bpm_codecs.get_codec('msgpack')\n"
+             "except ValueError:\n"
+             "    print('rejected')\n")
+    output = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(bpm_codecs.__file__))).stdout.splitlines()
+    assert json.loads(output[0]) == [["json"], "json"]
+    assert output[1] == "rejected"
+
+if __name__ == "__main__":
+    test_round_trips()
+    test_unknown_codec_is_rejected()
+    test_message_is_encoded_once_per_codec()
+    test_decode_command()
+    test_optional_codecs_fall_back_to_json()
+    print("✅ Codec tests passed")
@@ -17,11 +17,15 @@ import math
 import threading
 import argparse
 
+from bpm_packet import encode_packet, encode_waveform
+
 # Default configuration
 DEFAULT_BROKER_HOST = "localhost"
 DEFAULT_BROKER_PORT = 8888
 DEFAULT_USERS = 2
 DEFAULT_RATE = 1.0  # messages per second
+PPG_SAMPLE_RATE = 100  # Raw waveform samples per second (--ppg)
+PPG_SAMPLES_PER_PACKET = 25
 
 # Shared beat counter across threads
 global_beat_count = 0
@@ -62,29 +66,72 @@ class HeartRateSimulator:
 
         return max(40, min(200, bpm))
 
+class PPGWaveformSimulator:
+    """Generates a raw IR waveform (pulse plus dicrotic wave) at a changing heart rate"""
+
+    def __init__(self, sample_rate: int = PPG_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.phase = 0.0  # Position within the current beat (0-1)
+        self.t = 0.0
+
+    def next_samples(self, bpm: float, count: int) -> list:
+        samples = []
+        for _ in range(count):
+            self.phase = (self.phase + bpm / 60.0 / self.sample_rate) % 1.0
+            self.t += 1.0 / self.sample_rate
+            pulse = (math.exp(-((self.phase - 0.2) / 0.06) ** 2)
+                     + 0.35 * math.exp(-((self.phase - 0.55) / 0.08) ** 2))
+            baseline = 800 * math.sin(2 * math.pi * 0.15 * self.t)  # Breathing
+            samples.append(int(100000 + 3000 * pulse + baseline + random.gauss(0, 60)))
+        return samples
+
 class BPMDataSender:
     """Sends simulated BPM data via UDP"""
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, binary: bool = False):
         self.host = host
         self.port = port
+        self.binary = binary
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.started = time.monotonic()  # Device "boot" time for millis()
+        self.seq = 0
 
     def send_data(self, user_id: int, bpm: float, additional_data: dict = None):
         """Send BPM data to the broker"""
         data = {
             "user": user_id,
             "bpm": round(bpm, 2),
-            "timestamp": time.time(),
+            "timestamp": int((time.monotonic() - self.started) * 1000),  # Like millis() on the device
             "device_id": f"ESP32_SIM_{user_id:02d}",
             "signal_strength": random.randint(-70, -30),
+            "seq": self.seq & 0xFFFF,
         }
+        self.seq += 1
 
         if additional_data:
             data.update(additional_data)
 
         try:
-            message = json.dumps(data).encode('utf-8')
+            if self.binary:
+                message = encode_packet(
+                    user_id, data["bpm"], data["timestamp"],
+                    signal_strength=data["signal_strength"],
+                    finger_detected=data.get("finger_detected", True),
+                    seq=data["seq"]
+                )
+            else:
+                message = json.dumps(data).encode('utf-8')
+            self.socket.sendto(message, (self.host, self.port))
+            return True
+        except Exception as e:
+            print(f"Error sending data: {e}")
+            return False
+
+    def send_waveform(self, user_id: int, timestamp_ms: int, samples: list):
+        """Send a batch of raw IR samples to the broker"""
+        try:
+            message = encode_waveform(user_id, timestamp_ms, PPG_SAMPLE_RATE, samples,
+                                      signal_strength=random.randint(-70, -30))
             self.socket.sendto(message, (self.host, self.port))
             return True
         except Exception as e:
@@ -94,10 +141,14 @@ class BPMDataSender:
     def close(self):
         self.socket.close()
 
-def simulate_user(user_id: int, host: str, port: int, rate: float, duration: float):
+def simulate_user(user_id: int, host: str, port: int, rate: float, duration: float,
+                  binary: bool = False, ppg: bool = False):
     """Simulate a single user sending heart rate data"""
     simulator = HeartRateSimulator(user_id, base_bpm=75.0)
-    sender = BPMDataSender(host, port)
+    sender = BPMDataSender(host, port, binary)
+    if ppg:
+        simulate_waveform(user_id, simulator, sender, rate, duration)
+        return
 
     print(f"Starting simulation for User {user_id} (base BPM: {simulator.base_bpm:.1f})")
 
@@ -128,6 +179,38 @@ def simulate_user(user_id: int, host: str, port: int, rate: float, duration: flo
         sender.close()
         print(f"User {user_id} sent {message_count} messages")
 
+def simulate_waveform(user_id: int, simulator: HeartRateSimulator, sender: BPMDataSender,
+                      rate: float, duration: float):
+    """Simulate a device in PPG streaming mode (the broker detects the beats)"""
+    waveform = PPGWaveformSimulator()
+    packet_interval = PPG_SAMPLES_PER_PACKET / PPG_SAMPLE_RATE
+    start_time = time.time()
+    device_ms = 0.0
+    packet_count = 0
+    bpm = simulator.get_bpm(0)
+
+    try:
+        while time.time() - start_time < duration:
+            # Advance the heart rate pattern at the usual message rate
+            elapsed = time.time() - start_time
+            bpm = simulator.get_bpm(int(elapsed * rate))
+
+            samples = waveform.next_samples(bpm, PPG_SAMPLES_PER_PACKET)
+            if sender.send_waveform(user_id, int(device_ms), samples):
+                packet_count += 1
+                if packet_count % int(1 / packet_interval) == 0:
+                    print(f"User {user_id}: waveform at {bpm:.1f} BPM (#{packet_count})")
+            device_ms += packet_interval * 1000
+
+            # Keep to the sample clock rather than drifting with the sleeps
+            time.sleep(max(0.0, start_time + device_ms / 1000 - time.time()))
+
+    except KeyboardInterrupt:
+        print(f"User {user_id} simulation interrupted")
+    finally:
+        sender.close()
+        print(f"User {user_id} sent {packet_count} waveform packets")
+
 def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description="Simulate BPM data for testing")
@@ -141,6 +224,10 @@ def main():
                        help=f"Messages per second per user (default: {DEFAULT_RATE})")
     parser.add_argument("--duration", type=float, default=float('inf'),
                        help="Duration in seconds (default: infinite)")
+    parser.add_argument("--binary", action="store_true",
+                       help="Send compact binary packets instead of JSON")
+    parser.add_argument("--ppg", action="store_true",
+                       help="Send raw PPG waveform packets (the broker detects the beats)")
 
     args = parser.parse_args()
 
@@ -149,6 +236,7 @@ def main():
     print(f"Users: {args.users}")
     print(f"Rate: {args.rate} messages/sec per user")
     print(f"Duration: {'infinite' if args.duration == float('inf') else f'{args.duration}s'}")
+    print(f"Format: {'PPG waveform' if args.ppg else 'binary' if args.binary else 'JSON'}")
     print("-" * 50)
 
     # Start simulation threads for each user
@@ -157,7 +245,7 @@ def main():
     for user_id in range(1, args.users + 1):
         thread = threading.Thread(
             target=simulate_user,
-            args=(user_id, args.host, args.port, args.rate, args.duration),
+            args=(user_id, args.host, args.port, args.rate, args.duration, args.binary, args.ppg),
             daemon=True
         )
         threads.append(thread)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the binary UDP packet formats and their detection in the broker
+"""
+
+import asyncio
+import json
+from bpm_packet import (encode_packet, decode_packet, is_binary_packet, PACKET_SIZE,
+                        encode_waveform, decode_waveform, is_waveform_packet)
+from bpm_broker import BPMBroker
+
+def test_round_trip():
+    """Encoding then decoding gives back the same fields"""
+    packet = encode_packet(3, 72.5, 123456, signal_strength=-48,
+                           ir_value=91234, red_value=80123, finger_detected=True)
+    assert len(packet) == PACKET_SIZE == 20
+    assert decode_packet(packet) == {
+        "user": 3,
+        "bpm": 72.5,
+        "timestamp": 123456,
+        "signal_strength": -48,
+        "ir_value": 91234,
+        "red_value": 80123,
+        "finger_detected": True
+    }
+
+def test_sequence_numbers():
+    """Version 2 packets carry a sequence number, version 1 packets don't"""
+    packet = encode_packet(3, 72.5, 123456, seq=70000)
+    assert len(packet) == 22
+    assert decode_packet(packet)["seq"] == 70000 % 65536
+    assert "seq" not in decode_packet(encode_packet(3, 72.5, 123456))
+    try:
+        decode_packet(packet[:21])
+    except ValueError:
+        return
+    raise AssertionError("truncated version 2 packet was accepted")
+
+def test_json_is_not_binary():
+    """JSON messages are never mistaken for binary packets"""
+    assert not is_binary_packet(json.dumps({"user": 1, "bpm": 70}).encode())
+    assert not is_binary_packet(b"")
+    assert is_binary_packet(encode_packet(1, 70, 0))
+
+def test_rejects_bad_packets():
+    """Truncated or unknown-version packets raise ValueError"""
+    packet = encode_packet(1, 70, 0)
+    for bad in (packet[:10], packet[:1] + b"\x09" + packet[2:]):
+        try:
+            decode_packet(bad)
+        except ValueError:
+            continue
+        raise AssertionError("bad packet was accepted")
+
+def test_waveform_round_trip():
+    """Waveform batches keep every sample and are told apart from BPM packets"""
+    samples = list(range(90000, 90025))
+    packet = encode_waveform(4, 5000, 100, samples, signal_strength=-60)
+    assert len(packet) == 12 + 4 * 25
+    assert is_waveform_packet(packet) and not is_binary_packet(packet)
+    assert not is_waveform_packet(encode_packet(1, 70, 0))
+
+    waveform = decode_waveform(packet)
+    assert (waveform["user"], waveform["timestamp"], waveform["sample_rate"]) == (4, 5000, 100)
+    assert waveform["signal_strength"] == -60
+    assert waveform["samples"].tolist() == samples
+    for bad in (packet[:-4], packet[:8]):
+        try:
+            decode_waveform(bad)
+        except ValueError:
+            continue
+        raise AssertionError("truncated waveform was accepted")
+
+def test_broker_accepts_both_formats():
+    """The broker processes binary and JSON datagrams from the same batch"""
+    async def run():
+        broker = BPMBroker()
+        await broker.process_udp_batch([
+            (json.dumps({"user": 1, "bpm": 70, "finger_detected": True}).encode(), ("10.0.0.1", 1234)),
+            (encode_packet(2, 80, 1000, finger_detected=True), ("10.0.0.2", 1234)),
+        ])
+        assert broker.latest_data[1]["bpm"] == 70.0
+        assert broker.latest_data[2]["bpm"] == 80.0
+        assert broker.latest_data[2]["source_ip"] == "10.0.0.2"
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_sequence_numbers()
+    test_json_is_not_binary()
+    test_rejects_bad_packets()
+    test_waveform_round_trip()
+    test_broker_accepts_both_formats()
+    print("✅ Binary packet tests passed")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-client outbound queues used by the WebSocket fan-out
+"""
+
+import asyncio
+from bpm_broker import ClientSession
+
+class StalledWebSocket:
+    """Fake WebSocket whose send() never completes"""
+
+    def __init__(self):
+        self.closed = False
+        self.close_code = None
+
+    async def send(self, message):
+        await asyncio.Event().wait()
+
+    async def close(self, code=1000, reason=""):
+        self.closed = True
+        self.close_code = code
+
+class RecordingWebSocket:
+    """Fake WebSocket that records everything sent to it"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+def test_drop_oldest():
+    """A full queue discards its oldest messages"""
+    async def run():
+        session = ClientSession(StalledWebSocket(), max_size=3, policy="drop_oldest")
+        for i in range(5):
+            assert session.enqueue(str(i), key=1)
+        assert [entry[1] for entry in session.queue] == ["2", "3", "4"]
+        assert session.dropped == 2
+        assert session.max_depth == 3
+    asyncio.run(run())
+
+def test_conflate_latest_per_user():
+    """Conflation keeps one pending message per user, in original order"""
+    async def run():
+        session = ClientSession(StalledWebSocket(), max_size=10, policy="conflate")
+        session.enqueue("u1-a", key=1)
+        session.enqueue("u2-a", key=2)
+        session.enqueue("u1-b", key=1)
+        session.enqueue("status")
+        session.enqueue("status")
+        assert [entry[1] for entry in session.queue] == ["u1-b", "u2-a", "status", "status"]
+        assert session.conflated == 1
+        assert session.dropped == 0
+    asyncio.run(run())
+
+def test_disconnect_on_backlog():
+    """The disconnect policy closes a client whose backlog is too old"""
+    async def run():
+        websocket = StalledWebSocket()
+        session = ClientSession(websocket, max_size=100, policy="disconnect", backlog_timeout=0.0)
+        assert session.enqueue("first")
+        await asyncio.sleep(0.01)
+        assert not session.enqueue("second")
+        await asyncio.sleep(0)
+        assert websocket.closed
+        assert websocket.close_code == 1008
+        assert session.dropped == 1
+    asyncio.run(run())
+
+def test_writer_delivers_in_order():
+    """The writer task sends queued messages in order"""
+    async def run():
+        websocket = RecordingWebSocket()
+        session = ClientSession(websocket)
+        session.start()
+        for i in range(5):
+            session.enqueue(str(i))
+        await asyncio.sleep(0.01)
+        await session.stop()
+        assert websocket.messages == ["0", "1", "2", "3", "4"]
+        assert session.sent == 5
+    asyncio.run(run())
+
+def test_subscription_selects_users_and_fields():
+    """Subscribed clients only see their users and fields, in packets and frames"""
+    session = ClientSession(RecordingWebSocket())
+    packet = {"user": 3, "bpm": 72.5, "bpm_raw": 74.0, "signal_stats": {"mean": 72.0}}
+    assert session.select(packet) is packet
+    assert session.view_key is None
+
+    session.subscribe([3], ["bpm"], set_fields=True)
+    assert session.select(packet) == {"user": 3, "bpm": 72.5}
+    assert session.select({"user": 4, "bpm": 80.0}) is None
+
+    frame = {"type": "frame", "frame": 1, "users": {3: packet, 4: {"user": 4, "bpm": 80.0}}}
+    assert session.select(frame)["users"] == {3: {"user": 3, "bpm": 72.5}}
+
+    session.unsubscribe([3])
+    assert session.select(packet) is None
+    session.subscribe()
+    session.unsubscribe([4])
+    assert session.wants(3) and not session.wants(4)
+
+def test_rate_cap_sends_latest_update():
+    """Updates above the rate cap are held back and conflated per user"""
+    async def run():
+        websocket = RecordingWebSocket()
+        session = ClientSession(websocket)
+        session.subscribe(max_rate_hz=20, set_rate=True)
+        session.start()
+        for i in range(5):
+            session.offer(f"u1-{i}", key=1)
+        session.offer("u2-0", key=2)
+        await asyncio.sleep(0.01)
+        assert websocket.messages == ["u1-0", "u2-0"]
+        await asyncio.sleep(0.06)
+        assert websocket.messages == ["u1-0", "u2-0", "u1-4"]
+        assert session.rate_limited == 3
+        await session.stop()
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_drop_oldest()
+    test_conflate_latest_per_user()
+    test_disconnect_on_backlog()
+    test_writer_delivers_in_order()
+    test_subscription_selects_users_and_fields()
+    test_rate_cap_sends_latest_update()
+    print("✅ All client queue tests passed")
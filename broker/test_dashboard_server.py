@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for web_dashboard/server.py: content negotiation, ETags and reloading
+"""
+
+import gzip
+import http.client
+import os
+import tempfile
+import threading
+import time
+from bpm_broker import DASHBOARD_DIR
+from bpm_static import load_dashboard_server
+
+server = load_dashboard_server(DASHBOARD_DIR)
+
+def start_server(directory: str):
+    """Dashboard server on a free port, in a background thread"""
+    handler = type("Handler", (server.CORSHTTPRequestHandler,), {"assets": server.AssetCache(directory)})
+    handler.log_message = lambda self, format, *args: None
+    httpd = server.DashboardHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+def get(httpd, path: str, headers: dict) -> http.client.HTTPResponse:
+    connection = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=5)
+    connection.request("GET", path, headers=headers)
+    response = connection.getresponse()
+    response.body = response.read()
+    connection.close()
+    return response
+
+def test_each_encoding_has_its_own_etag():
+    httpd = start_server(DASHBOARD_DIR)
+    try:
+        identity = get(httpd, "/index.html", {})
+        gzipped = get(httpd, "/index.html", {"Accept-Encoding": "gzip, deflate"})
+        assert identity.status == gzipped.status == 200
+        assert identity.getheader("Content-Encoding") is None and gzipped.getheader("Content-Encoding") == "gzip"
+        assert gzip.decompress(gzipped.body) == identity.body
+        assert identity.getheader("Vary") == gzipped.getheader("Vary") == "Accept-Encoding"
+        assert identity.getheader("ETag") != gzipped.getheader("ETag")
+        assert gzipped.getheader("ETag").endswith('-gz"')
+
+        # Revalidating with the other encoding's ETag must not get a 304
+        assert get(httpd, "/index.html", {"If-None-Match": gzipped.getheader("ETag")}).status == 200
+        assert get(httpd, "/index.html", {"Accept-Encoding": "gzip",
+                                          "If-None-Match": identity.getheader("ETag")}).status == 200
+
+        not_modified = get(httpd, "/index.html", {"Accept-Encoding": "gzip",
+                                                  "If-None-Match": f'"x", W/{gzipped.getheader("ETag")}'})
+        assert not_modified.status == 304 and not_modified.body == b""
+        assert not_modified.getheader("ETag") == gzipped.getheader("ETag")
+        assert not_modified.getheader("Vary") == "Accept-Encoding"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def test_small_files_are_sent_uncompressed():
+    cached = server.CachedFile(b'{"user1": "A"}', "application/json", 0.0, 14)
+    assert cached.choose("gzip, br") == ("identity", b'{"user1": "A"}')
+    assert list(cached.etags) == ["identity"] and cached.etags["identity"] == cached.etag
+
+def test_files_reload_when_modified():
+    interval = server.RELOAD_CHECK_INTERVAL
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "user_names.json")
+        with open(path, "w") as f:
+            f.write('{"user1": "Ada"}')
+        assets = server.AssetCache(directory)
+        first = assets.get(assets.resolve("/user_names.json"))
+        assert first.variants["identity"] == b'{"user1": "Ada"}'
+
+        with open(path, "w") as f:
+            f.write('{"user1": "Grace"}')
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        assert assets.get(path) is first  # Not checked again within RELOAD_CHECK_INTERVAL
+
+        server.RELOAD_CHECK_INTERVAL = 0.0
+        try:
+            second = assets.get(path)
+            assert second.variants["identity"] == b'{"user1": "Grace"}' and second.etag != first.etag
+            assert assets.get(path) is second  # Unchanged since: kept
+
+            os.remove(path)
+            assert assets.get(path) is None
+        finally:
+            server.RELOAD_CHECK_INTERVAL = interval
+
+if __name__ == "__main__":
+    test_each_encoding_has_its_own_etag()
+    test_small_files_are_sent_uncompressed()
+    test_files_reload_when_modified()
+    print("✅ Dashboard server tests passed")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the delta-encoded WebSocket stream
+"""
+
+from bpm_delta import DeltaEncoder
+
+VOLATILE = ("timestamp", "server_timestamp")
+
+def packet(bpm, t: float, **extra) -> dict:
+    data = {"user": 1, "bpm": bpm, "source_ip": "192.168.1.101", "timestamp": int(t * 1000),
+            "server_timestamp": t, "signal_stats": {"mean": 72.0, "std": 1.0}}
+    data.update(extra)
+    return data
+
+def test_keyframe_then_changed_fields_only():
+    encoder = DeltaEncoder(keyframe_interval=50, epsilon=0.05, keepalive=5.0, volatile_fields=VOLATILE)
+    first = encoder.encode(packet(72.0, 0.0), now=0.0)
+    assert first["type"] == "delta" and first["keyframe"]
+    assert first["fields"]["source_ip"] == "192.168.1.101"
+
+    second = encoder.encode(packet(74.0, 1.0), now=1.0)
+    assert second == {"type": "delta", "user": 1, "keyframe": False,
+                      "fields": {"bpm": 74.0, "timestamp": 1000, "server_timestamp": 1.0}}
+
+def test_epsilon_suppression_and_keepalive():
+    """Small changes are suppressed until they add up or the keepalive is due"""
+    encoder = DeltaEncoder(keyframe_interval=50, epsilon=0.05, keepalive=5.0, volatile_fields=VOLATILE)
+    encoder.encode(packet(72.0, 0.0), now=0.0)
+    assert encoder.encode(packet(72.03, 1.0), now=1.0) is None
+    assert encoder.encode(packet(72.04, 2.0), now=2.0) is None
+
+    # Drift is measured against what the client has, not the last packet
+    assert encoder.encode(packet(72.06, 3.0), now=3.0)["fields"]["bpm"] == 72.06
+
+    keepalive = encoder.encode(packet(72.06, 9.0), now=9.0)
+    assert keepalive["fields"] == {"timestamp": 9000, "server_timestamp": 9.0}
+    assert encoder.suppressed == 2
+
+def test_removed_fields_and_keyframe_interval():
+    encoder = DeltaEncoder(keyframe_interval=3, epsilon=0.0, volatile_fields=VOLATILE)
+    encoder.encode(packet(72.0, 0.0), now=0.0)
+    no_heart_rate = packet("--", 1.0)
+    del no_heart_rate["signal_stats"]
+    record = encoder.encode(no_heart_rate, now=1.0)
+    assert record["fields"]["bpm"] == "--"
+    assert record["removed"] == ["signal_stats"]
+
+    encoder.encode(packet(70.0, 2.0), now=2.0)
+    assert encoder.encode(packet(71.0, 3.0), now=3.0)["keyframe"]
+
+def test_frames_and_plain_messages():
+    encoder = DeltaEncoder(volatile_fields=VOLATILE)
+    frame = {"type": "frame", "frame": 1, "users": {1: packet(72.0, 0.0), 2: packet(80.0, 0.0, user=2)}}
+    assert set(encoder.encode(frame, now=0.0)["users"]) == {1, 2}
+
+    frame = {"type": "frame", "frame": 2, "users": {1: packet(72.0, 0.5), 2: packet(81.0, 0.5, user=2)}}
+    assert encoder.encode(frame, now=0.5)["users"] == {2: {"keyframe": False, "fields": {
+        "bpm": 81.0, "timestamp": 500, "server_timestamp": 0.5}}}
+
+    status = {"type": "status_response", "connected_clients": 1}
+    assert encoder.encode(status, now=1.0) is status
+
+if __name__ == "__main__":
+    test_keyframe_then_changed_fields_only()
+    test_epsilon_suppression_and_keepalive()
+    test_removed_fields_and_keyframe_interval()
+    test_frames_and_plain_messages()
+    print("✅ Delta encoding tests passed")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming filter chain
+"""
+
+import asyncio
+import json
+import random
+import numpy as np
+from scipy import signal
+import bpm_broker
+from bpm_filters import build_filter_chain, ButterworthFilter, HampelFilter, WindowMedianFilter
+from bpm_broker import BPMBroker, SignalSmoother
+
+def noisy_stream(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    values = [70 + 10 * np.sin(i / 20) + rng.gauss(0, 2) for i in range(count)]
+    for i in range(5, count, 37):
+        values[i] += rng.choice([-35, 45])  # Spikes
+    return values
+
+def run_in_chunks(make_stage, values: list, seed: int) -> np.ndarray:
+    """Feed values through a fresh stage in random-sized chunks"""
+    rng = random.Random(seed)
+    stage = make_stage()
+    output = []
+    position = 0
+    while position < len(values):
+        size = rng.choice([1, 2, 5, 16])
+        chunk = values[position:position + size]
+        if size == 1:
+            output.append(stage.process_one(chunk[0]))
+        else:
+            output.extend(stage.process(np.array(chunk)).tolist())
+        position += size
+    return np.array(output)
+
+def test_batched_and_single_reading_paths_agree():
+    """Chunked processing carries state exactly like one reading at a time"""
+    values = noisy_stream(500, seed=1)
+    for make_stage in (lambda: ButterworthFilter(2, 0.15, 1.0),
+                       lambda: HampelFilter(7, 3.0),
+                       lambda: WindowMedianFilter(5)):
+        one_by_one = make_stage()
+        expected = np.array([one_by_one.process_one(v) for v in values])
+        assert np.allclose(run_in_chunks(make_stage, values, seed=2), expected, atol=1e-9)
+
+def test_butterworth_matches_sosfilt():
+    """Carrying zi across readings is the same as filtering the whole signal"""
+    values = np.array(noisy_stream(300, seed=3))
+    stage = ButterworthFilter(4, 0.1, 1.0)
+    streamed = [stage.process_one(v) for v in values]
+    expected, _ = signal.sosfilt(stage.sos, values, zi=signal.sosfilt_zi(stage.sos) * values[0])
+    assert np.allclose(streamed, expected, atol=1e-9)
+
+def test_hampel_replaces_spikes_only():
+    stage = HampelFilter(7, 3.0)
+    values = [70.0, 71.0, 69.5, 70.5, 70.0, 71.0, 130.0, 70.5, 69.0]
+    output = [stage.process_one(v) for v in values]
+    assert output[6] == 70.5  # Median of the window instead of the spike
+    assert output[:6] == values[:6] and output[7:] == values[7:]
+
+def test_smoother_add_samples_matches_add_sample():
+    """The batched smoother path gives the same values and statistics"""
+    values = noisy_stream(400, seed=4) + [250.0, 75.0, 20.0, 76.0]
+    names = ("hampel", "butterworth", "ema")
+    single = SignalSmoother(filters=build_filter_chain(names))
+    batched = SignalSmoother(filters=build_filter_chain(names))
+
+    expected = [(single.add_sample(v), single.get_statistics()) for v in values]
+    actual = []
+    for start in range(0, len(values), 9):
+        smoothed, statistics = batched.add_samples(values[start:start + 9])
+        actual.extend(zip(smoothed, statistics))
+
+    for (expected_value, expected_stats), (value, stats) in zip(expected, actual):
+        assert abs(expected_value - value) < 1e-9
+        assert all(abs(expected_stats[k] - stats[k]) < 1e-9 for k in expected_stats)
+
+def test_chain_configuration():
+    chain = build_filter_chain(("median", "ema"))
+    assert [stage.name for stage in chain.stages] == ["median"] and chain.ema
+    assert not build_filter_chain(("butterworth",)).ema
+    for names in (("ema", "hampel"), ("kalman",)):
+        try:
+            build_filter_chain(names)
+            assert False, f"{names} should be rejected"
+        except ValueError:
+            pass
+
+def test_grouped_batches_reject_unusable_user_ids():
+    """Readings are grouped by user, so a list or dict id must be rejected before grouping"""
+    async def run():
+        broker = BPMBroker()
+        assert broker.filter_batching
+        addr = ("10.0.0.1", 4321)
+        packets = [{"user": [1], "bpm": 70}, {"user": {"id": 1}, "bpm": 70}, {"user": True, "bpm": 70},
+                   {"user": 2.5, "bpm": 70}, {"user": 1, "bpm": 70}, {"user": 1.0, "bpm": 72},
+                   {"user": "bob", "bpm": 80}]
+        await broker.process_udp_batch([(json.dumps(packet).encode("utf-8"), addr) for packet in packets])
+        assert broker.metrics.counters["invalid_format"] == 4
+        assert sorted(broker.latest_data, key=str) == [1, "bob"] and broker.latest_data[1]["bpm_raw"] == 72
+        assert type(broker.latest_data[1]["user"]) is int  # 1.0 from older firmware is user 1
+
+    chain = bpm_broker.FILTER_CHAIN
+    bpm_broker.FILTER_CHAIN = ("median", "ema")
+    try:
+        asyncio.run(run())
+    finally:
+        bpm_broker.FILTER_CHAIN = chain
+
+if __name__ == "__main__":
+    test_batched_and_single_reading_paths_agree()
+    test_butterworth_matches_sosfilt()
+    test_hampel_replaces_spikes_only()
+    test_smoother_add_samples_matches_add_sample()
+    test_chain_configuration()
+    test_grouped_batches_reject_unusable_user_ids()
+    print("✅ Filter chain tests passed")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for "tick" output mode: updates coalesced into one frame per tick
+"""
+
+import asyncio
+import json
+import logging
+import bpm_broker
+from bpm_broker import BPMBroker, ClientSession
+
+logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+
+ADDR = ("192.168.1.101", 4210)
+
+def sent(session: ClientSession) -> list:
+    """Messages queued for a client, decoded"""
+    return [json.loads(message) for _, message, _ in session.queue]
+
+async def publish(broker: BPMBroker, user_id: int, bpm: float):
+    await broker.publish_packet(broker.apply_packet({"user": user_id, "bpm": bpm}, ADDR))
+
+def test_updates_coalesce_into_one_frame():
+    async def run():
+        broker = BPMBroker()
+        session = ClientSession(None, max_size=10)
+        broker.websocket_clients = {"a": session}
+
+        for user_id, bpm in [(1, 70), (2, 80), (1, 72), (1, 74)]:
+            await publish(broker, user_id, bpm)
+        assert sent(session) == []  # Nothing goes out between ticks
+
+        await broker.emit_frame()
+        frames = sent(session)
+        assert len(frames) == 1
+        frame = frames[0]
+        assert frame["type"] == "frame" and frame["frame"] == 1 and isinstance(frame["timestamp"], float)
+        assert sorted(frame["users"]) == ["1", "2"]
+        assert frame["users"]["1"]["bpm_raw"] == 74  # Only the latest reading per user
+        assert frame["users"]["1"]["user"] == 1 and frame["users"]["2"]["bpm_raw"] == 80
+
+        await publish(broker, 2, 82)
+        await broker.emit_frame()
+        frame = sent(session)[-1]
+        assert frame["frame"] == 2 and list(frame["users"]) == ["2"]  # Unchanged users are left out
+
+    mode = bpm_broker.OUTPUT_MODE
+    bpm_broker.OUTPUT_MODE = "tick"
+    try:
+        asyncio.run(run())
+    finally:
+        bpm_broker.OUTPUT_MODE = mode
+
+def test_empty_ticks_send_nothing():
+    async def run():
+        broker = BPMBroker()
+        session = ClientSession(None, max_size=10)
+        broker.websocket_clients = {"a": session}
+        ticker = asyncio.create_task(broker.run_frame_ticker(rate_hz=100))
+
+        await asyncio.sleep(0.1)
+        assert sent(session) == [] and broker.frame_count == 0
+
+        await publish(broker, 1, 70)
+        await asyncio.sleep(0.1)
+        frames = sent(session)
+        assert len(frames) == 1 and broker.frame_count == 1
+        assert frames[0]["users"]["1"]["bpm_raw"] == 70
+        ticker.cancel()
+
+    mode = bpm_broker.OUTPUT_MODE
+    bpm_broker.OUTPUT_MODE = "tick"
+    try:
+        asyncio.run(run())
+    finally:
+        bpm_broker.OUTPUT_MODE = mode
+
+if __name__ == "__main__":
+    test_updates_coalesce_into_one_frame()
+    test_empty_ticks_send_nothing()
+    print("✅ Frame coalescing tests passed")
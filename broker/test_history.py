@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-resolution history rollups and LTTB downsampling
+"""
+
+import math
+import numpy as np
+from bpm_history import HistoryRollups, RollupTier, lttb_indices
+
+def reference_lttb(points: list, threshold: int) -> list:
+    """Straightforward LTTB, as in the original write-up"""
+    n = len(points)
+    if threshold >= n:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(math.floor(i * every)) + 1, int(math.floor((i + 1) * every)) + 1
+        next_range = points[end:min(int(math.floor((i + 2) * every)) + 1, n)] or [points[-1]]
+        avg_x = sum(p[0] for p in next_range) / len(next_range)
+        avg_y = sum(p[1] for p in next_range) / len(next_range)
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((points[a][0] - avg_x) * (points[j][1] - points[a][1])
+                       - (points[a][0] - points[j][0]) * (avg_y - points[a][1]))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        selected.append(a)
+    return selected + [n - 1]
+
+def test_lttb_matches_reference_and_keeps_spikes():
+    rng = np.random.default_rng(1)
+    x = np.arange(1000, dtype=np.float64)
+    y = 70 + np.cumsum(rng.normal(0, 0.5, 1000))
+    y[437] += 40  # A spike a plain stride would probably skip
+    keep = lttb_indices(x, y, 100)
+    assert keep.tolist() == reference_lttb(list(zip(x.tolist(), y.tolist())), 100)
+    assert len(keep) == 100 and keep[0] == 0 and keep[-1] == 999
+    assert 437 in keep.tolist()
+    assert lttb_indices(x[:50], y[:50], 100).tolist() == list(range(50))
+
+def test_buckets_hold_min_max_mean_count():
+    tier = RollupTier(10.0, capacity=4)
+    for t, value in [(0, 70), (3, 74), (9.9, 72), (10, 80), (25, 60), (27, 62)]:
+        tier.add(t, value)
+    starts, minimums, maximums, means, counts = tier.buckets(0, 100)
+    assert starts.tolist() == [0, 10, 20]
+    assert minimums.tolist() == [70, 80, 60] and maximums.tolist() == [74, 80, 62]
+    assert means.tolist() == [72, 80, 61] and counts.tolist() == [3, 1, 2]
+
+def test_ring_is_bounded():
+    tier = RollupTier(1.0, capacity=5)
+    for t in range(20):
+        tier.add(t, 60 + t)
+    starts = tier.buckets(0, 100)[0]
+    assert starts.tolist() == [14, 15, 16, 17, 18, 19]  # Five closed buckets and the open one
+    assert tier.covers(14) and not tier.covers(10)
+
+def test_memory_follows_recorded_history():
+    rollups = HistoryRollups(((1.0, 3600), (10.0, 2160), (60.0, 1440)))
+    rollups.add(0.5, 70)
+    assert all(len(tier.starts) == 0 for tier in rollups.tiers)  # Only the open bucket so far
+    for t in range(1, 100):
+        rollups.add(t + 0.5, 70)
+    assert [len(tier.starts) for tier in rollups.tiers] == [99, 9, 1]
+
+    tier = RollupTier(1.0, capacity=5)
+    for t in range(3):
+        tier.add(t, 60 + t)
+    assert tier.buckets(0, 100)[0].tolist() == [0, 1, 2] and tier.oldest() == 0
+    for t in range(3, 20):
+        tier.add(t, 60 + t)
+    assert len(tier.starts) == 5
+
+def test_range_query_picks_the_best_tier():
+    rollups = HistoryRollups(((1.0, 3600), (10.0, 2160), (60.0, 1440)))
+    end = 4 * 3600
+    for t in range(0, end):
+        rollups.add(t + 0.5, 70 + 10 * math.sin(t / 600))
+
+    last_hour = rollups.query(end - 3600, end, 500)
+    assert last_hour["resolution"] == 1.0 and len(last_hour["t"]) == 500
+    assert last_hour["t"][0] >= end - 3600
+
+    last_hour_coarse = rollups.query(end - 3600, end, 300)
+    assert last_hour_coarse["resolution"] == 10.0 and last_hour_coarse["buckets"] == 360
+
+    whole = rollups.query(0, end, 1000)
+    assert whole["resolution"] == 10.0  # The 1 s tier no longer covers the start
+    assert len(whole["t"]) == 1000 and whole["t"][0] == 0
+    assert min(whole["min"]) < 61 and max(whole["max"]) > 79
+
+if __name__ == "__main__":
+    test_lttb_matches_reference_and_keeps_spikes()
+    test_buckets_hold_min_max_mean_count()
+    test_ring_is_bounded()
+    test_memory_follows_recorded_history()
+    test_range_query_picks_the_best_tier()
+    print("✅ History rollup tests passed")
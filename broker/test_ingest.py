@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for the UDP ingest path: the ingest queue and its consumer task
+"""
+
+import asyncio
+import json
+from bpm_broker import BPMBroker, ClientSession, IngestQueue
+from bpm_codecs import available_codecs, get_codec
+from bpm_metrics import BrokerMetrics
+
+ADDR = ("10.0.0.1", 4321)
+
+def datagram(packet: dict) -> tuple:
+    return (json.dumps(packet).encode("utf-8"), ADDR)
+
+def test_drain_returns_batches_in_arrival_order():
+    queue = IngestQueue(max_size=100)
+    for i in range(10):
+        assert queue.put((f"packet {i}", ADDR))
+    first = queue.drain(max_items=4)
+    assert [data for data, _ in first] == ["packet 0", "packet 1", "packet 2", "packet 3"]
+    assert [data for data, _ in queue.drain()] == [f"packet {i}" for i in range(4, 10)]
+    assert queue.drain() == []
+    stats = queue.get_stats()
+    assert stats["batches"] == 2 and stats["max_batch"] == 6 and stats["depth"] == 0
+    assert stats["received"] == 10 and stats["high_water"] == 10
+
+def test_overflow_drops_and_counts():
+    metrics = BrokerMetrics()
+    oldest = IngestQueue(max_size=3, policy="drop_oldest", metrics=metrics)
+    for i in range(5):
+        assert oldest.put(i)
+    assert oldest.drain() == [2, 3, 4]
+    assert oldest.get_stats()["dropped"] == 2 and metrics.counters["ingest_dropped"] == 2
+
+    newest = IngestQueue(max_size=3, policy="drop_newest", metrics=metrics)
+    assert [newest.put(i) for i in range(5)] == [True, True, True, False, False]
+    assert newest.drain() == [0, 1, 2]
+    assert newest.get_stats()["dropped"] == 2 and metrics.counters["ingest_dropped"] == 4
+    assert metrics.stages["receive"].count == 6  # Queue wait of every drained datagram
+
+def test_consumer_publishes_a_batch_in_order():
+    async def run():
+        broker = BPMBroker()
+        published = []
+        publish_packet = broker.publish_packet
+
+        async def record(data):
+            published.append((data['user'], data['bpm_raw']))
+            await publish_packet(data)
+        broker.publish_packet = record
+        consumer = asyncio.create_task(broker.consume_udp_ingest())
+
+        readings = [(1, 70), (2, 80), (1, 71), (3, 90), (2, 81), (1, 72)]
+        for user_id, bpm in readings:
+            broker.ingest_queue.put(datagram({"user": user_id, "bpm": bpm}))
+        await asyncio.sleep(0.05)
+        assert published == [(user_id, float(bpm)) for user_id, bpm in readings]
+        assert broker.ingest_queue.get_stats()["batches"] == 1  # Everything that had arrived, in one drain
+        consumer.cancel()
+    asyncio.run(run())
+
+def test_unencodable_packet_does_not_stop_ingest():
+    async def run():
+        broker = BPMBroker()
+        codec = "orjson" if "orjson" in available_codecs() else "msgpack"
+        session = ClientSession(None, codec=get_codec(codec), max_size=10)
+        broker.websocket_clients = {"a": session}
+        consumer = asyncio.create_task(broker.consume_udp_ingest())
+
+        errors = broker.metrics.counters["processing_errors"]
+        broker.ingest_queue.put(datagram({"user": 1, "bpm": 70, "seq": 2 ** 70}))  # Too big for orjson/msgpack
+        broker.ingest_queue.put(datagram({"user": 2, "bpm": 72}))
+        await asyncio.sleep(0.05)
+        broker.ingest_queue.put(datagram({"user": 3, "bpm": 74}))
+        await asyncio.sleep(0.05)
+
+        assert not consumer.done()
+        assert broker.metrics.counters["processing_errors"] == errors + 1
+        assert sorted(broker.latest_data) == [2, 3]  # The bad packet is not kept as user 1's latest
+        assert len(session.queue) == 2
+        consumer.cancel()
+    asyncio.run(run())
+
+def test_consumer_survives_a_failing_batch():
+    async def run():
+        broker = BPMBroker()
+        consumer = asyncio.create_task(broker.consume_udp_ingest())
+        process_udp_batch = broker.process_udp_batch
+
+        async def fail_once(batch):
+            broker.process_udp_batch = process_udp_batch
+            raise RuntimeError("boom")
+        broker.process_udp_batch = fail_once
+
+        broker.ingest_queue.put(datagram({"user": 1, "bpm": 70}))
+        await asyncio.sleep(0.05)
+        broker.ingest_queue.put(datagram({"user": 2, "bpm": 72}))
+        await asyncio.sleep(0.05)
+        assert not consumer.done() and list(broker.latest_data) == [2]
+        consumer.cancel()
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_drain_returns_batches_in_arrival_order()
+    test_overflow_drops_and_counts()
+    test_consumer_publishes_a_batch_in_order()
+    test_unencodable_packet_does_not_stop_ingest()
+    test_consumer_survives_a_failing_batch()
+    print("✅ Ingest tests passed")
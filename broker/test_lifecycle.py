@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for idle-user eviction and the cap on tracked users
+"""
+
+import asyncio
+import json
+import logging
+from bpm_broker import BPMBroker, ClientSession
+from bpm_engine import VectorSmoothingEngine
+from bpm_lifecycle import UserLifecycle
+from bpm_logging import setup_logging
+
+logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+logging.getLogger("bpm_engine").setLevel(logging.WARNING)
+
+ADDR = ("192.168.1.101", 4210)
+
+def test_stale_then_evicted():
+    lifecycle = UserLifecycle(stale_after=10, evict_after=60, max_users=100)
+    lifecycle.touch(1, now=0)
+    lifecycle.touch(2, now=0)
+    lifecycle.touch(2, now=8)
+
+    assert lifecycle.sweep(now=5) == ([], [])
+    assert lifecycle.sweep(now=12) == ([1], [])
+    assert lifecycle.sweep(now=20) == ([2], [])  # User 2's first deadline was pushed back
+
+    lifecycle.touch(1, now=30)  # Back before eviction
+    assert lifecycle.stale == {2}
+    assert lifecycle.sweep(now=68) == ([1], [2])
+    assert lifecycle.sweep(now=100) == ([], [1])
+    assert lifecycle.get_stats()["tracked"] == 0
+
+def test_cap_evicts_least_recently_seen():
+    lifecycle = UserLifecycle(stale_after=10, evict_after=60, max_users=3)
+    for user_id in (1, 2, 3):
+        lifecycle.touch(user_id, now=user_id)
+    lifecycle.touch(1, now=4)
+    assert lifecycle.touch(4, now=5) == [2]
+    assert list(lifecycle.last_seen) == [3, 1, 4]
+
+    # An evicted user that comes back is tracked from scratch
+    assert lifecycle.touch(2, now=6) == [3]
+    assert lifecycle.sweep(now=14) == ([1], [])
+    assert lifecycle.sweep(now=16) == ([4, 2], [])
+
+def test_released_engine_slot_starts_clean():
+    engine = VectorSmoothingEngine(0.3, 10, 40, 200, capacity=2)
+    engine.apply_batch([{"user": 1, "bpm": 70}, {"user": 2, "bpm": 80}], [ADDR, ADDR])
+    slot = engine.slots[1]
+    engine.release(1)
+    results = engine.apply_batch([{"user": 3, "bpm": 90}], [ADDR])
+    assert engine.slots[3] == slot and engine.capacity == 2
+    assert results[0]["bpm"] == 90.0 and engine.history(slot) == [90.0]
+
+def test_broker_evicts_all_user_state():
+    """Eviction clears every per-user structure and notifies subscribed clients"""
+    async def run():
+        broker = BPMBroker()
+        session = ClientSession(None, max_size=10)
+        other = ClientSession(None, max_size=10)
+        other.subscribe([2], None, None)
+        broker.websocket_clients = {"a": session, "b": other}
+
+        for user_id in (1, 2):
+            await broker.publish_packet(broker.apply_packet({"user": user_id, "bpm": 70}, ADDR))
+        sample_filter = setup_logging()  # The broker's per-user log sampling
+        record = logging.LogRecord("bpm_broker", logging.INFO, __file__, 1, "User 1", (), None)
+        record.user_id = 1
+        sample_filter.filter(record)
+        broker.evict_users([1], "idle")
+
+        assert list(broker.latest_data) == [2]
+        assert 1 not in broker.user_smoothers and 1 not in broker.user_finger_status
+        assert 1 not in broker.metrics.packets_by_user
+        assert 1 not in sample_filter.next_allowed
+        events = [json.loads(message) for _, message, _ in session.queue]
+        assert events[-1]["type"] == "user_evicted" and events[-1]["user_id"] == 1
+        assert all(json.loads(message).get("type") != "user_evicted" for _, message, _ in other.queue)
+    asyncio.run(run())
+
+def test_invalid_readings_create_no_user_state():
+    """Readings rejected by apply_packet must not leave untracked per-user state behind"""
+    async def run():
+        broker = BPMBroker()
+        batch = [(json.dumps({"user": user_id, "bpm": "x"}).encode("utf-8"), ADDR) for user_id in range(500)]
+        await broker.process_udp_batch(batch)
+        assert broker.metrics.counters["processing_errors"] == 500
+        assert not broker.user_finger_status and not broker.user_smoothers and not broker.latest_data
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_stale_then_evicted()
+    test_cap_evicts_least_recently_seen()
+    test_released_engine_slot_starts_clean()
+    test_broker_evicts_all_user_state()
+    test_invalid_readings_create_no_user_state()
+    print("✅ User lifecycle tests passed")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for packet loss accounting and device clock/latency estimation
+"""
+
+import asyncio
+import numpy as np
+from bpm_link import SequenceTracker, ClockTracker
+from bpm_broker import BPMBroker
+from bpm_packet import encode_packet
+
+def test_loss_reordering_and_duplicates():
+    tracker = SequenceTracker()
+    for seq in [10, 11, 13, 12, 12, 14, 17]:  # 12 late, 12 again, 15 and 16 lost
+        tracker.observe(seq)
+    stats = tracker.get_stats()
+    assert (stats["expected"], stats["received"], stats["lost"]) == (8, 6, 2)
+    assert stats["reordered"] == 1 and stats["duplicates"] == 1
+
+def test_wraparound_and_restart():
+    tracker = SequenceTracker()
+    for seq in [65533, 65534, 65535, 0, 1, 3]:
+        tracker.observe(seq)
+    stats = tracker.get_stats()
+    assert (stats["expected"], stats["lost"], stats["restarts"]) == (7, 1, 0)
+
+    tracker.observe(30000)  # Device rebooted with a different counter
+    stats = tracker.get_stats()
+    assert (stats["expected"], stats["lost"], stats["restarts"]) == (1, 0, 1)
+
+def test_clock_drift_and_latency():
+    rng = np.random.default_rng(0)
+    clock = ClockTracker()
+    for i in range(600):
+        received = 1.7e9 + i * (1 + 50e-6) + 0.004 + rng.exponential(0.010)  # Device clock 50 ppm slow
+        clock.observe(5000 + i * 1000, received)
+    stats = clock.get_stats()
+    assert abs(stats["drift_ppm"] - 50) < 5
+    assert 4 < stats["latency_ms"]["p50"] < 10  # Median of the exponential part, ~6.9 ms
+    assert stats["jitter_ms"] > 0 and stats["resets"] == 0
+
+    clock.observe(2000, 1.7e9 + 601)  # Rebooted: millis() starts again
+    assert clock.get_stats()["resets"] == 1 and clock.get_stats()["latency_ms"]["last"] == 0
+
+def test_broker_reports_link_quality():
+    async def run():
+        broker = BPMBroker()
+        batch = [(encode_packet(4, 70, 1000 * i, seq=i), ("10.0.0.4", 1234)) for i in range(20) if i != 7]
+        await broker.process_udp_batch(batch)
+        report = broker.build_latency_report()
+        assert report["devices"][4]["sequence"]["lost"] == 1
+        assert report["devices"][4]["latency_ms"] is not None
+        assert "smoothing" in report["broker"]
+        assert broker.get_metrics_gauges()["link_loss_rate_max"] == 0.05
+        broker.evict_users([4], "test")
+        assert broker.build_latency_report()["devices"] == {}
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_loss_reordering_and_duplicates()
+    test_wraparound_and_restart()
+    test_clock_drift_and_latency()
+    test_broker_reports_link_quality()
+    print("✅ Link quality tests passed")
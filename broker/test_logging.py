@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for per-user log sampling
+"""
+
+import logging
+from bpm_logging import UserSampleFilter, SampledFormatter
+
+def make_record(user_id=None, level=logging.INFO) -> logging.LogRecord:
+    record = logging.LogRecord("bpm_broker", level, __file__, 1, "User %s: %.1f BPM", (user_id, 72.0), None)
+    if user_id is not None:
+        record.user_id = user_id
+    return record
+
+def test_one_line_per_user_per_interval():
+    """Only the first record per user passes within the interval; the next reports the gap"""
+    sample_filter = UserSampleFilter(interval=60.0)
+    assert sample_filter.filter(make_record(1))
+    assert sample_filter.filter(make_record(2))
+    assert not any(sample_filter.filter(make_record(1)) for _ in range(5))
+    assert sample_filter.total_suppressed == 5
+
+    sample_filter.next_allowed[1] = 0.0  # Interval elapsed
+    record = make_record(1)
+    assert sample_filter.filter(record)
+    assert SampledFormatter("%(message)s").format(record) == "User 1: 72.0 BPM (+5 similar lines suppressed)"
+
+def test_untagged_and_errors_are_never_sampled():
+    sample_filter = UserSampleFilter(interval=60.0)
+    assert all(sample_filter.filter(make_record()) for _ in range(3))
+    assert all(sample_filter.filter(make_record(1, logging.ERROR)) for _ in range(3))
+
+def test_forgotten_users_leave_no_state():
+    sample_filter = UserSampleFilter(interval=60.0)
+    sample_filter.filter(make_record(1))
+    sample_filter.filter(make_record(1))
+    sample_filter.forget_user(1)
+    assert sample_filter.next_allowed == {} and sample_filter.suppressed == {}
+    assert sample_filter.filter(make_record(1))  # A returning user starts afresh
+
+if __name__ == "__main__":
+    test_one_line_per_user_per_interval()
+    test_untagged_and_errors_are_never_sampled()
+    test_forgotten_users_leave_no_state()
+    print("✅ Logging tests passed")
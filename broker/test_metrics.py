@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the broker pipeline metrics
+"""
+
+from bpm_metrics import Histogram, BrokerMetrics
+
+def test_histogram_buckets_and_quantiles():
+    """Values land in the first bucket whose bound is >= the value"""
+    histogram = Histogram((0.001, 0.01, 0.1))
+    for value in (0.0005, 0.001, 0.002, 0.05, 5.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.count == 5
+    assert histogram.quantile(0.4) == 0.001
+    assert histogram.quantile(0.6) == 0.01
+    assert histogram.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) is None
+
+def test_prometheus_text():
+    """Histogram buckets are cumulative and end with +Inf"""
+    metrics = BrokerMetrics()
+    metrics.observe("parse", 0.00002)
+    metrics.observe("parse", 0.3)
+    metrics.count("invalid_json")
+    metrics.count_packet(7)
+
+    text = metrics.render_prometheus({"connected_clients": 2})
+    lines = text.splitlines()
+    assert 'bpm_broker_stage_seconds_bucket{stage="parse",le="2.5e-05"} 1' in lines
+    assert 'bpm_broker_stage_seconds_bucket{stage="parse",le="0.5"} 2' in lines
+    assert 'bpm_broker_stage_seconds_bucket{stage="parse",le="+Inf"} 2' in lines
+    assert 'bpm_broker_stage_seconds_count{stage="smoothing"} 0' in lines
+    assert 'bpm_broker_packets_total{user="7"} 1' in lines
+    assert "bpm_broker_invalid_json_total 1" in lines
+    assert "bpm_broker_connected_clients 2" in lines
+
+def test_prometheus_escapes_user_labels():
+    """A hostile user id cannot break out of its label or add lines"""
+    metrics = BrokerMetrics()
+    metrics.count_packet('a"} 1\nbpm_broker_fake_total{x="\\')
+
+    lines = metrics.render_prometheus().splitlines()
+    assert 'bpm_broker_packets_total{user="a\\"} 1\\nbpm_broker_fake_total{x=\\"\\\\"} 1' in lines
+    assert not any(line.startswith("bpm_broker_fake_total") for line in lines)
+
+if __name__ == "__main__":
+    test_histogram_buckets_and_quantiles()
+    test_prometheus_text()
+    test_prometheus_escapes_user_labels()
+    print("✅ Metrics tests passed")
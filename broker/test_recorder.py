@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the memory-mapped session recorder
+"""
+
+import math
+import os
+import tempfile
+from bpm_recorder import SessionRecorder, SessionReader, FLAG_NO_HEART_RATE
+
+def make_packet(user_id: int, t: float, bpm, raw=None) -> dict:
+    return {
+        "user": user_id,
+        "bpm": bpm,
+        "bpm_raw": bpm if raw is None else raw,
+        "bpm_smoothed": bpm != "--",
+        "no_heart_rate": bpm == "--",
+        "finger_detected": True,
+        "timestamp": int(t * 1000),
+        "signal_strength": -50,
+        "ir_value": 90000,
+        "red_value": 80000,
+        "server_timestamp": t
+    }
+
+def test_record_and_read_back():
+    """Samples come back in order across segment rollovers"""
+    with tempfile.TemporaryDirectory() as base_dir:
+        recorder = SessionRecorder(base_dir, "session_test", segment_records=16)
+        recorder.start()
+        for i in range(100):
+            recorder.record(make_packet(1, 1000.0 + i, 60.0 + i % 10))
+            if i % 2 == 0:
+                recorder.record(make_packet(2, 1000.0 + i, 70.0))
+        recorder.record(make_packet(2, 2000.0, "--", raw=0))
+        recorder.stop()
+
+        reader = SessionReader(os.path.join(base_dir, "session_test"))
+        assert sorted(reader.users()) == [1, 2]
+        assert len(reader.segments(1)) == 7  # 100 records / 16 per segment
+
+        records = list(reader.iter_records(1))
+        assert [r.server_timestamp for r in records] == [1000.0 + i for i in range(100)]
+        assert records[13].smoothed_bpm == 63.0
+        assert records[13].ir_value == 90000
+
+        last = list(reader.iter_records(2))[-1]
+        assert math.isnan(last.smoothed_bpm)
+        assert last.raw_bpm == 0.0
+        assert last.flags & FLAG_NO_HEART_RATE
+
+def test_time_range_and_merge():
+    """Range queries skip samples outside the range; merged output is time ordered"""
+    with tempfile.TemporaryDirectory() as base_dir:
+        recorder = SessionRecorder(base_dir, "session_test", segment_records=8)
+        recorder.start()
+        for i in range(40):
+            recorder.record(make_packet(1 + i % 2, 100.0 + i, 75.0))
+        recorder.stop()
+
+        reader = SessionReader(os.path.join(base_dir, "session_test"))
+        in_range = list(reader.iter_records(1, start=110.0, end=120.0))
+        assert [r.server_timestamp for r in in_range] == [110.0, 112.0, 114.0, 116.0, 118.0, 120.0]
+
+        merged = list(reader.iter_session())
+        assert [record.server_timestamp for _, record in merged] == [100.0 + i for i in range(40)]
+        assert [user_id for user_id, _ in merged[:4]] == [1, 2, 1, 2]
+
+if __name__ == "__main__":
+    test_record_and_read_back()
+    test_time_range_and_merge()
+    print("✅ Recorder tests passed")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for replaying recorded sessions
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from bpm_broker import BPMBroker
+from bpm_recorder import SessionRecorder, RECORD_SIZE
+from bpm_replay import load_session, replay_inject, replay_udp
+
+logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+
+SPACING = 0.05  # Seconds between recorded samples
+SAMPLES = 10
+
+def make_packet(user_id: int, t: float, bpm: float) -> dict:
+    return {
+        "user": user_id,
+        "bpm": bpm,
+        "bpm_raw": bpm,
+        "bpm_smoothed": True,
+        "no_heart_rate": False,
+        "finger_detected": True,
+        "timestamp": int(t * 1000),
+        "signal_strength": -50,
+        "ir_value": 90000,
+        "red_value": 80000,
+        "server_timestamp": t
+    }
+
+def record_session(base_dir: str, segment_records: int = 1024) -> str:
+    """Two users alternating, SPACING seconds apart"""
+    recorder = SessionRecorder(base_dir, "session_test", segment_records=segment_records)
+    recorder.start()
+    for i in range(SAMPLES):
+        recorder.record(make_packet(1 + i % 2, 1000.0 + i * SPACING, 60.0 + i))
+    recorder.stop()
+    return os.path.join(base_dir, "session_test")
+
+def replay_and_receive(session_dir: str, speed: float) -> list:
+    """Replay over UDP to a local socket; returns (arrival time, packet) pairs"""
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(5)
+    arrivals = []
+
+    def receive():
+        while len(arrivals) < SAMPLES:
+            payload = receiver.recv(65535)
+            arrivals.append((time.perf_counter(), json.loads(payload)))
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+    sent = replay_udp(load_session(session_dir), "127.0.0.1", receiver.getsockname()[1], speed)
+    thread.join()
+    receiver.close()
+    assert sent == SAMPLES
+    return arrivals
+
+def test_replayed_packets_match_the_recording():
+    with tempfile.TemporaryDirectory() as base_dir:
+        packets = [json.loads(payload) for _, payload, _ in load_session(record_session(base_dir))]
+        assert [(p["user"], p["bpm"], p["timestamp"]) for p in packets] == [
+            (1 + i % 2, 60.0 + i, int((1000.0 + i * SPACING) * 1000)) for i in range(SAMPLES)]
+        assert all(p["finger_detected"] and p["signal_strength"] == -50 and p["ir_value"] == 90000
+                   for p in packets)
+
+def test_replay_keeps_the_spacing_at_real_and_accelerated_speed():
+    with tempfile.TemporaryDirectory() as base_dir:
+        session_dir = record_session(base_dir)
+        for speed in (1.0, 5.0):
+            arrivals = replay_and_receive(session_dir, speed)
+            assert [packet["bpm"] for _, packet in arrivals] == [60.0 + i for i in range(SAMPLES)]
+            first = arrivals[0][0]
+            for i, (arrived, _) in enumerate(arrivals):
+                due = i * SPACING / speed
+                assert due - 0.005 <= arrived - first <= due + 0.1, (speed, i, arrived - first)
+
+def test_inject_feeds_an_in_process_broker():
+    with tempfile.TemporaryDirectory() as base_dir:
+        broker = BPMBroker()
+        stats = asyncio.run(replay_inject(load_session(record_session(base_dir)), 0.0, broker))
+        assert stats["injected"] == SAMPLES and stats["users"] == 2
+        assert broker.latest_data[1]["bpm_raw"] == 68.0 and broker.latest_data[2]["bpm_raw"] == 69.0
+
+def test_truncated_segment_replays_the_complete_records():
+    with tempfile.TemporaryDirectory() as base_dir:
+        session_dir = record_session(base_dir, segment_records=2)  # User 1: three segments of 2, 2 and 1
+        user_dir = os.path.join(session_dir, "user_1")
+        segments = sorted(os.listdir(user_dir))
+        assert len(segments) == 3
+
+        # A crash mid-write: half a record at the end of one segment, another cut to nothing
+        with open(os.path.join(user_dir, segments[0]), "r+b") as f:
+            f.truncate(RECORD_SIZE + RECORD_SIZE // 2)
+        with open(os.path.join(user_dir, segments[1]), "r+b") as f:
+            f.truncate(0)
+
+        user_one = [json.loads(payload)["bpm"] for _, payload, _ in load_session(session_dir)
+                    if json.loads(payload)["user"] == 1]
+        assert user_one == [60.0, 68.0]
+
+if __name__ == "__main__":
+    test_replayed_packets_match_the_recording()
+    test_replay_keeps_the_spacing_at_real_and_accelerated_speed()
+    test_inject_feeds_an_in_process_broker()
+    test_truncated_segment_replays_the_complete_records()
+    print("✅ Session replay tests passed")
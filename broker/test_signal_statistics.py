@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Check that the incremental signal statistics match a full NumPy recomputation
+"""
+
+import random
+import numpy as np
+from bpm_broker import RollingStatistics, SignalSmoother, HISTORY_LENGTH
+
+def numpy_statistics(values) -> dict:
+    """Reference implementation: rebuild the window and recompute everything"""
+    history_array = np.array(values)
+    return {
+        "mean": float(np.mean(history_array)),
+        "std": float(np.std(history_array)),
+        "min": float(np.min(history_array)),
+        "max": float(np.max(history_array)),
+        "last": float(history_array[-1])
+    }
+
+def assert_equivalent(actual: dict, expected: dict):
+    assert actual.keys() == expected.keys()
+    for field, value in expected.items():
+        assert abs(actual[field] - value) < 1e-9, f"{field}: {actual[field]} != {value}"
+
+def test_rolling_statistics_match_numpy():
+    """Every prefix of a long random walk matches NumPy on the same window"""
+    rng = random.Random(42)
+    stats = RollingStatistics(HISTORY_LENGTH)
+    values = []
+    bpm = 75.0
+
+    for _ in range(5000):
+        bpm = min(200.0, max(40.0, bpm + rng.gauss(0, 3.0)))
+        stats.add(bpm)
+        values.append(bpm)
+        assert_equivalent(stats.get_statistics(), numpy_statistics(values[-HISTORY_LENGTH:]))
+
+def test_rolling_statistics_constant_input():
+    """Constant input gives zero std and equal min/max"""
+    stats = RollingStatistics(10)
+    for _ in range(50):
+        stats.add(70.0)
+    result = stats.get_statistics()
+    assert result["std"] == 0.0
+    assert result["min"] == result["max"] == result["mean"] == 70.0
+
+def test_smoother_statistics_match_history():
+    """SignalSmoother statistics agree with its own history across session resets"""
+    rng = random.Random(7)
+    smoother = SignalSmoother()
+    assert smoother.get_statistics() == {}
+
+    for i in range(1000):
+        smoother.add_sample(rng.uniform(30, 210))
+        if i % 250 == 0:
+            smoother.reset_for_new_session()
+        assert_equivalent(smoother.get_statistics(), numpy_statistics(smoother.get_history()))
+
+if __name__ == "__main__":
+    test_rolling_statistics_match_numpy()
+    test_rolling_statistics_constant_input()
+    test_smoother_statistics_match_history()
+    print("✅ Incremental statistics match NumPy")
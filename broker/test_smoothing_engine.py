@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Check that the vectorized smoothing engine gives exactly the per-packet results
+"""
+
+import logging
+import random
+from bpm_broker import BPMBroker, SMOOTHING_ALPHA, HISTORY_LENGTH, MIN_BPM, MAX_BPM
+from bpm_engine import VectorSmoothingEngine
+
+logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+logging.getLogger("bpm_engine").setLevel(logging.WARNING)
+
+ADDR = ("192.168.1.101", 4210)
+PER_PACKET_FIELDS = ("server_timestamp", "received_at")  # Set once per batch by the engine
+
+def make_stream(count: int, users: int, seed: int) -> list:
+    """Random packets with finger drop-outs, missing beats and outliers"""
+    rng = random.Random(seed)
+    bpm = {user: rng.uniform(60, 90) for user in range(1, users + 1)}
+    packets = []
+    for _ in range(count):
+        user = rng.randint(1, users)
+        bpm[user] = min(180.0, max(45.0, bpm[user] + rng.gauss(0, 2.0)))
+        roll = rng.random()
+        if roll < 0.05:
+            value = 0
+        elif roll < 0.08:
+            value = rng.choice([20, 250])
+        else:
+            value = round(bpm[user], 1)
+        packet = {"user": user, "bpm": value, "timestamp": len(packets)}
+        if rng.random() < 0.1:
+            packet["finger_detected"] = False
+        packets.append(packet)
+    return packets
+
+def strip(data):
+    return None if data is None else {k: v for k, v in data.items() if k not in PER_PACKET_FIELDS}
+
+def test_engine_matches_per_packet_path():
+    """Smoothed values, flags and statistics are identical for random batch sizes"""
+    rng = random.Random(3)
+    stream = make_stream(6000, users=12, seed=11)
+
+    broker = BPMBroker()
+    expected = [strip(broker.apply_packet(dict(packet), ADDR)) for packet in stream]
+
+    engine = VectorSmoothingEngine(SMOOTHING_ALPHA, HISTORY_LENGTH, MIN_BPM, MAX_BPM, capacity=4)
+    actual = []
+    position = 0
+    while position < len(stream):
+        size = rng.choice([1, 3, 17, 64, 300])
+        batch = [dict(packet) for packet in stream[position:position + size]]
+        actual.extend(strip(data) for data in engine.apply_batch(batch, [ADDR] * len(batch)))
+        position += size
+
+    assert actual == expected
+
+    for user_id, smoother in broker.user_smoothers.items():
+        view = engine.get_view(user_id)
+        assert view.get_history() == smoother['smoother'].get_history()
+        assert view.get_statistics() == smoother['smoother'].get_statistics()
+
+def test_engine_rejects_non_numeric_bpm():
+    engine = VectorSmoothingEngine(SMOOTHING_ALPHA, HISTORY_LENGTH, MIN_BPM, MAX_BPM)
+    results = engine.apply_batch([{"user": 1, "bpm": "fast"}, {"user": 1, "bpm": 70}], [ADDR, ADDR])
+    assert results[0] is None
+    assert results[1]["bpm"] == 70.0
+
+if __name__ == "__main__":
+    test_engine_matches_per_packet_path()
+    test_engine_rejects_non_numeric_bpm()
+    print("✅ Vector engine matches the per-packet path")
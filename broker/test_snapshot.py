@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the pre-encoded status/statistics/bootstrap snapshots
+"""
+
+import asyncio
+import json
+import logging
+from bpm_broker import BPMBroker
+from bpm_codecs import SnapshotMessage, get_codec
+
+logging.getLogger("bpm_broker").setLevel(logging.WARNING)
+
+ADDR = ("192.168.1.101", 4210)
+
+def test_rebuilt_once_per_version_and_interval():
+    builds = []
+    def build(version):
+        builds.append(version)
+        return {"type": "status_response", "snapshot": version}
+
+    snapshot = SnapshotMessage(build, interval=60.0)
+    first = snapshot.get(1)
+    assert snapshot.get(1) is first
+    assert snapshot.get(2) is first  # Changed, but the interval hasn't passed
+
+    snapshot.invalidate()
+    assert snapshot.get(2).data["snapshot"] == 2
+
+    snapshot.interval = 0.0
+    assert snapshot.get(2).data["snapshot"] == 2
+    assert snapshot.get(3).data["snapshot"] == 3
+    assert builds == [1, 2, 3]
+    assert snapshot.get_stats() == {"version": 3, "builds": 3, "hits": 3}
+
+def test_encoded_once_for_many_requests():
+    snapshot = SnapshotMessage(lambda version: {"snapshot": version})
+    codec = get_codec("json")
+    payloads = {id(snapshot.get(7).encode(codec)) for _ in range(40)}
+    assert len(payloads) == 1
+
+def test_broker_snapshots_follow_state():
+    async def run():
+        broker = BPMBroker()
+        for user_id in (1, 2):
+            await broker.publish_packet(broker.apply_packet({"user": user_id, "bpm": 70}, ADDR))
+
+        bootstrap = broker.bootstrap_snapshot.get(broker.state_version)
+        assert bootstrap.data["type"] == "frame" and set(bootstrap.data["users"]) == {1, 2}
+        status = json.loads(broker.status_snapshot.get(broker.state_version).encode(get_codec()))
+        assert status["active_devices"] == [1, 2]
+
+        # Eviction and new users rebuild immediately, even within the interval
+        for snapshot in (broker.bootstrap_snapshot, broker.status_snapshot, broker.statistics_snapshot):
+            snapshot.interval = 60.0
+        broker.evict_users([1], "idle")
+        assert set(broker.bootstrap_snapshot.get(broker.state_version).data["users"]) == {2}
+        statistics = broker.statistics_snapshot.get(broker.state_version).data
+        assert list(statistics["user_statistics"]) == [2]
+
+        await broker.publish_packet(broker.apply_packet({"user": 3, "bpm": 75}, ADDR))
+        assert set(broker.bootstrap_snapshot.get(broker.state_version).data["users"]) == {2, 3}
+        status = json.loads(broker.status_snapshot.get(broker.state_version).encode(get_codec()))
+        assert status["active_devices"] == [2, 3]
+
+        # A new reading from a known user can wait for the interval
+        bootstrap = broker.bootstrap_snapshot.get(broker.state_version)
+        await broker.publish_packet(broker.apply_packet({"user": 3, "bpm": 90}, ADDR))
+        assert broker.bootstrap_snapshot.get(broker.state_version) is bootstrap
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_rebuilt_once_per_version_and_interval()
+    test_encoded_once_for_many_requests()
+    test_broker_snapshots_follow_state()
+    print("✅ Snapshot tests passed")
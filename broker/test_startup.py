@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the broker's startup: heavy dependencies stay unloaded until used
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import bpm_broker
+
+def loaded_after(code: str) -> list:
+    """Heavy modules imported by running `code` in a fresh interpreter"""
+    check = code + "\nimport sys, json; print(json.dumps([m for m in ('numpy', 'scipy') if m in sys.modules]))"
+    output = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(bpm_broker.__file__))).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_default_startup_skips_numpy_and_scipy():
+    assert loaded_after("import bpm_broker; bpm_broker.BPMBroker()") == []
+    assert loaded_after("import bpm_broker, bpm_filters; bpm_filters.build_filter_chain(('ema',))"
+                        ".process_one(72.0)") == []
+
+def test_features_load_their_dependencies_on_first_use():
+    assert "numpy" in loaded_after("import bpm_broker; bpm_broker.SMOOTHING_ENGINE = 'vector'; bpm_broker.BPMBroker()")
+    assert "scipy" in loaded_after("import bpm_filters; bpm_filters.build_filter_chain(('butterworth', 'ema'))")
+
+def test_listening_event_and_lazy_sync_engine():
+    async def run_broker():
+        ports = (bpm_broker.UDP_HOST, bpm_broker.UDP_PORT, bpm_broker.WEBSOCKET_HOST,
+                 bpm_broker.WEBSOCKET_PORT, bpm_broker.METRICS_ENABLED)
+        bpm_broker.UDP_HOST = bpm_broker.WEBSOCKET_HOST = "127.0.0.1"
+        bpm_broker.UDP_PORT, bpm_broker.WEBSOCKET_PORT, bpm_broker.METRICS_ENABLED = 18898, 16799, False
+        try:
+            broker = bpm_broker.BPMBroker()
+            assert broker.sync_engine is None and broker.build_status(0)["ppg"] is None
+            task = asyncio.create_task(broker.run())
+            await asyncio.wait_for(broker.listening.wait(), 10)
+            assert broker.udp_transport is not None
+            for _ in range(100):
+                if broker.sync_engine is not None:
+                    break
+                await asyncio.sleep(0.05)
+            assert broker.sync_engine is not None  # Built by the synchrony ticker once listening
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        finally:
+            (bpm_broker.UDP_HOST, bpm_broker.UDP_PORT, bpm_broker.WEBSOCKET_HOST,
+             bpm_broker.WEBSOCKET_PORT, bpm_broker.METRICS_ENABLED) = ports
+    asyncio.run(run_broker())
+
+if __name__ == "__main__":
+    test_default_startup_skips_numpy_and_scipy()
+    test_features_load_their_dependencies_on_first_use()
+    test_listening_event_and_lazy_sync_engine()
+    print("✅ Startup tests passed")
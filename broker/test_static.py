@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for serving the dashboard on the broker's WebSocket port
+"""
+
+import asyncio
+import gzip
+from types import SimpleNamespace
+from bpm_broker import DASHBOARD_DIR
+from bpm_static import DashboardAssets
+
+def test_serves_cached_files_with_etag_and_gzip():
+    assets = DashboardAssets(DASHBOARD_DIR)
+    response = assets.respond("/", {"Accept-Encoding": "gzip, deflate"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert b"<html" in gzip.decompress(response.body).lower()
+
+    etag = response.headers["ETag"]
+    again = assets.respond("/index.html?v=2", {"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304 and again.body == b""
+    assert again.headers["ETag"] == etag and again.headers["Vary"] == "Accept-Encoding"
+
+    plain = assets.respond("/dashboard.js", {})
+    assert plain.status_code == 200 and "Content-Encoding" not in plain.headers
+
+def test_each_encoding_has_its_own_etag():
+    assets = DashboardAssets(DASHBOARD_DIR)
+    identity = assets.respond("/", {})
+    gzipped = assets.respond("/", {"Accept-Encoding": "gzip"})
+    assert identity.headers["ETag"] != gzipped.headers["ETag"]
+    assert identity.headers["Vary"] == gzipped.headers["Vary"] == "Accept-Encoding"
+
+    # A cached gzip body must not be revalidated for a client that can't decode it
+    assert assets.respond("/", {"If-None-Match": gzipped.headers["ETag"]}).status_code == 200
+    assert assets.respond("/", {"If-None-Match": identity.headers["ETag"]}).status_code == 304
+
+def test_stays_inside_the_dashboard_directory():
+    assets = DashboardAssets(DASHBOARD_DIR)
+    assert assets.respond("/../broker/bpm_broker.py", {}).status_code == 404
+    assert assets.respond("/%2e%2e/broker/bpm_broker.py", {}).status_code == 404
+    assert assets.respond("/missing.css", {}).status_code == 404
+
+def test_websocket_upgrades_pass_through():
+    assets = DashboardAssets(DASHBOARD_DIR)
+    upgrade = SimpleNamespace(path="/?codec=msgpack", headers={"Upgrade": "websocket"})
+    assert asyncio.run(assets.process_request(None, upgrade)) is None
+    page = SimpleNamespace(path="/", headers={})
+    response = asyncio.run(assets.process_request(None, page))
+    assert response.status_code == 200
+    assert response.headers["X-BPM-WebSocket"] == "same-origin"  # The dashboard connects back here
+
+if __name__ == "__main__":
+    test_serves_cached_files_with_etag_and_gzip()
+    test_each_encoding_has_its_own_etag()
+    test_stays_inside_the_dashboard_directory()
+    test_websocket_upgrades_pass_through()
+    print("✅ Dashboard serving tests passed")
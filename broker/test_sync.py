@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Check the incremental synchrony engine against a brute-force recomputation
+"""
+
+import math
+import random
+import numpy as np
+from bpm_sync import SynchronyEngine
+
+def brute_force(rows: list, a: int, b: int, max_lag: int, threshold: float, min_samples: int):
+    """Best lagged correlation and time in sync for users a and b over rows"""
+    best = (None, None)
+    for lag in range(-max_lag, max_lag + 1):
+        xs, ys = [], []
+        for s in range(len(rows)):
+            if 0 <= s - lag < len(rows):
+                x, y = rows[s][a], rows[s - lag][b]
+                if not (math.isnan(x) or math.isnan(y)):
+                    xs.append(x)
+                    ys.append(y)
+        if len(xs) < min_samples or np.std(xs) == 0 or np.std(ys) == 0:
+            continue
+        r = float(np.corrcoef(xs, ys)[0, 1])
+        if best[0] is None or r > best[0] + 1e-12:
+            best = (r, lag)
+
+    both = [(r[a], r[b]) for r in rows if not (math.isnan(r[a]) or math.isnan(r[b]))]
+    in_sync = sum(abs(x - y) <= threshold for x, y in both) / len(both) if both else None
+    return best, in_sync
+
+def test_incremental_matches_brute_force():
+    """Correlation, lag and time in sync match a full recomputation on every tick"""
+    rng = random.Random(5)
+    users = 6
+    engine = SynchronyEngine(window=20, max_lag=3, threshold=4.0, min_samples=5)
+    bpm = [rng.uniform(60, 90) for _ in range(users)]
+    rows = []
+
+    for tick in range(75):
+        readings = {}
+        row = []
+        for user in range(users):
+            bpm[user] += rng.gauss(0, 2)
+            present = rng.random() > 0.15 and not (user == 5 and tick < 30)  # User 5 joins late
+            row.append(bpm[user] if present else math.nan)
+            if present:
+                readings[user] = bpm[user]
+        rows.append(row)
+        engine.add(readings)
+
+        metrics = engine.compute()
+        if metrics is None:
+            continue
+        window_rows = rows[-20:]
+        for i, a in enumerate(metrics["users"]):
+            for j, b in enumerate(metrics["users"]):
+                if i >= j:
+                    continue
+                (r, lag), in_sync = brute_force(window_rows, a, b, 3, 4.0, 5)
+                if r is None:
+                    assert math.isnan(metrics["correlation"][i, j])
+                else:
+                    assert abs(metrics["correlation"][i, j] - r) < 1e-6, (tick, a, b)
+                    assert metrics["lag"][i, j] == lag, (tick, a, b)
+                if in_sync is None:
+                    assert math.isnan(metrics["in_sync"][i, j])
+                else:
+                    assert abs(metrics["in_sync"][i, j] - in_sync) < 1e-9
+
+def test_top_pairs_and_frame():
+    engine = SynchronyEngine(window=30, max_lag=2, threshold=4.0)
+    for tick in range(30):
+        base = 70 + 5 * math.sin(tick / 3)
+        engine.add({1: base, 2: base + 1.0, 3: base + 10.0, 4: 80 - 5 * math.sin(tick / 3)})
+
+    most = engine.top_pairs(k=2, metric="in_sync")
+    assert most[0]["users"] == [1, 2] and most[0]["in_sync"] == 1.0
+    least = engine.top_pairs(k=1, metric="correlation", most=False)
+    assert 4 in least[0]["users"] and least[0]["correlation"] < 0
+    closest = engine.top_pairs(k=1, metric="difference")
+    assert closest[0]["users"] == [1, 2] and closest[0]["difference"] == 1.0
+
+    frame = engine.frame()
+    assert frame["users"] == [1, 2, 3, 4]
+    assert len(frame["difference"]) == len(frame["correlation"]) == 6
+
+    engine.remove_user(3)
+    assert engine.frame()["users"] == [1, 2, 4]
+
+def test_capacity_shrinks_after_a_crowd_leaves():
+    """Slots are compacted once most users are gone; metrics are unchanged"""
+    engine = SynchronyEngine(window=30, max_lag=2, threshold=4.0, capacity=4)
+    for tick in range(30):
+        base = 70 + 5 * math.sin(tick / 3)
+        readings = {user: 100 + user for user in range(10, 74)}
+        readings.update({1: base, 2: base + 1.0})
+        engine.add(readings)
+    assert engine.capacity == 128
+
+    before = engine.top_pairs(k=1, metric="correlation")
+    engine.remove_users(list(range(10, 74)))
+    assert engine.capacity == 4 and engine.sums.shape == (3, 6, 4, 4)
+    assert engine.frame()["users"] == [1, 2]
+    after = engine.top_pairs(k=1, metric="correlation")
+    assert after[0]["users"] == [1, 2] and abs(after[0]["correlation"] - before[0]["correlation"]) < 1e-9
+
+    engine.add({1: 70.0, 2: 71.0, 3: 90.0})  # New users still find a slot
+    assert engine.frame()["users"] == [1, 2, 3]
+
+if __name__ == "__main__":
+    test_incremental_matches_brute_force()
+    test_top_pairs_and_frame()
+    test_capacity_shrinks_after_a_crowd_leaves()
+    print("✅ Synchrony engine matches brute force")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-process UDP ingest (INGEST_WORKERS > 0)
+"""
+
+import asyncio
+import json
+import socket
+import time
+from bpm_broker import BPMBroker, ClientSession
+from bpm_workers import IngestWorkerPool, _hand_off, _send_result, reuseport_supported, shard_for_user
+
+UDP_PORT = 18878
+
+def test_hand_off_never_blocks_on_a_full_inbox():
+    inbox, outbox = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    outbox.setblocking(False)
+    packet = {"user": 1, "bpm": 72, "padding": "x" * 1000}
+    start = time.monotonic()
+    results = [_hand_off(outbox, packet, ("10.0.0.1", 4321)) for _ in range(10000)]
+    assert time.monotonic() - start < 5  # Nobody reads the inbox: a blocking send would hang here
+    assert results[0] and not results[-1]
+    inbox.close()
+    outbox.close()
+
+def test_results_never_block_on_a_slow_main_process():
+    main, worker = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    worker.setblocking(False)
+    data = {"user": 1, "bpm": 72, "padding": "x" * 1000}
+    start = time.monotonic()
+    results = [_send_result(worker, data) for _ in range(10000)]
+    assert time.monotonic() - start < 5  # Nobody reads the results: a blocking send would hang here
+    assert results[0] and not results[-1]
+    main.close()
+    worker.close()
+
+def test_statistics_commands_in_worker_mode():
+    """The main process has no smoothers: statistics come from the results, history is refused"""
+    async def run():
+        worker = BPMBroker()
+        broker = BPMBroker()
+        broker.ingest_workers = IngestWorkerPool(2, "127.0.0.1", UDP_PORT, BPMBroker)  # Not started
+        session = ClientSession(None, max_size=10)
+        broker.websocket_clients = {"a": session}
+        for bpm in (70, 72):
+            await broker.publish_packet(worker.apply_packet({"user": 1, "bpm": bpm}, ("10.0.0.1", 4321)))
+        session.queue.clear()
+
+        await broker.handle_websocket_command("a", {"type": "get_all_statistics"})
+        await broker.handle_websocket_command("a", {"type": "get_signal_history", "user_id": 1})
+        statistics, history = [json.loads(message) for _, message, _ in session.queue]
+        assert statistics["user_statistics"] == {"1": {"mean": 71.0, "std": 1.0, "min": 70.0,
+                                                       "max": 72.0, "last": 72.0}}
+        assert "INGEST_WORKERS" in history["error"]
+    asyncio.run(run())
+
+def test_shards_are_stable_and_cover_every_worker():
+    assert shard_for_user(7, 4) == shard_for_user(7, 4)
+    assert {shard_for_user(user, 4) for user in range(100)} == {0, 1, 2, 3}
+
+def test_workers_deliver_every_user():
+    if not reuseport_supported():
+        return
+
+    async def run_pool():
+        loop = asyncio.get_running_loop()
+        received = []
+        pool = IngestWorkerPool(2, "127.0.0.1", UDP_PORT, BPMBroker)
+        pool.start(loop, received.append)
+        try:
+            await asyncio.sleep(0.5)  # Let the workers bind
+            sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            for user in range(1, 41):
+                packet = {"user": user, "bpm": 60 + user, "finger_detected": True}
+                sender.sendto(json.dumps(packet).encode("utf-8"), ("127.0.0.1", UDP_PORT))
+            sender.close()
+
+            deadline = time.monotonic() + 10
+            while len(received) < 40 and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            assert sorted(data["user"] for data in received) == list(range(1, 41))
+            assert all(data["bpm_raw"] == 60 + data["user"] for data in received)
+            stats = pool.get_stats()
+            assert stats["alive"] == 2 and stats["results_received"] == 40 and stats["handoff_dropped"] == 0
+            assert stats["results_dropped"] == 0
+        finally:
+            pool.stop()
+    asyncio.run(run_pool())
+
+def test_evicted_users_are_dropped_by_the_workers():
+    if not reuseport_supported():
+        return
+
+    async def run_pool():
+        received = []
+        pool = IngestWorkerPool(2, "127.0.0.1", UDP_PORT + 1, BPMBroker)
+        pool.start(asyncio.get_running_loop(), received.append)
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        async def send(bpm: int) -> dict:
+            count = len(received)
+            packet = {"user": 1, "bpm": bpm, "finger_detected": True}
+            sender.sendto(json.dumps(packet).encode("utf-8"), ("127.0.0.1", UDP_PORT + 1))
+            deadline = time.monotonic() + 10
+            while len(received) == count and time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+            return received[-1]
+
+        try:
+            await asyncio.sleep(0.5)  # Let the workers bind
+            for _ in range(5):
+                await send(60)
+            assert (await send(90))["signal_stats"]["min"] == 60.0  # Window holds the earlier readings
+
+            pool.evict_users([1])
+            await asyncio.sleep(0.1)
+            assert (await send(90))["signal_stats"]["min"] == 90.0  # A fresh smoother in the owning worker
+        finally:
+            sender.close()
+            pool.stop()
+    asyncio.run(run_pool())
+
+if __name__ == "__main__":
+    test_hand_off_never_blocks_on_a_full_inbox()
+    test_results_never_block_on_a_slow_main_process()
+    test_statistics_commands_in_worker_mode()
+    test_shards_are_stable_and_cover_every_worker()
+    test_workers_deliver_every_user()
+    test_evicted_users_are_dropped_by_the_workers()
+    print("✅ Ingest worker tests passed")
@@ -21,6 +21,57 @@ byte rateArrayIndex = 0;
 long lastBeat = 0; // Time at which the last beat occurred
 long deltaTime = 0;
 
+// Binary packet format - must match PACKET_STRUCT (+ PACKET_SEQ) in broker/bpm_packet.py
+#ifndef USE_BINARY_PACKETS
+#define USE_BINARY_PACKETS false
+#endif
+
+const uint8_t PACKET_MAGIC = 0xEC;
+const uint8_t PACKET_VERSION = 2;  // Version 2 = with sequence number
+const uint8_t FLAG_FINGER_DETECTED = 0x01;
+
+struct __attribute__((packed)) BPMPacket {
+    uint8_t magic;
+    uint8_t version;
+    uint16_t user;
+    int16_t bpm_x10;     // BPM in tenths
+    uint32_t timestamp;  // millis()
+    int8_t rssi;
+    uint8_t flags;
+    uint32_t ir_value;
+    uint32_t red_value;
+    uint16_t seq;        // Packet counter, lets the broker count lost packets
+};
+
+uint16_t packetSeq = 0; // Sequence number of the next BPM packet
+
+// Raw waveform packets - must match WAVEFORM_HEADER in broker/bpm_packet.py
+// The broker does the beat detection on the IR signal
+#ifndef USE_PPG_STREAMING
+#define USE_PPG_STREAMING false
+#endif
+
+const uint8_t WAVEFORM_MAGIC = 0xED;
+const uint8_t WAVEFORM_VERSION = 1;
+const uint16_t PPG_SAMPLE_RATE = 100;       // Samples per second
+const uint8_t PPG_SAMPLES_PER_PACKET = 25;  // 4 packets per second
+const unsigned long PPG_SAMPLE_INTERVAL_US = 1000000UL / PPG_SAMPLE_RATE;
+
+struct __attribute__((packed)) WaveformPacket {
+    uint8_t magic;
+    uint8_t version;
+    uint16_t user;
+    uint32_t timestamp;    // millis() of the first sample
+    uint16_t sample_rate;
+    uint8_t count;
+    int8_t rssi;
+    uint32_t ir[PPG_SAMPLES_PER_PACKET];
+};
+
+WaveformPacket waveform;
+uint8_t waveformCount = 0;
+unsigned long nextSampleMicros = 0;
+
 // LED indicator
 const int LED_PIN = 2; // Built-in LED
 
@@ -30,6 +81,8 @@ void initializeSensor();
 void readHeartRate();
 long calculateBPM();
 void sendBPMData(long bpm);
+void streamPPGSample();
+void sendWaveform();
 
 void setup() {
     Serial.begin(115200);
@@ -51,6 +104,15 @@ void setup() {
 }
 
 void loop() {
+#if USE_PPG_STREAMING
+    // Sample the IR signal on a fixed schedule and send it in batches
+    if ((long)(micros() - nextSampleMicros) >= 0) {
+        nextSampleMicros += PPG_SAMPLE_INTERVAL_US;
+        streamPPGSample();
+    }
+    return;
+#endif
+
     // Read heart rate data
     readHeartRate();
 
@@ -179,6 +241,28 @@ void sendBPMData(long bpm) {
     long irValue = particleSensor.getIR();
     long redValue = particleSensor.getRed();
 
+    IPAddress serverIP;
+    serverIP.fromString(UDP_SERVER_IP);
+
+#if USE_BINARY_PACKETS
+    // Compact fixed-layout packet (22 bytes instead of ~150 bytes of JSON)
+    BPMPacket packet;
+    packet.magic = PACKET_MAGIC;
+    packet.version = PACKET_VERSION;
+    packet.user = DEVICE_ID;
+    packet.bpm_x10 = (int16_t)(bpm * 10);
+    packet.timestamp = millis();
+    packet.rssi = (int8_t)WiFi.RSSI();
+    packet.flags = (irValue > 20000) ? FLAG_FINGER_DETECTED : 0;
+    packet.ir_value = (uint32_t)irValue;
+    packet.red_value = (uint32_t)redValue;
+    packet.seq = packetSeq++;
+
+    udp.writeTo((uint8_t*)&packet, sizeof(packet), serverIP, UDP_SERVER_PORT);
+
+    Serial.print("Sent binary packet, BPM: ");
+    Serial.println(bpm);
+#else
     // Create JSON message with sensor data
     StaticJsonDocument<400> doc;
     doc["user"] = DEVICE_ID;
@@ -189,15 +273,48 @@ void sendBPMData(long bpm) {
     doc["red_value"] = redValue;
     doc["finger_detected"] = (irValue > 20000);
     doc["sensor_type"] = "MAX30102";
+    doc["seq"] = packetSeq++;
 
     String jsonString;
     serializeJson(doc, jsonString);
 
     // Send UDP packet using AsyncUDP
-    IPAddress serverIP;
-    serverIP.fromString(UDP_SERVER_IP);
     udp.writeTo((uint8_t*)jsonString.c_str(), jsonString.length(), serverIP, UDP_SERVER_PORT);
 
     Serial.print("Sent: ");
     Serial.println(jsonString);
+#endif
+}
+
+void streamPPGSample() {
+    if (waveformCount == 0) {
+        waveform.timestamp = millis();
+    }
+    waveform.ir[waveformCount++] = (uint32_t)particleSensor.getIR();
+
+    if (waveformCount == PPG_SAMPLES_PER_PACKET) {
+        sendWaveform();
+        waveformCount = 0;
+    }
+}
+
+void sendWaveform() {
+    if (WiFi.status() != WL_CONNECTED) {
+        Serial.println("WiFi disconnected, attempting reconnect...");
+        connectToWiFi();
+        nextSampleMicros = micros(); // Don't try to catch up on missed samples
+        return;
+    }
+
+    IPAddress serverIP;
+    serverIP.fromString(UDP_SERVER_IP);
+
+    waveform.magic = WAVEFORM_MAGIC;
+    waveform.version = WAVEFORM_VERSION;
+    waveform.user = DEVICE_ID;
+    waveform.sample_rate = PPG_SAMPLE_RATE;
+    waveform.count = PPG_SAMPLES_PER_PACKET;
+    waveform.rssi = (int8_t)WiFi.RSSI();
+
+    udp.writeTo((uint8_t*)&waveform, sizeof(waveform), serverIP, UDP_SERVER_PORT);
 }
@@ -397,6 +397,7 @@ class BPMDashboard {
         this.dataTimeoutMs = 2000; // Show "--" after 2 seconds of no data (quick response to disconnection)
         this.readingSkipCount = 1; // Process every 2nd reading for stability
         this.lastSyncDifference = undefined; // Track previous sync difference for change detection
+        this.servedByBroker = false; // Set from the user_names.json response headers
 
         // Initialize audio engine
         this.audioEngine = new AudioEngine();
@@ -457,6 +458,8 @@ class BPMDashboard {
     async loadUserNames() {
         try {
             const response = await fetch('./user_names.json');
+            // The broker marks the files it serves itself (SERVE_DASHBOARD)
+            this.servedByBroker = response.headers.get('X-BPM-WebSocket') === 'same-origin';
             if (response.ok) {
                 const config = await response.json();
                 this.users[1].name = config.user1 || 'User 1';
@@ -475,7 +478,13 @@ class BPMDashboard {
     }
 
     connectWebSocket() {
-        const wsUrl = 'ws://localhost:6789';
+        // Over HTTP(S) the broker runs on the page's host: on the same port when it serves
+        // the page itself (SERVE_DASHBOARD), else on 6789 next to server.py
+        let wsUrl = 'ws://localhost:6789';
+        if (location.protocol === 'http:' || location.protocol === 'https:') {
+            const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+            wsUrl = this.servedByBroker ? `${scheme}://${location.host}` : `${scheme}://${location.hostname}:6789`;
+        }
                     console.log(`Connecting to ${wsUrl}...`);
 
         try {
@@ -519,6 +528,16 @@ class BPMDashboard {
                 return;
             }
 
+            // Combined frame from the broker's tick output mode
+            if (heartData.type === 'frame') {
+                Object.values(heartData.users || {}).forEach(userData => {
+                    if (userData.user && userData.bpm !== undefined) {
+                        this.updateUserData(userData);
+                    }
+                });
+                return;
+            }
+
             // Process heart rate data
             if (heartData.user && heartData.bpm !== undefined) {
                 this.updateUserData(heartData);
@@ -5,6 +5,14 @@ Simple HTTP Server for BPM Dashboard
 Serves the web dashboard files with proper CORS headers
 for development and testing.
 
+Requests are handled on a thread each, so one slow phone on bad Wi-Fi
+doesn't hold up everybody else scanning the QR code. Files are kept in
+memory with gzip (and brotli, if the `brotli` package is installed)
+variants compressed once, and sent with an ETag so browsers revalidate
+with a cheap 304. Files are re-read only when their modification time
+changes, checked at most once per RELOAD_CHECK_INTERVAL - edits to
+user_names.json still show up on the dashboard within a few seconds.
+
 Usage:
     python server.py
 
@@ -12,13 +20,109 @@ Then open: http://localhost:8080
 """
 
 import http.server
-import socketserver
 import os
 import json
-from urllib.parse import urlparse, parse_qs
-
-class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    """HTTP Request Handler with CORS support"""
+import gzip
+import hashlib
+import mimetypes
+import stat
+import threading
+import time
+from urllib.parse import urlparse, unquote
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RELOAD_CHECK_INTERVAL = 1.0  # Seconds between modification time checks per file
+COMPRESS_MIN_SIZE = 256  # Smaller files are always sent uncompressed
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+DEFAULT_USER_NAMES = {"user1": "User 1", "user2": "User 2"}
+ETAG_SUFFIXES = {"gzip": "-gz", "br": "-br"}  # Appended to the ETag of each compressed variant
+
+class CachedFile:
+    """One file's content, precompressed variants and their ETags"""
+
+    def __init__(self, body: bytes, content_type: str, mtime: float, size: int):
+        self.content_type = content_type
+        self.mtime = mtime
+        self.size = size
+        self.checked_at = time.monotonic()
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        self.etag = f'"{digest}"'  # Of the uncompressed body
+
+        self.variants = {"identity": body}
+        if len(body) >= COMPRESS_MIN_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body)
+        # Each encoding is a different representation, so each gets its own ETag
+        self.etags = {encoding: f'"{digest}{ETAG_SUFFIXES.get(encoding, "")}"' for encoding in self.variants}
+
+    def choose(self, accept_encoding: str):
+        """Best (encoding, body) for a request's Accept-Encoding header"""
+        accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                return encoding, self.variants[encoding]
+        return "identity", self.variants["identity"]
+
+    def matches(self, encoding: str, if_none_match: str) -> bool:
+        """Whether an If-None-Match header names the ETag of this encoding's variant"""
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(',')}
+        return "*" in tags or self.etags[encoding] in tags
+
+class AssetCache:
+    """In-memory copies of the dashboard files, reloaded when they change on disk"""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.realpath(directory)
+        self.files = {}  # path on disk -> CachedFile
+        self.lock = threading.Lock()
+
+    def resolve(self, url_path: str):
+        """Map a URL path to a file inside the dashboard directory (None if outside)"""
+        relative = unquote(url_path).lstrip('/') or 'index.html'
+        path = os.path.realpath(os.path.join(self.directory, relative))
+        if os.path.commonpath([path, self.directory]) != self.directory:
+            return None
+        return path
+
+    def get(self, path: str):
+        """The cached file, loading or reloading it if needed (None if missing)"""
+        cached = self.files.get(path)
+        if cached is not None and time.monotonic() - cached.checked_at < RELOAD_CHECK_INTERVAL:
+            return cached
+
+        with self.lock:
+            cached = self.files.get(path)
+            try:
+                info = os.stat(path)
+            except OSError:
+                self.files.pop(path, None)
+                return None
+            if not stat.S_ISREG(info.st_mode):
+                return None
+
+            if cached is not None and (cached.mtime, cached.size) == (info.st_mtime, info.st_size):
+                cached.checked_at = time.monotonic()
+                return cached
+
+            with open(path, 'rb') as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            cached = CachedFile(body, content_type, info.st_mtime, info.st_size)
+            self.files[path] = cached
+            if os.path.basename(path) == 'user_names.json':
+                print(f"📝 Loaded user names from {path}")
+            return cached
+
+class CORSHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP Request Handler with CORS support, serving from the asset cache"""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive: one connection for all dashboard files
+    assets: AssetCache = None  # Set by main()
 
     def end_headers(self):
         """Add CORS headers to all responses"""
@@ -30,44 +134,73 @@ class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def do_OPTIONS(self):
         """Handle preflight OPTIONS requests"""
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def do_GET(self):
         """Handle GET requests"""
-        # Parse the URL
+        self.send_cached(head_only=False)
+
+    def do_HEAD(self):
+        """Handle HEAD requests"""
+        self.send_cached(head_only=True)
+
+    def send_cached(self, head_only: bool):
+        """Send a file from the cache, honoring If-None-Match and Accept-Encoding"""
         parsed_path = urlparse(self.path)
+        path = self.assets.resolve(parsed_path.path)
+        cached = self.assets.get(path) if path else None
 
-        # Special handling for user_names.json to ensure it's always fresh
-        if parsed_path.path == '/user_names.json':
-            try:
-                with open('user_names.json', 'r') as f:
-                    content = f.read()
-
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-                self.send_header('Pragma', 'no-cache')
-                self.send_header('Expires', '0')
-                self.end_headers()
-                self.wfile.write(content.encode())
-                return
-
-            except FileNotFoundError:
+        if cached is None:
+            if parsed_path.path == '/user_names.json':
                 # Return default names if file doesn't exist
-                default_names = {"user1": "User 1", "user2": "User 2"}
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(default_names).encode())
-                return
+                self.send_body(json.dumps(DEFAULT_USER_NAMES).encode(), 'application/json', head_only)
+            else:
+                self.send_error(404, "File not found")
+            return
+
+        encoding, body = cached.choose(self.headers.get('Accept-Encoding', ''))
+        if cached.matches(encoding, self.headers.get('If-None-Match', '')):
+            self.send_response(304)
+            self.send_header('ETag', cached.etags[encoding])
+            self.send_header('Cache-Control', 'no-cache')
+            if len(cached.variants) > 1:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', cached.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', cached.etags[encoding])
+        self.send_header('Cache-Control', 'no-cache')  # Always revalidate; unchanged files cost a 304
+        if len(cached.variants) > 1:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding != "identity":
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
 
-        # Default handling for other files
-        super().do_GET()
+    def send_body(self, body: bytes, content_type: str, head_only: bool):
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
 
     def log_message(self, format, *args):
         """Custom log message format"""
         print(f"[{self.log_date_time_string()}] {format % args}")
 
+class DashboardHTTPServer(http.server.ThreadingHTTPServer):
+    """Thread-per-request server with a listen backlog sized for a crowd"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
 def main():
     """Main server function"""
     PORT = 8081
@@ -85,10 +218,12 @@ def main():
     # Change to the dashboard directory
     os.chdir(DIRECTORY)
 
+    CORSHTTPRequestHandler.assets = AssetCache(DIRECTORY)
+
     # Create the server
-    with socketserver.TCPServer(("", PORT), CORSHTTPRequestHandler) as httpd:
+    with DashboardHTTPServer(("", PORT), CORSHTTPRequestHandler) as httpd:
         try:
-            print(f"✅ Server started on port {PORT}")
+            print(f"✅ Server started on port {PORT} (compression: {'br, gzip' if brotli else 'gzip'})")
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n🛑 Server stopped by user")